@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+
+import argparse
+import logging
+import sys
+
+from benchmarks.fake_session import LibrarySize
+from benchmarks.stress import run_stress
+from benchmarks.suite import (
+    Benchmark, compare_reports, load_report, save_report,
+)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmark Mopidy-Tidal against a fake TIDAL session.')
+    parser.add_argument('-o', '--output', default='bench_output.json',
+                        help='where to write the JSON report')
+    parser.add_argument('--compare', metavar='REPORT',
+                        help='compare the run with a previous JSON report')
+    parser.add_argument('--metric', default='p50_ms',
+                        help='metric used by --compare (default: p50_ms)')
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every API call')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='maximum random seconds added to every API call')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of API calls that fail')
+    parser.add_argument('--artists', type=int, default=50)
+    parser.add_argument('--albums-per-artist', type=int, default=5)
+    parser.add_argument('--tracks-per-album', type=int, default=12)
+    parser.add_argument('--playlists', type=int, default=20)
+    parser.add_argument('--playlist-size', type=int, default=50)
+    parser.add_argument('--favorite-tracks', type=int, default=500)
+    parser.add_argument('--set', metavar='KEY=VALUE', action='append',
+                        default=[], help='extension setting, e.g. '
+                        'browse_page_size=100 (repeatable)')
+    parser.add_argument('--stress', action='store_true',
+                        help='only run the concurrent cache stress benchmark')
+    return parser.parse_args(argv)
+
+
+def _setting(value):
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return {'true': True, 'false': False}.get(value.lower(), value)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.stress:
+        print(f'{"cache.threads":<28}{"ops/s":>12}{"speedup":>12}'
+              f'{"hit ratio":>12}')
+        for name, result in run_stress(load_latency=args.latency).items():
+            print(f'{name:<28}{result["ops_per_s"]:>12.0f}'
+                  f'{result["speedup"]:>12.2f}{result["hit_ratio"]:>12.2f}')
+        if not args.latency:
+            print('Cache operations hold the GIL: use --latency to overlap '
+                  'the loads of the misses')
+        return
+
+    size = LibrarySize(artists=args.artists,
+                       albums_per_artist=args.albums_per_artist,
+                       tracks_per_album=args.tracks_per_album,
+                       playlists=args.playlists,
+                       playlist_size=args.playlist_size,
+                       favorite_tracks=args.favorite_tracks)
+    tidal_config = dict(
+        (key, _setting(value)) for key, value in
+        (item.split('=', 1) for item in args.set))
+    report = Benchmark(size, latency=args.latency, jitter=args.jitter,
+                       error_rate=args.error_rate,
+                       iterations=args.iterations,
+                       tidal_config=tidal_config).run()
+    save_report(report, args.output)
+
+    print(f'{"scenario":<28}{"p50 ms":>10}{"p99 ms":>10}'
+          f'{"cold calls":>12}{"peak KiB":>10}')
+    for name, result in report['scenarios'].items():
+        cold_calls = sum(v for k, v in result['api_calls'].items()
+                         if k.startswith('cold.'))
+        print(f'{name:<28}{result["p50_ms"]:>10.2f}{result["p99_ms"]:>10.2f}'
+              f'{cold_calls:>12}{result["peak_memory_kib"]:>10.0f}')
+    print(f'Report written to {args.output}')
+
+    if args.compare:
+        print(f'\nComparison of {args.metric} with {args.compare}:')
+        for name, old, new, ratio in compare_reports(
+                load_report(args.compare), report, args.metric):
+            print(f'{name:<28}{old:>10.2f}{new:>10.2f}{ratio:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
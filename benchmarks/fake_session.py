@@ -0,0 +1,232 @@
+from __future__ import unicode_literals
+
+import random
+import threading
+import time
+from collections import Counter
+
+from tidaloauth4mopidy.models import (
+    Album, Artist, Category, Playlist, SearchResult, Track,
+)
+
+
+class FakeApiError(Exception):
+    pass
+
+
+class LibrarySize(object):
+    """Shape of the synthetic TIDAL catalogue served by `FakeSession`."""
+
+    def __init__(self, artists=50, albums_per_artist=5, tracks_per_album=12,
+                 playlists=20, playlist_size=50, favorite_artists=20,
+                 favorite_albums=50, favorite_tracks=500, categories=10):
+        self.artists = artists
+        self.albums_per_artist = albums_per_artist
+        self.tracks_per_album = tracks_per_album
+        self.playlists = playlists
+        self.playlist_size = playlist_size
+        self.favorite_artists = favorite_artists
+        self.favorite_albums = favorite_albums
+        self.favorite_tracks = favorite_tracks
+        self.categories = categories
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _favorite_artists(s):
+    return [s.artists[i % len(s.artists)]
+            for i in range(s.size.favorite_artists)]
+
+
+def _favorite_albums(s):
+    return [s.albums[i % len(s.albums)]
+            for i in range(s.size.favorite_albums)]
+
+
+def _favorite_tracks(s):
+    return [s.tracks[i % len(s.tracks)]
+            for i in range(s.size.favorite_tracks)]
+
+
+_FAVORITES = {
+    'artists': _favorite_artists,
+    'albums': _favorite_albums,
+    'tracks': _favorite_tracks,
+}
+
+
+class FakeFavorites(object):
+    def __init__(self, session):
+        self._session = session
+
+    def artists(self):
+        return self._session._call('favorites.artists', _favorite_artists)
+
+    def albums(self):
+        return self._session._call('favorites.albums', _favorite_albums)
+
+    def tracks(self):
+        return self._session._call('favorites.tracks', _favorite_tracks)
+
+    def playlists(self):
+        return self._session._call(
+            'favorites.playlists',
+            lambda s: s.playlists[:len(s.playlists) // 4])
+
+
+class FakeUser(object):
+    def __init__(self, session):
+        self._session = session
+        self.id = 1
+        self.favorites = FakeFavorites(session)
+
+    def playlists(self):
+        return self._session._call(
+            'user.playlists', lambda s: s.playlists[len(s.playlists) // 4:])
+
+
+class FakeSession(object):
+    """
+    In-process stand-in for the `tidaloauth4mopidy.Session` used by the
+    backend. It serves a synthetic catalogue of the requested size, adds
+    `latency` seconds (plus up to `jitter` seconds) to every call, fails
+    a fraction `error_rate` of the calls and counts calls per method.
+    """
+
+    def __init__(self, size=None, latency=0.0, jitter=0.0, error_rate=0.0,
+                 seed=0):
+        self.size = size or LibrarySize()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.user = FakeUser(self)
+        self._build()
+
+    def _build(self):
+        size = self.size
+        self.artists = [Artist(id=1000 + i, name=f'Artist {i}')
+                        for i in range(size.artists)]
+        self.albums = []
+        self.tracks = []
+        self.album_tracks = {}
+        for artist in self.artists:
+            for j in range(size.albums_per_artist):
+                album_id = artist.id * 100 + j
+                album = Album(id=album_id, name=f'{artist.name} Album {j}',
+                              artist=artist, artists=[artist],
+                              img_uuid=f'img-{album_id}',
+                              num_tracks=size.tracks_per_album)
+                tracks = [
+                    Track(id=album_id * 100 + k,
+                          name=f'{album.name} Track {k}', duration=180,
+                          track_num=k + 1, disc_num=1, quality='LOSSLESS',
+                          artist=artist, artists=[artist], album=album)
+                    for k in range(size.tracks_per_album)]
+                self.albums.append(album)
+                self.tracks.extend(tracks)
+                self.album_tracks[album_id] = tracks
+
+        self.artist_albums = {}
+        for album in self.albums:
+            self.artist_albums.setdefault(album.artist.id, []).append(album)
+        self.tracks_by_id = {t.id: t for t in self.tracks}
+        self.albums_by_id = {a.id: a for a in self.albums}
+        self.artists_by_id = {a.id: a for a in self.artists}
+
+        self.playlists = []
+        self.playlist_tracks = {}
+        for i in range(size.playlists):
+            playlist_id = f'playlist-{i}'
+            tracks = [self.tracks[(i * 7 + k * 13) % len(self.tracks)]
+                      for k in range(size.playlist_size)]
+            self.playlists.append(Playlist(
+                id=playlist_id, name=f'Playlist {i}',
+                num_tracks=len(tracks), duration=180 * len(tracks)))
+            self.playlist_tracks[playlist_id] = tracks
+        self.playlists_by_id = {p.id: p for p in self.playlists}
+
+        self.categories = [Category(id=f'category-{i}', name=f'Category {i}')
+                           for i in range(size.categories)]
+
+    def _call(self, name, func):
+        with self._lock:
+            self.calls[name] += 1
+            delay = self.latency + self._random.random() * self.jitter
+            fail = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeApiError(f'Injected failure in {name}')
+        return func(self)
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = Counter()
+
+    # Catalogue
+
+    def get_track(self, track_id):
+        return self._call('get_track', lambda s: s.tracks_by_id[int(track_id)])
+
+    def get_album(self, album_id):
+        return self._call('get_album', lambda s: s.albums_by_id[int(album_id)])
+
+    def get_album_tracks(self, album_id):
+        return self._call('get_album_tracks',
+                          lambda s: s.album_tracks[int(album_id)])
+
+    def get_artist(self, artist_id):
+        return self._call('get_artist',
+                          lambda s: s.artists_by_id[int(artist_id)])
+
+    def get_artist_albums(self, artist_id):
+        return self._call('get_artist_albums',
+                          lambda s: s.artist_albums[int(artist_id)])
+
+    def get_artist_top_tracks(self, artist_id):
+        return self._call('get_artist_top_tracks', lambda s: [
+            t for a in s.artist_albums[int(artist_id)]
+            for t in s.album_tracks[a.id][:2]])
+
+    def get_playlist(self, playlist_id):
+        return self._call('get_playlist',
+                          lambda s: s.playlists_by_id.get(playlist_id))
+
+    def get_playlist_tracks(self, playlist_id):
+        return self._call('get_playlist_tracks',
+                          lambda s: s.playlist_tracks[playlist_id])
+
+    def get_moods(self):
+        return self._call('get_moods', lambda s: list(s.categories))
+
+    def get_genres(self):
+        return self._call('get_genres', lambda s: list(s.categories))
+
+    def get_mood_playlists(self, mood_id):
+        return self._call('get_mood_playlists', lambda s: s.playlists[:10])
+
+    def get_genre_items(self, genre_id, content_type):
+        return self._call('get_genre_items', lambda s: s.playlists[:10])
+
+    def get_media_url(self, track_id):
+        return self._call('get_media_url',
+                          lambda s: f'https://fake.tidal/stream/{track_id}')
+
+    def search(self, field, value, limit=50):
+        def _search(s):
+            needle = value.lower()
+            items = {'artist': s.artists, 'album': s.albums,
+                     'track': s.tracks}[field]
+            found = [i for i in items if needle in i.name.lower()][:limit]
+            return SearchResult(**{field + 's': found})
+        return self._call('search', _search)
+
+    def _map_request(self, url, params=None, ret=None):
+        # Only used for the pages of the favourites
+        offset, limit = params['offset'], params['limit']
+        return self._call(f'favorites.{ret}.page', lambda s: _FAVORITES[ret](
+            s)[offset:offset + limit])
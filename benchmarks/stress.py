@@ -0,0 +1,88 @@
+from __future__ import unicode_literals
+
+import random
+import threading
+import time
+
+from mopidy_tidal.lru_cache import LruCache, ShardedCache
+
+THREAD_COUNTS = (1, 2, 4, 8)
+
+
+def _keys(count, seed, length=4096):
+    """Zipf-distributed key stream, popular keys come up much more often."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** 0.9 for rank in range(count)]
+    return [f'tidal:track:{rank}'
+            for rank in rng.choices(range(count), weights, k=length)]
+
+
+def stress_cache(cache, threads, duration=0.5, keys=2048, load_latency=0.0):
+    """
+    Hammer `cache` from `threads` threads for `duration` seconds. Every
+    thread looks keys up and stores the missing ones, after `load_latency`
+    seconds spent outside of any cache lock like a TIDAL request. Returns
+    the number of operations (and per second), of hits and the hit ratio.
+
+    Cache operations are pure Python and hold the GIL, so without a latency
+    the throughput cannot grow with the threads: it only shows what the
+    locks cost under contention. Only the loads overlap, as long as no cache
+    lock is held while they wait.
+    """
+    barrier = threading.Barrier(threads + 1)
+    counts = [[0, 0] for _ in range(threads)]
+    stop = threading.Event()
+
+    def worker(index):
+        stream = _keys(keys, index)
+        ops = hits = 0
+        barrier.wait()
+        while not stop.is_set():
+            key = stream[ops % len(stream)]
+            if cache.get(key) is None:
+                if load_latency:
+                    time.sleep(load_latency)
+                cache[key] = key
+            else:
+                hits += 1
+            ops += 1
+        counts[index][:] = ops, hits
+
+    pool = [threading.Thread(target=worker, args=(i,), daemon=True)
+            for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    started_at = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    ops = sum(c[0] for c in counts)
+    hits = sum(c[1] for c in counts)
+    return {'ops': ops, 'hits': hits, 'ops_per_s': ops / elapsed,
+            'hit_ratio': hits / ops if ops else 0.0}
+
+
+def run_stress(thread_counts=THREAD_COUNTS, duration=0.5, max_size=512,
+               policy='tinylfu', load_latency=0.0):
+    """
+    Throughput of a single cache and of a lock-striped one by threads, with
+    its speedup over the first thread count.
+    """
+    caches = {
+        'single': lambda: LruCache(max_size=max_size, policy=policy),
+        'sharded': lambda: ShardedCache(max_size=max_size, policy=policy),
+    }
+    results = {}
+    for name, factory in caches.items():
+        baseline = None
+        for threads in thread_counts:
+            result = stress_cache(factory(), threads, duration,
+                                  load_latency=load_latency)
+            baseline = baseline or result['ops_per_s']
+            result['speedup'] = result['ops_per_s'] / baseline
+            results[f'{name}.{threads}'] = result
+    return results
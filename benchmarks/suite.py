@@ -0,0 +1,266 @@
+from __future__ import unicode_literals
+
+import gc
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+from benchmarks.fake_session import FakeSession, LibrarySize
+
+from mopidy_tidal import context, workers
+from mopidy_tidal.coalescing import CoalescingProxy
+from mopidy_tidal.library import TidalLibraryProvider
+from mopidy_tidal.lru_cache import image_cache, track_cache
+from mopidy_tidal.playback import TidalPlaybackProvider
+from mopidy_tidal.playlists import TidalPlaylistsProvider
+from mopidy_tidal.search import tidal_search
+from mopidy_tidal.search_index import search_index
+
+logger = logging.getLogger(__name__)
+
+REPORT_VERSION = 1
+
+# Modules whose import time is measured in a fresh interpreter
+IMPORT_MODULES = ('mopidy_tidal', 'mopidy_tidal.backend')
+
+
+class FakeBackend(object):
+    """The subset of `TidalBackend` the providers rely on."""
+
+    def __init__(self, session, tidal_config=None):
+        self.session = CoalescingProxy(session)
+        self.quality = 'LOSSLESS'
+        self.image_search = True
+        self._config = {'tidal': dict(tidal_config or {})}
+
+
+def reset_caches():
+    """Empty the process-wide caches so that every run starts cold."""
+    track_cache.purge()
+    image_cache.purge()
+    tidal_search.clear()
+    search_index.clear()
+
+
+def _import_times(module):
+    """
+    `(self, cumulative)` seconds spent importing every module loaded by
+    `import module` in a fresh interpreter, by module name.
+    """
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in output.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            self_us = int(parts[0].rsplit(':', 1)[1])
+            times[parts[2].strip()] = (self_us / 1e6, int(parts[1]) / 1e6)
+    return times
+
+
+def import_time(module):
+    """Seconds spent importing `module` in a fresh interpreter."""
+    times = _import_times(module)
+    if module not in times:
+        raise ValueError(f'No import time reported for {module}')
+    return times[module][1]
+
+
+def package_import_time(module, package):
+    """
+    Seconds spent in the modules of `package` themselves, leaving out their
+    dependencies, when importing `module` in a fresh interpreter.
+    """
+    return sum(self_time for name, (self_time, _)
+               in _import_times(module).items()
+               if name == package or name.startswith(package + '.'))
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(p):
+        last = len(ordered) - 1
+        return ordered[min(last, int(round(p * last)))]
+
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': pick(0.50) * 1000,
+        'p90_ms': pick(0.90) * 1000,
+        'p99_ms': pick(0.99) * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+class Benchmark(object):
+    """
+    Drives the library, playlists and playback providers against a
+    `FakeSession` and records latency percentiles, API calls, errors and
+    peak traced memory for every scenario.
+    """
+
+    def __init__(self, size=None, latency=0.0, jitter=0.0, error_rate=0.0,
+                 iterations=3, tidal_config=None, cache_dir=None,
+                 import_modules=IMPORT_MODULES):
+        self.size = size or LibrarySize()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.iterations = iterations
+        self.tidal_config = tidal_config or {}
+        self.cache_dir = cache_dir
+        self.import_modules = import_modules
+        self.results = {}
+
+    def _scenarios(self, library, playlists, playback, session):
+        track_uris = [
+            f'tidal:track:{t.artist.id}:{t.album.id}:{t.id}'
+            for t in session.tracks[::max(1, len(session.tracks) // 300)]]
+        album_uris = [f'tidal:album:{a.artist.id}:{a.id}'
+                      for a in session.albums[:50]]
+        artist_uris = [f'tidal:artist:{a.id}' for a in session.artists[:20]]
+        queries = [{'any': [a.name]} for a in session.artists[:10]] + \
+            [{'album': [a.name]} for a in session.albums[:10]]
+
+        return [
+            ('browse.root', lambda: library.browse('tidal:directory')),
+            ('browse.my_tracks', lambda: library.browse('tidal:my_tracks')),
+            ('browse.my_albums', lambda: library.browse('tidal:my_albums')),
+            ('browse.moods', lambda: library.browse('tidal:moods')),
+            ('browse.artists',
+             lambda: [library.browse(u) for u in artist_uris]),
+            ('browse.albums', lambda: [library.browse(u) for u in album_uris]),
+            # Browsing caches every track: look them up from a cold cache
+            ('lookup.tracks', lambda: library.lookup(track_uris),
+             track_cache.purge),
+            ('lookup.albums', lambda: library.lookup(album_uris),
+             track_cache.purge),
+            ('search', lambda: [library.search(q) for q in queries]),
+            ('search.exact',
+             lambda: [library.search(q, exact=True) for q in queries]),
+            ('get_images',
+             lambda: library.get_images(album_uris + artist_uris)),
+            ('playlists.refresh', playlists.refresh),
+            ('playlists.as_list', playlists.as_list),
+            ('playback.translate_uri',
+             lambda: [playback.translate_uri(u) for u in track_uris[:50]]),
+        ]
+
+    def run(self):
+        for module in self.import_modules:
+            self.results[f'import.{module}'] = self._measure_import(module)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            context.set_config({
+                'core': {'cache_dir': self.cache_dir or tmp_dir},
+                'tidal': self.tidal_config,
+            })
+            session = FakeSession(self.size, latency=self.latency,
+                                  jitter=self.jitter,
+                                  error_rate=self.error_rate)
+            backend = FakeBackend(session, self.tidal_config)
+            library = TidalLibraryProvider(backend=backend)
+            playlists = TidalPlaylistsProvider(backend=backend)
+            playback = TidalPlaybackProvider(audio=None, backend=backend)
+            reset_caches()
+
+            tracemalloc.start()
+            try:
+                for name, func, *setup in self._scenarios(
+                        library, playlists, playback, session):
+                    self.results[name] = self._measure(session, func, *setup)
+            finally:
+                tracemalloc.stop()
+                playlists._playlists.close()
+                track_cache.close()
+                image_cache.close()
+        return self.report()
+
+    def _measure(self, session, func, setup=None):
+        samples = []
+        calls = Counter()
+        errors = 0
+        if setup is not None:
+            setup()
+        gc.collect()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        for i in range(self.iterations):
+            session.reset_calls()
+            started_at = time.perf_counter()
+            try:
+                func()
+            except Exception as e:
+                logger.debug('Benchmark iteration failed: %r', e)
+                errors += 1
+            samples.append(time.perf_counter() - started_at)
+            # Background cache warming belongs to the scenario that queued it
+            workers.wait_background()
+            calls.update({
+                f'{"cold" if i == 0 else "warm"}.{k}': v
+                for k, v in session.calls.items()})
+        _, peak = tracemalloc.get_traced_memory()
+
+        result = percentiles(samples)
+        result.update(
+            cold_ms=samples[0] * 1000,
+            errors=errors,
+            api_calls=dict(sorted(calls.items())),
+            peak_memory_kib=max(0, peak - base) / 1024,
+        )
+        return result
+
+    def _measure_import(self, module):
+        samples = [import_time(module) for _ in range(self.iterations)]
+        result = percentiles(samples)
+        result.update(cold_ms=samples[0] * 1000, errors=0, api_calls={},
+                      peak_memory_kib=0)
+        return result
+
+    def report(self):
+        return {
+            'version': REPORT_VERSION,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'parameters': {
+                'size': self.size.as_dict(),
+                'latency': self.latency,
+                'jitter': self.jitter,
+                'error_rate': self.error_rate,
+                'iterations': self.iterations,
+                'tidal_config': self.tidal_config,
+            },
+            'scenarios': self.results,
+        }
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_reports(baseline, current, metric='p50_ms'):
+    """Yield `(scenario, baseline, current, ratio)` for a metric."""
+    for name, result in current['scenarios'].items():
+        old = baseline['scenarios'].get(name, {}).get(metric)
+        new = result.get(metric)
+        if old is None or new is None:
+            continue
+        yield name, old, new, (new / old) if old else float('inf')
@@ -2,7 +2,6 @@ from __future__ import unicode_literals
 
 import logging
 import os
-import sys
 
 from mopidy import config, ext
 
@@ -12,8 +11,10 @@ __version__ = '0.3.2'
 # TODO: If you need to log, use loggers named after the current Python module
 logger = logging.getLogger(__name__)
 
-file_dir = os.path.dirname(__file__)
-sys.path.append(file_dir)
+# Names of the policies in mopidy_tidal.eviction, not imported here to keep
+# the extension entry point light
+EVICTION_POLICIES = ["lru", "lfu", "tinylfu"]
+
 
 class Extension(ext.Extension):
 
@@ -33,8 +34,53 @@ class Extension(ext.Extension):
         schema['token'] = config.Secret()
         schema['oauth'] = config.String()
         schema['oauth_port'] = config.Integer(optional=True, choices=range(8000, 10000))
+        schema['metrics_port'] = config.Port(optional=True)
+        schema['metrics_host'] = config.Hostname(optional=True)
         schema['image_search'] = config.Boolean()
+        schema['local_search'] = config.Boolean(optional=True)
         schema['quality'] = config.String(choices=["HI_RES", "LOSSLESS", "HIGH", "LOW"])
+        schema['max_workers'] = config.Integer(optional=True, minimum=1)
+        schema['search_workers'] = config.Integer(optional=True, minimum=1)
+        schema['search_timeout'] = config.Integer(optional=True, minimum=1)
+        schema['prefetch_tracks'] = config.Integer(optional=True, minimum=0)
+        schema['media_url_ttl'] = config.Integer(optional=True, minimum=0)
+        schema['playlist_check_interval'] = config.Integer(
+            optional=True, minimum=0)
+        schema['browse_page_size'] = config.Integer(optional=True, minimum=0)
+        schema['warm_start'] = config.Boolean(optional=True)
+        schema['favorites_ttl'] = config.Integer(optional=True, minimum=0)
+        schema['browse_directory_ttl'] = config.Integer(
+            optional=True, minimum=0)
+        schema['browse_artist_ttl'] = config.Integer(optional=True, minimum=0)
+        schema['http_pool_size'] = config.Integer(optional=True, minimum=1)
+        schema['http_retries'] = config.Integer(optional=True, minimum=0)
+        schema['http_backoff'] = config.Float(optional=True, minimum=0)
+        schema['http_timeout'] = config.Integer(optional=True, minimum=1)
+        schema['conditional_requests'] = config.Boolean(optional=True)
+        schema['track_cache_policy'] = config.String(
+            optional=True, choices=EVICTION_POLICIES)
+        schema['track_cache_mb'] = config.Integer(optional=True, minimum=0)
+        schema['image_cache_policy'] = config.String(
+            optional=True, choices=EVICTION_POLICIES)
+        schema['image_cache_mb'] = config.Integer(optional=True, minimum=0)
+        schema['playlist_cache_policy'] = config.String(
+            optional=True, choices=EVICTION_POLICIES)
+        schema['playlist_cache_mb'] = config.Integer(optional=True, minimum=0)
+        schema['search_cache_policy'] = config.String(
+            optional=True, choices=EVICTION_POLICIES)
+        schema['search_cache_mb'] = config.Integer(optional=True, minimum=0)
+        schema['refresh_budget'] = config.Integer(optional=True, minimum=0)
+        schema['refresh_favorites_interval'] = config.Integer(
+            optional=True, minimum=0)
+        schema['refresh_playlists_interval'] = config.Integer(
+            optional=True, minimum=0)
+        schema['refresh_browse_interval'] = config.Integer(
+            optional=True, minimum=0)
+        schema['refresh_albums_interval'] = config.Integer(
+            optional=True, minimum=0)
+        schema['refresh_jitter'] = config.Float(
+            optional=True, minimum=0, maximum=1)
+        schema['refresh_idle'] = config.Integer(optional=True, minimum=0)
         return schema
 
     def setup(self, registry):
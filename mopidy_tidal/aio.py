@@ -0,0 +1,77 @@
+from __future__ import unicode_literals
+
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCore(object):
+    """
+    Event loop running in a dedicated thread that schedules every TIDAL
+    request of the backend under a global concurrency limit.
+
+    The TIDAL client is blocking, so each request is awaited on one of
+    `limit` executor threads: fan-outs of any size are queued on the loop as
+    cheap tasks instead of threads, and never run more than `limit` requests
+    at once. Threads submit work with :meth:`submit` and :meth:`map`;
+    coroutines running on the loop await :meth:`call` and :meth:`gather`.
+    Calls run in the context (`contextvars`) of the code that made them.
+    """
+
+    def __init__(self, limit=8, initializer=None):
+        self.limit = limit
+        self._executor = ThreadPoolExecutor(
+            max_workers=limit, thread_name_prefix='TidalWorker',
+            initializer=initializer)
+        # Created on the loop: before Python 3.10 it binds to the loop of
+        # the thread that creates it
+        self._semaphore = None
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(
+            name='TidalLoop', target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def in_loop(self):
+        return threading.current_thread() is self._thread
+
+    async def call(self, func, *args):
+        """Run a blocking call on the executor, within the global limit."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        # Tasks inherit the context of their submitter, executors do not
+        context = contextvars.copy_context()
+        async with self._semaphore:
+            return await self._loop.run_in_executor(
+                self._executor, context.run, func, *args)
+
+    async def gather(self, func, items):
+        return await asyncio.gather(*(self.call(func, i) for i in items))
+
+    def run(self, coro):
+        """Run a coroutine on the loop and wait for its result."""
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError('Cannot block the TIDAL event loop')
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def submit(self, func, *args):
+        """Schedule a blocking call; returns a `concurrent.futures.Future`."""
+        return asyncio.run_coroutine_threadsafe(
+            self.call(func, *args), self._loop)
+
+    def map(self, func, items):
+        """Call `func` on every item concurrently, keeping their order."""
+        return self.run(self.gather(func, items))
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._executor.shutdown(wait=False)
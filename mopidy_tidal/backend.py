@@ -1,17 +1,23 @@
 from __future__ import unicode_literals
 
+import json
 import logging
 import os
-import json
 
 from mopidy import backend
 
 from pykka import ThreadingActor
 
-from tidaloauth4mopidy import Config, Session, Quality
-
-from mopidy_tidal import context, library, playback, playlists, Extension
+from mopidy_tidal import (
+    Extension, context, favorites, library, playback, playlists, refresh,
+    workers,
+)
 from mopidy_tidal.auth_http_server import start_oauth_deamon
+from mopidy_tidal.coalescing import CoalescingProxy
+from mopidy_tidal.lru_cache import configure_cache, image_cache, track_cache
+from mopidy_tidal.metrics import InstrumentedProxy, registry
+from mopidy_tidal.metrics_http_server import start_metrics_deamon
+from mopidy_tidal.snapshot import Snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -19,13 +25,25 @@ logger = logging.getLogger(__name__)
 class TidalBackend(ThreadingActor, backend.Backend):
     def __init__(self, config, audio):
         super(TidalBackend, self).__init__()
-        self.session = None
+        self._session = None
+        self._session_future = None
         self._config = config
+        context.set_config(config)
         self._token = config['tidal']['token']
         self._oauth = config['tidal']['oauth']
         self._oauth_port = config['tidal'].get('oauth_port')
+        self._metrics_port = config['tidal'].get('metrics_port')
+        self._metrics_host = config['tidal'].get('metrics_host')
+        self._warm_start = config['tidal'].get('warm_start', True)
+        self._snapshot = None
+        self._validators = None
         self.image_search = config['tidal']['image_search']
         self.quality = self._config['tidal']['quality']
+        workers.configure(config['tidal'].get('max_workers'))
+        favorites.configure(config['tidal'].get('favorites_ttl'))
+        workers.configure_search(config['tidal'].get('search_workers'),
+                                 config['tidal'].get('search_timeout'))
+        self._configure_caches()
         self.playback = playback.TidalPlaybackProvider(audio=audio,
                                                        backend=self)
         self.library = library.TidalLibraryProvider(backend=self)
@@ -34,6 +52,47 @@ class TidalBackend(ThreadingActor, backend.Backend):
             self.uri_schemes = ['tidal', 'spotify']
         else:
             self.uri_schemes = ['tidal']
+        self._refresher = self._create_refresher()
+
+    def _configure_caches(self):
+        from mopidy_tidal.search import tidal_search
+        tidal_config = self._config['tidal']
+        configure_cache(track_cache, tidal_config, 'track')
+        configure_cache(image_cache, tidal_config, 'image')
+        configure_cache(tidal_search, tidal_config, 'search')
+
+    def _create_refresher(self):
+        tidal_config = self._config['tidal']
+        # Tasks run on the scheduler thread, so that the actor keeps serving
+        # Mopidy while they wait for TIDAL
+        refresher = refresh.RefreshScheduler(
+            budget=tidal_config.get('refresh_budget'),
+            jitter=tidal_config.get('refresh_jitter'),
+            idle=tidal_config.get('refresh_idle'))
+        if not refresher.budget:
+            return refresher
+        refresher.add(
+            'favorites',
+            lambda: favorites.favorites_store.refresh(self.session),
+            tidal_config.get('refresh_favorites_interval'))
+        refresher.add('playlists', self._refresh_playlists,
+                      tidal_config.get('refresh_playlists_interval'))
+        refresher.add('browse', self.library.refresh_directories,
+                      tidal_config.get('refresh_browse_interval'))
+        refresher.add(
+            'albums',
+            lambda: self.library.lookup(self.playback.recent_albums()),
+            tidal_config.get('refresh_albums_interval'))
+        return refresher
+
+    def _refresh_playlists(self):
+        """
+        Fetch the playlists from the calling thread and store them through
+        the actor, as their provider is not thread-safe. The other refreshes
+        only fill caches that are.
+        """
+        updates = self.playlists.fetch_updates()
+        self.actor_ref.proxy().playlists.apply_updates(updates).get()
 
     def oauth_login_new_session(self, oauth_file):
         # create a new session
@@ -48,10 +107,92 @@ class TidalBackend(ThreadingActor, backend.Backend):
             with open(oauth_file, 'w') as outfile:
                 json.dump(data, outfile)
 
-    def on_start(self):
+    @property
+    def session(self):
+        """The TIDAL session, waiting for its creation if it is under way."""
+        if self._session is None and self._session_future is not None:
+            self._session = self._session_future.result()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def _create_session(self):
+        # The TIDAL client and its HTTP stack are only imported here, off the
+        # actor start path
+        from tidaloauth4mopidy import Config, Quality
+        from mopidy_tidal.conditional import ValidatorCache
+        from mopidy_tidal.transport import PooledSession, Transport
+
         logger.info("Connecting to TIDAL.. Quality = %s" % self.quality)
-        config = Config(self._token, self._oauth, quality=Quality(self.quality))
-        self.session = Session(config)
+        config = Config(self._token, self._oauth,
+                        quality=Quality(self.quality))
+        transport = Transport(
+            pool_size=self._config['tidal'].get('http_pool_size'),
+            retries=self._config['tidal'].get('http_retries'),
+            backoff=self._config['tidal'].get('http_backoff'),
+            timeout=self._config['tidal'].get('http_timeout'))
+        validators = None
+        if self._config['tidal'].get('conditional_requests', True):
+            validators = self._validators = ValidatorCache()
+            registry.register_cache('validators', validators)
+        # Coalesce outside of the instrumentation so that only the calls
+        # that actually reach TIDAL are measured
+        session = CoalescingProxy(InstrumentedProxy(
+            PooledSession(config, transport, validators)))
         if self._oauth_port:
-            start_oauth_deamon(self.session, self._oauth_port)
+            start_oauth_deamon(session, self._oauth_port)
+        return session
+
+    def on_start(self):
+        self._session_future = workers.submit(self._create_session)
+        if self._metrics_port:
+            start_metrics_deamon(self._metrics_port,
+                                 self._metrics_host or '127.0.0.1')
+        if self._warm_start:
+            self._load_snapshot()
+        self._refresher.start()
+
+    def on_stop(self):
+        self._refresher.stop()
+        if self._snapshot is not None:
+            try:
+                self._snapshot.save(self.playlists.playlists_snapshot(),
+                                    favorites.favorites_store.snapshot())
+            except Exception as e:
+                logger.warning('Could not save the TIDAL snapshot: %s', e)
+            finally:
+                self._snapshot.close()
+        if self._validators is not None:
+            self._validators.close()
+
+    def _load_snapshot(self):
+        self._snapshot = Snapshot(os.path.join(
+            Extension.get_cache_dir(self._config), 'snapshot'))
+        if not self._snapshot.load():
+            return
+
+        playlists = self._snapshot.playlists()
+        if playlists is not None:
+            self.playlists.warm_start(playlists)
+        favorites.favorites_store.warm_start(self._snapshot.favorites())
+        # Off the actor, which answers Mopidy from the snapshot meanwhile
+        workers.run_in_background(self._revalidate_snapshot)
 
+    def _revalidate_snapshot(self):
+        """
+        Replace the playlists and favourites of the warm-start snapshot by
+        upstream's, from the calling thread; see `_refresh_playlists`.
+        """
+        steps = (
+            ('playlists', self._refresh_playlists),
+            ('favourites',
+             lambda: favorites.favorites_store.revalidate(self.session)),
+        )
+        for name, revalidate in steps:
+            try:
+                revalidate()
+            except Exception as e:
+                logger.warning('Could not revalidate the TIDAL %s of the '
+                               'snapshot: %r', name, e)
@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+
+import logging
+import time
+
+from mopidy_tidal.lru_cache import LruCache
+from mopidy_tidal.uri import try_parse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIRECTORY_TTL = 3600
+DEFAULT_ARTIST_TTL = 600
+
+
+def directory_ttls(directory_ttl=None, artist_ttl=None):
+    """Browse cache TTLs by URI type, in seconds."""
+    if directory_ttl is None:
+        directory_ttl = DEFAULT_DIRECTORY_TTL
+    if artist_ttl is None:
+        artist_ttl = DEFAULT_ARTIST_TTL
+    return {
+        'moods': directory_ttl,
+        'mood': directory_ttl,
+        'genres': directory_ttl,
+        'genre': directory_ttl,
+        'artist': artist_ttl,
+    }
+
+
+class BrowseCache(LruCache):
+    """
+    Browse results by directory URI. Every type of directory (`moods`,
+    `genre`, `artist`...) has its own TTL; directories without a TTL are
+    not cached.
+    """
+
+    def __init__(self, ttls, max_size=1024):
+        super().__init__(max_size=max_size, persist=False)
+        self._ttls = ttls
+
+    @staticmethod
+    def uri_type(uri):
+        parsed = try_parse(uri)
+        return parsed.kind if parsed is not None else None
+
+    def ttl(self, uri):
+        return self._ttls.get(self.uri_type(uri), 0)
+
+    def get_or_browse(self, uri, browse):
+        ttl = self.ttl(uri)
+        if not ttl:
+            return browse(uri)
+
+        entry = self.get(uri)
+        if entry is not None:
+            refs, stored_at = entry
+            if time.monotonic() - stored_at < ttl:
+                return list(refs)
+            with self._lock:
+                self._stats['hits'] -= 1
+                self._stats['misses'] += 1
+
+        refs = browse(uri)
+        self[uri] = (tuple(refs), time.monotonic())
+        return refs
+
+    def refresh(self, uri, browse):
+        """Browse a directory again and cache the result, even if fresh."""
+        refs = browse(uri)
+        if self.ttl(uri):
+            self[uri] = (tuple(refs), time.monotonic())
+        return refs
@@ -0,0 +1,108 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+
+from mopidy_tidal.metrics import api_coalesced
+
+logger = logging.getLogger(__name__)
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Runs at most one call per key at a time: callers asking for a key that
+    is already in flight wait for it and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.saved = 0
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.saved += 1
+
+        if not leader:
+            call.done.wait()
+            api_coalesced.inc(key[0])
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class CoalescingProxy(object):
+    """
+    Wraps a TIDAL session so that concurrent identical read requests (the
+    `get_*` and `search` methods, and the `user`/`favorites` listings) share
+    a single in-flight API call. Callers receive the same result objects and
+    must not mutate them.
+    """
+
+    _nested = ('user', 'favorites')
+    _listings = ('artists', 'albums', 'tracks', 'playlists')
+
+    def __init__(self, target, prefix='', flight=None):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_prefix', prefix)
+        object.__setattr__(self, '_flight', flight or SingleFlight())
+
+    @property
+    def saved_calls(self):
+        return self._flight.saved
+
+    def _coalesced(self, name):
+        if self._prefix:
+            return name in self._listings
+        return name.startswith('get_') or name == 'search'
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name in self._nested:
+            return CoalescingProxy(value, f'{self._prefix}{name}.',
+                                   self._flight)
+        if name.startswith('_') or not callable(value) or \
+                not self._coalesced(name):
+            return value
+
+        method = f'{self._prefix}{name}'
+        flight = self._flight
+
+        def wrapper(*args, **kwargs):
+            key = (method, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return value(*args, **kwargs)
+            return flight.do(key, value, *args, **kwargs)
+
+        wrapper.__name__ = method
+        return wrapper
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
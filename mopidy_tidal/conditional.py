@@ -0,0 +1,114 @@
+from __future__ import unicode_literals
+
+import logging
+import re
+import time
+from urllib.parse import urlencode
+
+from mopidy_tidal.lru_cache import LruCache
+from mopidy_tidal.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+# API resources fetched with conditional requests: playlists, albums and
+# the favourites of the user
+CONDITIONAL_PATHS = re.compile(
+    r'^(playlists/[^/]+(/tracks|/items)?'
+    r'|albums/[^/]+(/tracks)?'
+    r'|users/[^/]+/playlists'
+    r'|users/[^/]+/favorites/(artists|albums|tracks|playlists))$')
+
+http_not_modified = registry.register(Counter(
+    'tidal_http_not_modified_total',
+    'Conditional requests to TIDAL answered with 304 Not Modified, '
+    'by resource.', ('resource',)))
+
+
+class NotModified(Exception):
+    """Raised while mapping a response that was 304 Not Modified."""
+
+    def __init__(self, key, entry):
+        super().__init__('Not modified')
+        self.key = key
+        self.entry = entry
+
+
+class Validated(object):
+    """
+    Validators (`ETag` / `Last-Modified`) of a response, and the value that
+    was built from its body.
+    """
+
+    __slots__ = ('etag', 'last_modified', 'value', 'validated_at')
+
+    def __init__(self, etag, last_modified, value):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.value = value
+        self.validated_at = time.time()
+
+    def __getstate__(self):
+        return (self.etag, self.last_modified, self.value, self.validated_at)
+
+    def __setstate__(self, state):
+        self.etag, self.last_modified, self.value, self.validated_at = state
+
+    def headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def get(self):
+        # Callers own the lists they are given
+        return list(self.value) if isinstance(self.value, list) \
+            else self.value
+
+
+def is_conditional(path):
+    return CONDITIONAL_PATHS.match(path) is not None
+
+
+def validator_key(path, params=None, ret=None):
+    query = urlencode(sorted((params or {}).items()))
+    return f'tidal:validators:{ret or "json"}:{path}?{query}'
+
+
+def resource(path):
+    """Resource label of a path in the metrics, without its IDs."""
+    parts = path.split('/')
+    return '/'.join(parts[::2])
+
+
+class ValidatorCache(LruCache):
+    """
+    Responses of conditional requests, by request: their validators and the
+    (mapped) value built from them. Entries are persisted, so that the
+    first refresh after a restart can already be answered with a 304.
+    """
+
+    def __init__(self, max_size=1024, persist=True):
+        super().__init__(max_size=max_size, persist=persist,
+                         directory='validators', default_value=None)
+
+    def store(self, key, response, value):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            if key in self:
+                self.prune(key)
+            return
+        self[key] = Validated(etag, last_modified, value)
+
+    def not_modified(self, path, key, entry):
+        logger.debug('%s has not been modified', path)
+        http_not_modified.inc(resource(path))
+        with self._lock:
+            entry.validated_at = time.time()
+            # The entry is updated in place, which assigning it again would
+            # not persist
+            if self.persist:
+                self._store_entry(key, entry)
+        return entry.get()
@@ -0,0 +1,295 @@
+from __future__ import unicode_literals
+
+import sys
+from collections import OrderedDict
+
+
+class EvictionPolicy(object):
+    """
+    Tracks the keys of a cache and picks the one to evict when the cache
+    goes over its budget.
+    """
+
+    name = None
+
+    def insert(self, key):
+        raise NotImplementedError
+
+    def access(self, key):
+        raise NotImplementedError
+
+    def remove(self, key):
+        raise NotImplementedError
+
+    def victim(self):
+        """Forget and return the key to evict next."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LruPolicy(EvictionPolicy):
+    """Evicts the least recently used key."""
+
+    name = 'lru'
+
+    def __init__(self):
+        self._keys = OrderedDict()
+
+    def insert(self, key):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+
+    def access(self, key):
+        if key in self._keys:
+            self._keys.move_to_end(key)
+
+    def remove(self, key):
+        self._keys.pop(key, None)
+
+    def victim(self):
+        return self._keys.popitem(last=False)[0]
+
+    def clear(self):
+        self._keys.clear()
+
+
+class LfuPolicy(EvictionPolicy):
+    """
+    Evicts the least frequently used key, the least recently used one among
+    equally frequent keys.
+    """
+
+    name = 'lfu'
+
+    def __init__(self):
+        self._counts = {}
+        self._buckets = {}
+        self._min_count = 0
+
+    def _bucket(self, count):
+        bucket = self._buckets.get(count)
+        if bucket is None:
+            bucket = self._buckets[count] = OrderedDict()
+        return bucket
+
+    def _unlink(self, key):
+        count = self._counts.pop(key)
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+        return count
+
+    def insert(self, key):
+        if key in self._counts:
+            self.access(key)
+            return
+        self._counts[key] = 1
+        self._bucket(1)[key] = None
+        self._min_count = 1
+
+    def access(self, key):
+        if key not in self._counts:
+            return
+        count = self._unlink(key) + 1
+        self._counts[key] = count
+        self._bucket(count)[key] = None
+        if self._min_count not in self._buckets:
+            self._min_count = count
+
+    def remove(self, key):
+        if key in self._counts:
+            self._unlink(key)
+
+    def victim(self):
+        if self._min_count not in self._buckets:
+            self._min_count = min(self._buckets)
+        key = next(iter(self._buckets[self._min_count]))
+        self._unlink(key)
+        return key
+
+    def clear(self):
+        self._counts.clear()
+        self._buckets.clear()
+        self._min_count = 0
+
+
+class FrequencySketch(object):
+    """
+    Count-min sketch of 4-bit counters estimating how often keys were seen.
+    All the counters are halved every `sample_size` increments, so that the
+    estimates follow the recent popularity of the keys.
+    """
+
+    __slots__ = ('_width', '_shift', '_table', '_additions', '_sample_size')
+
+    # Odd 64-bit multipliers of the multiplicative hash of every row
+    _SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F,
+              0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+    _MASK64 = (1 << 64) - 1
+
+    def __init__(self, width=4096):
+        bits = max(4, (width - 1).bit_length())
+        self._width = 1 << bits
+        self._shift = 64 - bits
+        self._table = [[0] * self._width for _ in self._SEEDS]
+        self._additions = 0
+        self._sample_size = 10 * self._width
+
+    def _indexes(self, key):
+        h = hash(key) & self._MASK64
+        return [((h * seed) & self._MASK64) >> self._shift
+                for seed in self._SEEDS]
+
+    def frequency(self, key):
+        return min(row[i] for row, i in zip(self._table, self._indexes(key)))
+
+    def increment(self, key):
+        for row, i in zip(self._table, self._indexes(key)):
+            if row[i] < 15:
+                row[i] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._table = [[c >> 1 for c in row] for row in self._table]
+            self._additions //= 2
+
+
+class TinyLfuPolicy(EvictionPolicy):
+    """
+    Scan-resistant W-TinyLFU policy.
+
+    New keys enter a small LRU window. Keys leaving the window join the
+    probation segment of the main area, and keys used again while on
+    probation are promoted to its protected segment. To make room, the
+    newest key on probation is only kept if it was seen more often than
+    the oldest one, according to a frequency sketch: a burst of keys used
+    once cannot push out the working set.
+    """
+
+    name = 'tinylfu'
+
+    def __init__(self, window_share=0.01, protected_share=0.8,
+                 sketch_width=4096):
+        self._window_share = window_share
+        self._protected_share = protected_share
+        self._sketch = FrequencySketch(sketch_width)
+        self._window = OrderedDict()
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+        self._candidate = None
+
+    def __len__(self):
+        return len(self._window) + len(self._probation) + len(self._protected)
+
+    def insert(self, key):
+        if key in self._window or key in self._probation or \
+                key in self._protected:
+            self.access(key)
+            return
+        self._sketch.increment(key)
+        self._window[key] = None
+        window_size = max(1, int(len(self) * self._window_share))
+        while len(self._window) > window_size:
+            candidate, _ = self._window.popitem(last=False)
+            self._probation[candidate] = None
+            self._candidate = candidate
+
+    def access(self, key):
+        self._sketch.increment(key)
+        if key in self._window:
+            self._window.move_to_end(key)
+        elif key in self._protected:
+            self._protected.move_to_end(key)
+        elif key in self._probation:
+            del self._probation[key]
+            self._protected[key] = None
+            main_size = len(self._probation) + len(self._protected)
+            while len(self._protected) > max(
+                    1, int(main_size * self._protected_share)):
+                demoted, _ = self._protected.popitem(last=False)
+                self._probation[demoted] = None
+
+    def remove(self, key):
+        for segment in (self._window, self._probation, self._protected):
+            if key in segment:
+                del segment[key]
+                break
+        if key == self._candidate:
+            self._candidate = None
+
+    def victim(self):
+        if len(self._probation) > 1 and self._candidate in self._probation:
+            candidate = self._candidate
+            oldest = next(iter(self._probation))
+            if oldest != candidate and self._sketch.frequency(candidate) <= \
+                    self._sketch.frequency(oldest):
+                # Admission refused: the newcomer is the victim
+                del self._probation[candidate]
+                self._candidate = None
+                return candidate
+            del self._probation[oldest]
+            return oldest
+
+        for segment in (self._probation, self._protected, self._window):
+            if segment:
+                key, _ = segment.popitem(last=False)
+                if key == self._candidate:
+                    self._candidate = None
+                return key
+        raise KeyError('victim(): policy is empty')
+
+    def clear(self):
+        self._window.clear()
+        self._probation.clear()
+        self._protected.clear()
+        self._candidate = None
+
+
+POLICIES = {p.name: p for p in (LruPolicy, LfuPolicy, TinyLfuPolicy)}
+
+
+def create_policy(name):
+    try:
+        return POLICIES[name]()
+    except KeyError:
+        raise ValueError(f'Invalid eviction policy: {name}')
+
+
+_ATOMIC = (str, bytes, int, float, bool, type(None))
+
+
+def estimate_size(obj, _seen=None, _depth=0):
+    """
+    Estimated memory footprint of an object and of what it references, in
+    bytes. Objects referenced several times are only counted once.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, _ATOMIC) or _depth > 8:
+        return size
+
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, dict):
+        children = [v for kv in obj.items() for v in kv]
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = obj
+    else:
+        children = list(getattr(obj, '__dict__', {}).values())
+        for cls in type(obj).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if hasattr(obj, slot):
+                    children.append(getattr(obj, slot))
+
+    for child in children:
+        if isinstance(child, _ATOMIC):
+            if id(child) not in seen:
+                seen.add(id(child))
+                size += sys.getsizeof(child)
+        else:
+            size += estimate_size(child, seen, _depth + 1)
+    return size
@@ -0,0 +1,129 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+import weakref
+
+from mopidy_tidal.utils import apply_watermark
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+
+KINDS = ('artists', 'albums', 'tracks', 'playlists')
+
+
+class _Entry(object):
+    __slots__ = ('items', 'names', 'fetched_at', 'stale')
+
+    def __init__(self, items, stale=False):
+        self.items = items
+        # Watermarked distinct names, in order, as listed by get_distinct
+        self.names = tuple(dict.fromkeys(
+            apply_watermark(i.name) for i in items))
+        self.fetched_at = time.monotonic()
+        self.stale = stale
+
+
+def _ids(items):
+    return [getattr(i, 'id', None) for i in items]
+
+
+class FavoritesStore(object):
+    """
+    The favourite artists, albums, tracks and playlists of the user, kept
+    for `ttl` seconds along with their watermarked distinct names.
+
+    Entries are dropped with `invalidate`, and listeners are told about the
+    kinds of favourites whose content changed on a fetch. Stale entries
+    restored from a warm-start snapshot are served until `revalidate`
+    replaces them, or for `DEFAULT_TTL` seconds at least if it fails.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def _fresh(self, entry):
+        age = time.monotonic() - entry.fetched_at
+        if entry.stale:
+            return age < max(self.ttl, DEFAULT_TTL)
+        return age < self.ttl
+
+    def _entry(self, session, kind):
+        with self._lock:
+            entry = self._entries.get(kind)
+        if entry is not None and self._fresh(entry):
+            return entry
+        logger.debug('Fetching the favourite %s', kind)
+        return self.update(kind, getattr(session.user.favorites, kind)())
+
+    def get(self, session, kind):
+        return self._entry(session, kind).items
+
+    def distinct(self, session, kind):
+        return list(self._entry(session, kind).names)
+
+    def update(self, kind, items, stale=False):
+        """Store freshly fetched (or, if `stale`, restored) favourites."""
+        entry = _Entry(list(items), stale)
+        with self._lock:
+            previous = self._entries.get(kind)
+            self._entries[kind] = entry
+        if previous is not None and _ids(previous.items) != _ids(entry.items):
+            logger.info('The favourite %s have changed', kind)
+            self._notify(kind)
+        return entry
+
+    def invalidate(self, kind=None):
+        with self._lock:
+            if kind is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(kind, None)
+        self._notify(kind)
+
+    def warm_start(self, favorites):
+        for kind, items in favorites.items():
+            self.update(kind, items, stale=True)
+
+    def revalidate(self, session):
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if e.stale]
+        self.refresh(session, stale)
+        logger.debug('Revalidated the TIDAL favourites')
+
+    def refresh(self, session, kinds=KINDS):
+        """Fetch the favourites again, before their entries expire."""
+        for kind in kinds:
+            self.update(kind, getattr(session.user.favorites, kind)())
+
+    def snapshot(self):
+        """The favourites seen last, to be saved in a snapshot."""
+        with self._lock:
+            return {kind: e.items for kind, e in self._entries.items()}
+
+    def add_listener(self, callback):
+        """Call `callback(kind)` when favourites change (None: all kinds)."""
+        ref = weakref.WeakMethod(callback) \
+            if hasattr(callback, '__func__') else (lambda: callback)
+        with self._lock:
+            self._listeners.append(ref)
+
+    def _notify(self, kind):
+        with self._lock:
+            self._listeners = [r for r in self._listeners if r() is not None]
+            listeners = [r() for r in self._listeners]
+        for callback in listeners:
+            if callback is not None:
+                callback(kind)
+
+
+favorites_store = FavoritesStore()
+
+
+def configure(ttl=None):
+    favorites_store.ttl = DEFAULT_TTL if ttl is None else ttl
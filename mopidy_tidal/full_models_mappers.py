@@ -4,25 +4,36 @@ import logging
 
 from mopidy.models import Album, Artist, Playlist, Track
 
+from mopidy_tidal.display import (
+    high_title, lossless_title, low_title, master_title,
+)
 from mopidy_tidal.helpers import to_timestamp
-
-from mopidy_tidal.backend import Quality
-from mopidy_tidal.display import master_title, lossless_title, high_title, low_title
-from mopidy_tidal.lru_cache import cache_track, cache_image
+from mopidy_tidal.lru_cache import cache_image, cache_track
+from mopidy_tidal.search_index import indexed
+from mopidy_tidal.uri import album_uri, artist_uri, track_uri
 
 logger = logging.getLogger(__name__)
 
+# Track titles by `tidaloauth4mopidy.Quality` value
+_QUALITY_TITLES = {
+    'HI_RES': master_title,
+    'LOSSLESS': lossless_title,
+    'HIGH': high_title,
+    'LOW': low_title,
+}
+
 
 def create_mopidy_artists(tidal_artists):
     return [create_mopidy_artist(a) for a in tidal_artists]
 
 
+@indexed
 @cache_image
 def create_mopidy_artist(tidal_artist):
     if tidal_artist is None:
         return None
 
-    return Artist(uri="tidal:artist:{0}".format(tidal_artist.id),
+    return Artist(uri=artist_uri(tidal_artist.id),
                   name=tidal_artist.name)
 
 
@@ -30,13 +41,13 @@ def create_mopidy_albums(tidal_albums):
     return [create_mopidy_album(a, None) for a in tidal_albums]
 
 
+@indexed
 @cache_image
 def create_mopidy_album(tidal_album, artist=None):
     if artist is None:
         artist = create_mopidy_artist(tidal_album.artist)
 
-    return Album(uri="tidal:album:{0}:{1}".format(tidal_album.artist.id,
-                                                  tidal_album.id),
+    return Album(uri=album_uri(tidal_album.artist.id, tidal_album.id),
                  name=tidal_album.name,
                  artists=[artist])
 
@@ -45,11 +56,11 @@ def create_mopidy_tracks(tidal_tracks):
     return [create_mopidy_track(t) for t in tidal_tracks]
 
 
+@indexed
 @cache_track
 def create_mopidy_track(tidal_track, artist=None, album=None):
-    uri = "tidal:track:{0}:{1}:{2}".format(tidal_track.artist.id,
-                                           tidal_track.album.id,
-                                           tidal_track.id)
+    uri = track_uri(tidal_track.artist.id, tidal_track.album.id,
+                    tidal_track.id)
     if artist is None:
         artist = create_mopidy_artist(tidal_track.artist)
     if album is None:
@@ -57,14 +68,9 @@ def create_mopidy_track(tidal_track, artist=None, album=None):
 
     track_len = tidal_track.duration * 1000
     track_name = tidal_track.name
-    if tidal_track.quality == Quality.master.value:
-        track_name = master_title(track_name)
-    elif tidal_track.quality == Quality.lossless.value:
-        track_name = lossless_title(track_name)
-    elif tidal_track.quality == Quality.high.value:
-        track_name = high_title(track_name)
-    elif tidal_track.quality == Quality.low.value:
-        track_name = low_title(track_name)
+    title = _QUALITY_TITLES.get(tidal_track.quality)
+    if title is not None:
+        track_name = title(track_name)
     return Track(uri=uri,
                  name=track_name,
                  track_no=tidal_track.track_num,
@@ -1,33 +1,53 @@
 from __future__ import unicode_literals
 
 import logging
-from typing import List
-
-from requests.exceptions import HTTPError
 
 from mopidy import backend, models
-
 from mopidy.models import Image, SearchResult
 
-from mopidy_tidal import (
-    full_models_mappers,
-    ref_models_mappers,
+from mopidy_tidal import full_models_mappers, ref_models_mappers
+from mopidy_tidal.browse_cache import BrowseCache, directory_ttls
+from mopidy_tidal.favorites import favorites_store
+from mopidy_tidal.lru_cache import image_cache, track_cache, with_cache
+from mopidy_tidal.metrics import registry
+from mopidy_tidal.paging import (
+    FavoritesPager, PAGED_DIRECTORIES, parse_page_uri,
 )
-
-from mopidy_tidal.lru_cache import with_cache, image_cache
-
-from mopidy_tidal.playlists import PlaylistCache
-
+from mopidy_tidal.refresh import foreground
+from mopidy_tidal.search_index import search_index
+from mopidy_tidal.uri import parse, try_parse
 from mopidy_tidal.utils import apply_watermark
-
-from mopidy_tidal.spotify_proxy import SpotifyProxy
+from mopidy_tidal.workers import run_concurrently
 
 logger = logging.getLogger(__name__)
 
 
+# Directories browsed again by the background refreshes
+REFRESHED_DIRECTORIES = (
+    'tidal:genres', 'tidal:moods', 'tidal:my_artists', 'tidal:my_albums',
+    'tidal:my_playlists', 'tidal:my_tracks',
+)
+
+
 class TidalLibraryProvider(backend.LibraryProvider):
     root_directory = models.Ref.directory(uri='tidal:directory', name='Tidal')
 
+    def __init__(self, *args, **kwargs):
+        super(TidalLibraryProvider, self).__init__(*args, **kwargs)
+        favorites_store.add_listener(self._on_favorites_changed)
+
+    def _favorites(self, kind):
+        return favorites_store.get(self.backend.session, kind)
+
+    def _favorite_names(self, kind):
+        return favorites_store.distinct(self.backend.session, kind)
+
+    def _on_favorites_changed(self, kind):
+        pager = getattr(self, '_favorites_pager', None)
+        if pager is not None:
+            pager.invalidate()
+
+    @foreground
     def get_distinct(self, field, query=None):
         from mopidy_tidal.search import tidal_search
 
@@ -36,96 +56,187 @@ class TidalLibraryProvider(backend.LibraryProvider):
 
         if not query:  # library root
             if field == "artist" or field == "albumartist":
-                return [apply_watermark(a.name) for a in
-                        session.user.favorites.artists()]
+                return self._favorite_names('artists')
             elif field == "album":
-                return [apply_watermark(a.name) for a in
-                        session.user.favorites.albums()]
+                return self._favorite_names('albums')
             elif field == "track":
-                return [apply_watermark(t.name) for t in
-                        session.user.favorites.tracks()]
+                return self._favorite_names('tracks')
         else:
             if field == "artist":
-                return [apply_watermark(a.name) for a in
-                        session.user.favorites.artists()]
+                return self._favorite_names('artists')
             elif field == "album" or field == "albumartist":
+                if self._local_search:
+                    names = search_index.distinct('album', query)
+                    if names:
+                        return [apply_watermark(n) for n in names]
                 artists, _, _ = tidal_search(session,
                                              query=query,
                                              exact=True)
                 if len(artists) > 0:
                     artist = artists[0]
-                    artist_id = artist.uri.split(":")[2]
                     return [apply_watermark(a.name) for a in
-                            session.get_artist_albums(artist_id)]
+                            session.get_artist_albums(parse(artist.uri).id)]
             elif field == "track":
-                return [apply_watermark(t.name) for t in
-                        session.user.favorites.tracks()]
+                return self._favorite_names('tracks')
 
         return []
 
+    @foreground
     def browse(self, uri):
         logger.debug("Browsing uri %s", uri)
         if not uri or not uri.startswith("tidal:"):
             return []
 
-        session = self.backend.session
+        return self._browse_cache.get_or_browse(uri, self._browse)
+
+    def refresh_directories(self, uris=REFRESHED_DIRECTORIES):
+        """Browse directories again, to keep their cache entries fresh."""
+        for uri in uris:
+            self._browse_cache.refresh(uri, self._browse)
 
-        # summaries
-        if uri == self.root_directory.uri:
-            return ref_models_mappers.create_root()
-
-        elif uri == "tidal:my_artists":
-            return ref_models_mappers.create_artists(
-                    session.user.favorites.artists())
-        elif uri == "tidal:my_albums":
-            return ref_models_mappers.create_albums(
-                    session.user.favorites.albums())
-        elif uri == "tidal:my_playlists":
-            return ref_models_mappers.create_playlists(
-                    session.user.favorites.playlists())
-        elif uri == "tidal:my_tracks":
-            return ref_models_mappers.create_tracks(
-                    session.user.favorites.tracks())
-        elif uri == "tidal:moods":
-            return ref_models_mappers.create_moods(
-                    session.get_moods())
-        elif uri == "tidal:genres":
-            return ref_models_mappers.create_genres(
-                    session.get_genres())
+    def _browse(self, uri):
+        browse_directory = self._BROWSE_DIRECTORIES.get(uri)
+        if browse_directory is not None:
+            return browse_directory(self, uri)
 
         # details
 
-        parts = uri.split(':')
-        nr_of_parts = len(parts)
+        directory, page = parse_page_uri(uri)
+        if directory and self._pager:
+            return self._browse_page(directory, page)
 
-        if nr_of_parts == 4 and parts[1] == "album":
-            return ref_models_mappers.create_tracks(
-                    session.get_album_tracks(parts[3]))
+        parsed = try_parse(uri)
+        browse_item = parsed and self._BROWSE_ITEMS.get(parsed.kind)
+        if browse_item is None:
+            logger.error('Unknown uri for browse request: %s', uri)
+            return []
+        return browse_item(self, parsed)
 
-        if nr_of_parts == 3 and parts[1] == "artist":
-            top_10_tracks = session.get_artist_top_tracks(parts[2])[:10]
-            albums = ref_models_mappers.create_albums(
-                    session.get_artist_albums(parts[2]))
-            return albums + ref_models_mappers.create_tracks(top_10_tracks)
+    # summaries
 
-        if nr_of_parts == 3 and parts[1] == "playlist":
-            return ref_models_mappers.create_tracks(
-                session.get_playlist_tracks(parts[2]))
+    def _browse_root(self, uri):
+        return ref_models_mappers.create_root()
 
-        if nr_of_parts == 3 and parts[1] == "mood":
-            return ref_models_mappers.create_playlists(
-                session.get_mood_playlists(parts[2]))
+    def _browse_my_artists(self, uri):
+        return ref_models_mappers.create_artists(self._favorites('artists'))
 
-        if nr_of_parts == 3 and parts[1] == "genre":
-            return ref_models_mappers.create_playlists(
-                session.get_genre_items(parts[2], 'playlists'))
+    def _browse_my_albums(self, uri):
+        if self._pager:
+            return self._browse_page(uri, 0)
+        return ref_models_mappers.create_albums(self._favorites('albums'))
 
-        logger.error('Unknown uri for browse request: %s', uri)
-        return []
+    def _browse_my_playlists(self, uri):
+        return ref_models_mappers.create_playlists(
+            self._favorites('playlists'))
+
+    def _browse_my_tracks(self, uri):
+        if self._pager:
+            return self._browse_page(uri, 0)
+        return ref_models_mappers.create_tracks(self._favorites('tracks'))
 
+    def _browse_moods(self, uri):
+        return ref_models_mappers.create_moods(
+            self.backend.session.get_moods())
+
+    def _browse_genres(self, uri):
+        return ref_models_mappers.create_genres(
+            self.backend.session.get_genres())
+
+    # details
+
+    def _browse_album(self, uri):
+        return ref_models_mappers.create_tracks(
+            self.backend.session.get_album_tracks(uri.album_id))
+
+    def _browse_artist(self, uri):
+        session = self.backend.session
+        top_tracks, artist_albums = run_concurrently(
+            lambda fetch: fetch(uri.artist_id),
+            [session.get_artist_top_tracks, session.get_artist_albums])
+        albums = ref_models_mappers.create_albums(artist_albums)
+        return albums + ref_models_mappers.create_tracks(top_tracks[:10])
+
+    def _browse_playlist(self, uri):
+        return ref_models_mappers.create_tracks(
+            self.backend.session.get_playlist_tracks(uri.id))
+
+    def _browse_mood(self, uri):
+        return ref_models_mappers.create_playlists(
+            self.backend.session.get_mood_playlists(uri.id))
+
+    def _browse_genre(self, uri):
+        return ref_models_mappers.create_playlists(
+            self.backend.session.get_genre_items(uri.id, 'playlists'))
+
+    # Browse handlers of the directories, by URI, and of the items, by kind
+    _BROWSE_DIRECTORIES = {
+        root_directory.uri: _browse_root,
+        'tidal:my_artists': _browse_my_artists,
+        'tidal:my_albums': _browse_my_albums,
+        'tidal:my_playlists': _browse_my_playlists,
+        'tidal:my_tracks': _browse_my_tracks,
+        'tidal:moods': _browse_moods,
+        'tidal:genres': _browse_genres,
+    }
+    _BROWSE_ITEMS = {
+        'album': _browse_album,
+        'artist': _browse_artist,
+        'playlist': _browse_playlist,
+        'mood': _browse_mood,
+        'genre': _browse_genre,
+    }
+
+    @property
+    def _local_search(self):
+        return self.backend._config['tidal'].get('local_search', True)
+
+    @property
+    def _browse_cache(self):
+        cache = getattr(self, '_browse_memo', None)
+        if cache is None:
+            tidal_config = self.backend._config['tidal']
+            cache = self._browse_memo = BrowseCache(directory_ttls(
+                tidal_config.get('browse_directory_ttl'),
+                tidal_config.get('browse_artist_ttl')))
+            registry.register_cache('browse', cache)
+        return cache
+
+    @property
+    def _pager(self):
+        pager = getattr(self, '_favorites_pager', None)
+        if pager is None:
+            page_size = self.backend._config['tidal'].get('browse_page_size')
+            if not page_size:
+                return None
+            pager = self._favorites_pager = FavoritesPager(page_size)
+        return pager
+
+    def _browse_page(self, uri, number):
+        kind = PAGED_DIRECTORIES[uri]
+        items, has_more = self._pager.get_page(
+            self.backend.session, kind, number)
+        # Return the page first: its tracks are cached in the background
+        if kind == 'tracks':
+            refs = ref_models_mappers.create_tracks(items, defer_caching=True)
+        else:
+            refs = ref_models_mappers.create_albums(items, defer_caching=True)
+        if has_more:
+            refs.append(ref_models_mappers.create_page_link(uri, number + 1))
+        return refs
+
+    @foreground
     def search(self, query=None, uris=None, exact=False):
         from mopidy_tidal.search import tidal_search
 
+        if self._local_search and query:
+            local_results = search_index.search(query, exact=exact)
+            if local_results is not None:
+                logger.info('Search answered from the local index: %r', query)
+                artists, albums, tracks = local_results
+                return SearchResult(artists=artists,
+                                    albums=albums,
+                                    tracks=tracks)
+
         try:
             artists, albums, tracks = \
                 tidal_search(self.backend.session,
@@ -138,84 +249,202 @@ class TidalLibraryProvider(backend.LibraryProvider):
             logger.critical("%r", ex)
 
     @staticmethod
-    def _get_image_uri(obj):
+    def _image_key(uri):
+        """Cache key of the artwork of an item: tracks use their album's."""
+        parsed = try_parse(uri)
+        if parsed is not None and parsed.kind == 'track':
+            return parsed.album_uri
+        return uri
+
+    def _fetch_image(self, uri):
+        parsed = try_parse(uri)
+        get_item = parsed and self._IMAGE_ITEMS.get(parsed.kind)
+        if get_item is None:
+            return None
         try:
-            return obj.picture(width=750, height=750)
-        except AttributeError:
-            pass
-
-    def _get_images(self, uri) -> List[Image]:
-        assert uri.startswith('tidal:'), f'Invalid TIDAL URI: {uri}'
-
-        parts = uri.split(':')
-        item_type = parts[1]
-        if item_type == 'track':
-            # For tracks, retrieve the artwork of the associated album
-            item_type = 'album'
-            item_id = parts[3]
-            uri = ':'.join([parts[0], 'album', parts[3]])
-        else:
-            item_id = parts[2]
-
-        if uri in self._image_cache:
-            # Cache hit
-            return self._image_cache[uri]
-
-        logger.debug('Retrieving %r from the API', uri)
-        getter_name = f'get_{item_type}'
-        getter = getattr(self._session, getter_name, None)
-        assert getter, f'No such session method: {getter_name}'
-
-        item = getter(item_id)
-        if not item:
-            logger.debug('%r is not available on the backend', uri)
-            return []
-
-        img_uri = self._get_image_uri(item)
-        if not img_uri:
-            logger.debug('%r has no associated images', uri)
-            return []
+            item = get_item(self.backend.session, parsed.id)
+        except Exception as ex:
+            logger.warning('Could not retrieve the image of %s: %r', uri, ex)
+            return None
 
-        logger.debug('Image URL for %r: %r', uri, img_uri)
-        return [Image(uri=img_uri, width=320, height=320)]
+        uri_image = getattr(item, 'image', None) if item else None
+        logger.debug("Setting image cache (%s) with %s = %s",
+                     len(image_cache), uri, uri_image)
+        image_cache[uri] = uri_image
+        return uri_image
 
+    @foreground
     def get_images(self, uris):
         logger.debug("Searching Tidal for images for %r" % uris)
-        return {uri: self._get_images(uri) for uri in uris}
-
-    def _get_images(self, uri):
-        parts = uri.split(':')
-        if parts[1] == 'track':
-            uri = '{0}:album:{2}:{3}'.format(*parts)
-            parts = uri.split(':')
-        uri_image = image_cache.hit(uri)
-        if uri_image is None and self.backend.image_search:
-            logger.info('CACHE HIT MISS: %s', uri)
-            if parts[1] == 'artist':
-                uri_image = self.backend.session.get_artist(artist_id=parts[2]).image
-            elif parts[1] == 'album':
-                uri_image = self.backend.session.get_album(album_id=parts[3]).image
-            logger.info("Setting image cache (%s) with %s = %s", len(image_cache), uri, uri_image)
-            image_cache[uri] = uri_image
-        return [Image(uri=uri_image, width=512, height=512)] if uri_image else ()
-
+        keys = {uri: self._image_key(uri) for uri in uris}
+        images = {key: image_cache.hit(key) for key in set(keys.values())}
+
+        missing = [key for key, image in images.items() if image is None]
+        if missing and self.backend.image_search:
+            logger.info('Image cache miss for %d items', len(missing))
+            images.update(zip(missing,
+                              run_concurrently(self._fetch_image, missing)))
+            image_cache.flush()
+
+        return {
+            uri: [Image(uri=images[key], width=512, height=512)]
+            if images[key] else ()
+            for uri, key in keys.items()
+        }
+
+    @foreground
     def lookup(self, uris=None):
         logger.debug("Lookup uris %r", uris)
         if isinstance(uris, str):
             uris = [uris]
         if not hasattr(uris, '__iter__'):
             uris = [uris]
-        return [t for tracks in (self._lookup(uri) for uri in uris) for t in tracks]
+        uris = list(uris)
+        expanded = self._expand_spotify(uris)
+        uris = [u for uri in uris for u in expanded.get(uri, [uri])]
+        results = self._lookup_many(uris)
+        return [t for uri in uris for t in results.get(uri, [])]
+
+    @property
+    def _spotify(self):
+        proxy = getattr(self, '_spotify_proxy', None)
+        if proxy is None:
+            tidal_config = self.backend._config['tidal']
+            if not tidal_config.get('spotify_proxy'):
+                return None
+            from mopidy_tidal.spotify_proxy import SpotifyProxy
+            proxy = self._spotify_proxy = SpotifyProxy(
+                tidal_config.get('spotify_client_id'),
+                tidal_config.get('spotify_client_secret'))
+        return proxy
+
+    def _expand_spotify(self, uris):
+        """
+        Map the Spotify track and playlist URIs among `uris` to the URIs of
+        the matching TIDAL tracks.
+        """
+        spotify_uris = [uri for uri in uris if uri.startswith('spotify:')]
+        if not spotify_uris:
+            return {}
+        if self._spotify is None:
+            logger.warning('Enable spotify_proxy to look up %s',
+                           spotify_uris[0])
+            return {uri: [] for uri in spotify_uris}
+
+        songs = {}
+        tracks = {}
+        for uri in dict.fromkeys(spotify_uris):
+            try:
+                if uri.startswith('spotify:track:'):
+                    songs.setdefault(uri, None)
+                    tracks[uri] = [uri]
+                elif uri.startswith('spotify:playlist:'):
+                    playlist = self._spotify.get_playlist_songs(uri)
+                    songs.update(playlist)
+                    tracks[uri] = [track_uri for track_uri, _ in playlist]
+                else:
+                    logger.warning('Unsupported Spotify URI: %s', uri)
+            except Exception as ex:
+                logger.error('Lookup of %s failed: %r', uri, ex)
+
+        try:
+            mapping = self._spotify.resolve(songs, self._match_spotify_song)
+        except Exception as ex:
+            logger.error('Resolution of Spotify tracks failed: %r', ex)
+            mapping = {}
+        return {
+            uri: [mapping[t] for t in tracks.get(uri, []) if mapping.get(t)]
+            for uri in spotify_uris
+        }
+
+    def _match_spotify_song(self, info):
+        """URI of the TIDAL track best matching a Spotify song, or ''."""
+        title = info['title'].lower()
+        artists = {a.lower() for a in info['artists']}
+        keyword = ' '.join(info['artists'][:1] + [info['title']])
+        try:
+            tracks = self.backend.session.search('track', keyword).tracks
+        except Exception as ex:
+            logger.error('Search of Spotify song %r failed: %r', keyword, ex)
+            return None
+
+        track = next((t for t in tracks
+                      if (t.name or '').lower() == title and
+                      (getattr(t.artist, 'name', None) or '').lower()
+                      in artists),
+                     tracks[0] if tracks else None)
+        if track is None:
+            return ''
+        # Caches the track for the lookup that follows
+        return full_models_mappers.create_mopidy_track(track).uri
+
+    def _lookup_many(self, uris):
+        """
+        Resolve a batch of URIs with as few API calls as possible: duplicates
+        are looked up once, uncached tracks from the same album are resolved
+        through a single album request and the remaining requests run
+        concurrently on the shared worker pool.
+        """
+        results = {}
+        album_tracks = {}
+        for uri in dict.fromkeys(uris):
+            parsed = try_parse(uri)
+            if parsed is not None and parsed.kind == 'track':
+                track = track_cache.hit(uri)
+                if track is not None:
+                    logger.debug("Found cached: %s", uri)
+                    results[uri] = [track]
+                    continue
+                album_tracks.setdefault(parsed.album_uri, []).append(uri)
+            else:
+                results[uri] = None
+
+        requests = [uri for uri, value in results.items() if value is None]
+        for album_uri, track_uris in album_tracks.items():
+            if album_uri in results:
+                # The album itself is part of the request
+                continue
+            if len(track_uris) > 1:
+                requests.append(album_uri)
+            else:
+                requests.extend(track_uris)
+
+        fetched = dict(zip(requests,
+                           run_concurrently(self._safe_lookup, requests)))
+        for uri in results:
+            if uri in fetched:
+                results[uri] = fetched[uri]
+
+        missing = []
+        for album_uri, track_uris in album_tracks.items():
+            by_uri = {t.uri: t for t in fetched.get(album_uri, [])}
+            for uri in track_uris:
+                if uri in fetched:
+                    results[uri] = fetched[uri]
+                elif uri in by_uri:
+                    results[uri] = [by_uri[uri]]
+                else:
+                    missing.append(uri)
+
+        # Tracks that were not part of their album listing
+        results.update(zip(missing,
+                           run_concurrently(self._safe_lookup, missing)))
+        return results
+
+    def _safe_lookup(self, uri):
+        try:
+            return self._lookup(uri) or []
+        except Exception as ex:
+            logger.error('Lookup of %s failed: %r', uri, ex)
+            return []
 
     @with_cache
     def _lookup(self, uri):
-        parts = uri.split(':')
-        if uri.startswith('tidal:track:'):
-            return self._lookup_track(track_id=parts[4])
-        elif uri.startswith('tidal:album:'):
-            return self._lookup_album(album_id=parts[3])
-        elif uri.startswith('tidal:artist:'):
-            return self._lookup_artist(artist_id=parts[2])
+        parsed = try_parse(uri)
+        lookup_item = parsed and self._LOOKUP_ITEMS.get(parsed.kind)
+        if lookup_item is None:
+            return []
+        return lookup_item(self, parsed.id)
 
     def _lookup_track(self, track_id):
         track = self.backend.session.get_track(track_id)
@@ -230,3 +459,17 @@ class TidalLibraryProvider(backend.LibraryProvider):
         logger.info("Looking up artist ID: %s", artist_id)
         tracks = self.backend.session.get_artist_top_tracks(artist_id)
         return full_models_mappers.create_mopidy_tracks(tracks)
+
+    # Lookup handlers of the items, by kind
+    _LOOKUP_ITEMS = {
+        'track': _lookup_track,
+        'album': _lookup_album,
+        'artist': _lookup_artist,
+    }
+
+    # Session getters of the items that have an image, by kind
+    _IMAGE_ITEMS = {
+        'artist': lambda session, item_id: session.get_artist(item_id),
+        'album': lambda session, item_id: session.get_album(item_id),
+        'playlist': lambda session, item_id: session.get_playlist(item_id),
+    }
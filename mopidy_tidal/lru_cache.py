@@ -4,20 +4,69 @@ import logging
 import os
 import pathlib
 import pickle
-
-from collections import OrderedDict
+import shutil
+import threading
+import zlib
+from collections import OrderedDict, deque
 from functools import wraps
 
+from mopidy.models import Track
+
+from mopidy_tidal import context
+from mopidy_tidal.eviction import create_policy, estimate_size
+from mopidy_tidal.metrics import registry
+from mopidy_tidal.segment_store import SegmentStore
+from mopidy_tidal.track_store import TrackRow, TrackStore
+from mopidy_tidal.uri import try_parse
+
 
 logger = logging.getLogger(__name__)
 
+# Hits recorded before the eviction policy has to catch up with them
+READ_BUFFER_SIZE = 64
+
+_MISSING = object()
+
 
 class LruCache(OrderedDict):
-    def __init__(self, max_size=1024, default_value=''):
+    """
+    In-memory cache of at most `max_size` entries, optionally backed by a
+    persisted storage. The entries to evict are chosen by an eviction
+    `policy` (see :mod:`mopidy_tidal.eviction`), and the estimated size of
+    the entries can also be bounded to `max_bytes`.
+
+    The cache is thread-safe. Writers hold a lock, but in-memory hits do
+    not take it: they are buffered and replayed into the eviction policy by
+    the next writer, so readers never wait behind a writer.
+    """
+
+    storage_types = ('files', 'segments')
+
+    # Whether hits can be served without the lock, which requires packed
+    # entries to remain valid after they are evicted
+    _lock_free_reads = True
+
+    def __init__(self, max_size=1024, persist=False, directory='',
+                 storage='segments', default_value='', policy='lru',
+                 max_bytes=None):
         if max_size <= 0:
             raise ValueError('Invalid size')
+        if storage not in self.storage_types:
+            raise ValueError(f'Invalid storage type: {storage}')
         OrderedDict.__init__(self)
+        self._lock = threading.RLock()
+        self._reads = deque()
         self._max_size = max_size
+        self._policy = create_policy(policy)
+        self._max_bytes = max_bytes or None
+        self._sizes = {}
+        self._bytes = 0
+        self._persist = persist
+        self._directory = directory
+        self._storage = storage
+        self._store = None
+        self._store_config = None
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
         self._check_limit()
         self._default_value = default_value
 
@@ -25,18 +74,88 @@ class LruCache(OrderedDict):
     def max_size(self):
         return self._max_size
 
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def bytes(self):
+        """Estimated size of the entries, if they have a byte budget."""
+        return self._bytes
+
+    @property
+    def policy(self):
+        return self._policy.name
+
+    def configure(self, policy=None, max_bytes=None):
+        """Change the eviction policy and the byte budget of the cache."""
+        with self._lock:
+            self._drain_reads()
+            keys = list(self.keys())
+            if policy is not None and policy != self._policy.name:
+                self._policy = create_policy(policy)
+                for key in keys:
+                    self._policy.insert(key)
+
+            self._max_bytes = max_bytes or None
+            self._sizes.clear()
+            self._bytes = 0
+            if self._max_bytes:
+                for key in keys:
+                    self._account(key, OrderedDict.__getitem__(self, key))
+            self._check_limit()
+
     @property
     def persist(self):
         return self._persist
 
+    @property
+    def storage(self):
+        return self._storage
+
+    @property
+    def stats(self):
+        with self._lock:
+            self._drain_reads()
+            return self._stats
+
+    @property
+    def _cache_dir(self):
+        from mopidy_tidal import Extension
+        return os.path.join(
+            Extension.get_cache_dir(context.get_config()), self._directory)
+
+    @property
+    def _segment_store(self):
+        config = context.get_config()
+        with self._lock:
+            if self._store is None or self._store_config is not config:
+                # Module-level caches outlive a configuration change
+                self.close()
+                self._store = SegmentStore(self._cache_dir)
+                self._store_config = config
+            return self._store
+
     def _cache_filename(self, key: str) -> str:
-        parts = key.split(':')
-        assert len(parts) > 2, f'Invalid TIDAL ID: {key}'
-        cache_dir = os.path.join(self._cache_dir, parts[1], parts[2][:2])
+        uri = try_parse(key)
+        assert uri is not None and uri.ids, f'Invalid TIDAL ID: {key}'
+        cache_dir = os.path.join(self._cache_dir, uri.kind, uri.ids[0][:2])
         pathlib.Path(cache_dir).mkdir(parents=True, exist_ok=True)
         return os.path.join(cache_dir, f'{key}.cache')
 
     def _get_from_storage(self, key):
+        if self.storage == 'segments':
+            value = self._segment_store.get(key)
+        else:
+            value = self._get_from_files(key)
+
+        # Store the persisted item in memory
+        if value is not None:
+            self.__setitem__(key, value, _sync_to_fs=False)
+        logger.debug(f'Persisted cache hit for {key}')
+        return value
+
+    def _get_from_files(self, key):
         cache_file = self._cache_filename(key)
         err = KeyError(key)
         if not os.path.isfile(cache_file):
@@ -46,7 +165,7 @@ class LruCache(OrderedDict):
         # Cache hit on the filesystem
         with open(cache_file, 'rb') as f:
             try:
-                value = pickle.load(f)
+                return pickle.load(f)
             except Exception as e:
                 # If the cache entry on the filesystem is corrupt, reset it
                 logger.warning('Could not deserialize cache file %s: '
@@ -54,36 +173,189 @@ class LruCache(OrderedDict):
                 self._reset_stored_entry(key)
                 raise err
 
-        # Store the filesystem item in memory
-        if value is not None:
-            self.__setitem__(key, value, _sync_to_fs=False)
-        logger.debug(f'Filesystem cache hit for {key}')
+    def _store_entry(self, key, value):
+        if self.storage == 'segments':
+            self._segment_store.put(key, value)
+        else:
+            with open(self._cache_filename(key), 'wb') as f:
+                pickle.dump(value, f)
+
+    def _reset_stored_entry(self, key):
+        if self.storage == 'segments':
+            self._segment_store.delete(key)
+            return
+
+        cache_file = self._cache_filename(key)
+        if os.path.isfile(cache_file):
+            os.unlink(cache_file)
+
+    def flush(self):
+        if self._store is not None:
+            self._store.flush()
+
+    def close(self):
+        with self._lock:
+            if self._store is not None:
+                self._store.close()
+                self._store = None
+
+    def _pack(self, key, value):
+        """Convert a value into its in-memory representation."""
         return value
 
+    def _unpack(self, key, packed):
+        """Convert an in-memory representation back into a value."""
+        return packed
+
+    def _discard(self, key, packed):
+        """Called whenever an entry leaves the in-memory cache."""
+
+    def _account(self, key, packed):
+        size = estimate_size(key) + estimate_size(packed)
+        self._sizes[key] = size
+        self._bytes += size
+
+    def _remove(self, key):
+        packed = OrderedDict.pop(self, key)
+        self._policy.remove(key)
+        self._bytes -= self._sizes.pop(key, 0)
+        self._discard(key, packed)
+
+    def _record_read(self, key):
+        reads = self._reads
+        reads.append(key)
+        if len(reads) >= READ_BUFFER_SIZE and self._lock.acquire(
+                blocking=len(reads) >= 16 * READ_BUFFER_SIZE):
+            try:
+                self._drain_reads()
+            finally:
+                self._lock.release()
+
+    def _drain_reads(self):
+        """Replay the buffered hits into the policy (with the lock held)."""
+        reads = self._reads
+        while reads:
+            key = reads.popleft()
+            self._stats['hits'] += 1
+            if super().__contains__(key):
+                self._policy.access(key)
+
     def __getitem__(self, key, *_, **__):
+        if self._lock_free_reads:
+            packed = super().get(key, _MISSING)
+            if packed is not _MISSING:
+                # Cache hit in memory
+                self._record_read(key)
+                return self._unpack(key, packed)
+
+        with self._lock:
+            try:
+                # Cache hit in memory
+                value = self._unpack(key, super().__getitem__(key))
+            except KeyError as e:
+                if not self.persist:
+                    # No persisted storage -> cache miss
+                    self._stats['misses'] += 1
+                    raise e
+            else:
+                self._policy.access(key)
+                self._stats['hits'] += 1
+                return value
+
+        # Check on the persisted cache, without holding the lock
         try:
-            # Cache hit in memory
-            return super().__getitem__(key)
-        except KeyError as e:
-            if not self.persist:
-                # No persisted storage -> cache miss
-                raise e
-
-        # Check on the persisted cache
-        return self._get_from_storage(key)
+            value = self._get_from_storage(key)
+        except KeyError:
+            with self._lock:
+                self._stats['misses'] += 1
+            raise
+        with self._lock:
+            self._stats['hits'] += 1
+        return value
 
     def __setitem__(self, key, value, _sync_to_fs=True, *_, **__):
-        if super().__contains__(key):
-            del self[key]
-
-        OrderedDict.__setitem__(self, key, self._default_value if value is None else value)
-        self._check_limit()
+        value = self._default_value if value is None else value
+        unchanged = False
+        with self._lock:
+            if super().__contains__(key):
+                old = OrderedDict.pop(self, key)
+                unchanged = self.persist and self._unpack(key, old) == value
+                self._bytes -= self._sizes.pop(key, 0)
+                self._discard(key, old)
+
+            packed = self._pack(key, value)
+            OrderedDict.__setitem__(self, key, packed)
+            self._policy.insert(key)
+            if self._max_bytes:
+                self._account(key, packed)
+            if self.persist and _sync_to_fs and not unchanged:
+                self._store_entry(key, value)
+            self._check_limit()
+
+    def get(self, key, default=None, *args, **kwargs):
+        try:
+            return self.__getitem__(key, *args, **kwargs)
+        except KeyError:
+            return default
+
+    def keys(self):
+        """A copy of the keys, safe to iterate while the cache changes."""
+        with self._lock:
+            return list(OrderedDict.keys(self))
+
+    def values(self):
+        with self._lock:
+            return [self._unpack(key, packed)
+                    for key, packed in OrderedDict.items(self)]
+
+    def items(self):
+        with self._lock:
+            return [(key, self._unpack(key, packed))
+                    for key, packed in OrderedDict.items(self)]
+
+    def hit(self, key):
+        return self.get(key)
+
+    def prune(self, *keys):
+        for key in keys:
+            logger.debug('Pruning key %r from cache %s',
+                         key, self.__class__.__name__)
+            with self._lock:
+                if self.persist:
+                    self._reset_stored_entry(key)
+                if super().__contains__(key):
+                    self._remove(key)
+
+    def _over_limit(self):
+        if len(self) > self.max_size:
+            return True
+        # A single entry is kept, even if it exceeds the byte budget
+        return bool(self._max_bytes) and self._bytes > self._max_bytes \
+            and len(self) > 1
 
     def _check_limit(self):
-        if self.max_size:
-            # delete oldest entries
-            while len(self) > self.max_size:
-                self.popitem(last=False)
+        if not self._over_limit():
+            return
+        self._drain_reads()
+        while self._over_limit():
+            self._remove(self._policy.victim())
+            self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self._reads.clear()
+            self._policy.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def purge(self):
+        """Empty the cache and its persisted storage."""
+        with self._lock:
+            self.clear()
+            if self.persist:
+                self.close()
+                shutil.rmtree(self._cache_dir, ignore_errors=True)
 
 
 class SearchCache(LruCache):
@@ -98,7 +370,9 @@ class SearchCache(LruCache):
                     else "Search cache hit")
         if cached_result is None:
             cached_result = self._func(*args, **kwargs)
-            self[key] = cached_result
+            if getattr(cached_result, 'complete', True):
+                # Do not cache results of timed out or failed requests
+                self[key] = cached_result
 
         return cached_result
 
@@ -139,8 +413,185 @@ class SearchKey(object):
         return query
 
 
-track_cache = LruCache(max_size=1024*16)
-image_cache = LruCache(max_size=1024*16)
+class TrackCache(LruCache):
+    """
+    Track cache that keeps compact rows in memory and shares artist and album
+    objects across entries. `Track` objects are only built on lookup.
+    """
+
+    # Evicted rows release their interned artists and albums
+    _lock_free_reads = False
+
+    def __init__(self, *args, **kwargs):
+        self._tracks = TrackStore()
+        super().__init__(*args, **kwargs)
+
+    def _pack(self, key, value):
+        if isinstance(value, Track):
+            return self._tracks.pack(value)
+        return value
+
+    def _unpack(self, key, packed):
+        if isinstance(packed, TrackRow):
+            return self._tracks.unpack(key, packed)
+        return packed
+
+    def _discard(self, key, packed):
+        if isinstance(packed, TrackRow):
+            self._tracks.release(packed)
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self._tracks = TrackStore()
+
+
+class ShardedCache(object):
+    """
+    Lock-striped cache: the keys are spread by hash over `shards` caches of
+    `cache_class`, each one with its own lock, so that threads only contend
+    on the keys of a same shard. The size and byte budgets are split evenly
+    between the shards.
+
+    The shards of a persisted cache each have their own storage, in a
+    subdirectory of `directory`, and keys are then spread by a hash that is
+    stable across restarts.
+    """
+
+    def __init__(self, shards=8, cache_class=LruCache, max_size=1024,
+                 max_bytes=None, directory='', **kwargs):
+        if shards <= 0:
+            raise ValueError('Invalid number of shards')
+        self._shards = tuple(
+            cache_class(max_size=-(-max_size // shards),
+                        max_bytes=self._split(max_bytes, shards),
+                        directory=os.path.join(directory, '%02d' % shard),
+                        **kwargs)
+            for shard in range(shards))
+        if self.persist:
+            self._hash = self._stable_hash
+
+    _hash = staticmethod(hash)
+
+    @staticmethod
+    def _stable_hash(key):
+        return zlib.crc32(key.encode('utf-8'))
+
+    @staticmethod
+    def _split(max_bytes, shards):
+        return -(-max_bytes // shards) if max_bytes else None
+
+    @property
+    def shards(self):
+        return self._shards
+
+    def _shard(self, key):
+        return self._shards[self._hash(key) % len(self._shards)]
+
+    @property
+    def max_size(self):
+        return sum(shard.max_size for shard in self._shards)
+
+    @property
+    def max_bytes(self):
+        budgets = [shard.max_bytes for shard in self._shards]
+        return sum(budgets) if all(budgets) else None
+
+    @property
+    def bytes(self):
+        return sum(shard.bytes for shard in self._shards)
+
+    @property
+    def policy(self):
+        return self._shards[0].policy
+
+    @property
+    def persist(self):
+        return self._shards[0].persist
+
+    @property
+    def stats(self):
+        stats = {}
+        for shard in self._shards:
+            for stat, value in shard.stats.items():
+                stats[stat] = stats.get(stat, 0) + value
+        return stats
+
+    def configure(self, policy=None, max_bytes=None):
+        budget = self._split(max_bytes, len(self._shards))
+        for shard in self._shards:
+            shard.configure(policy=policy, max_bytes=budget)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def __contains__(self, key):
+        return key in self._shard(key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [key for shard in self._shards for key in list(shard.keys())]
+
+    def __getitem__(self, key):
+        return self._shard(key)[key]
+
+    def __setitem__(self, key, value):
+        self._shard(key)[key] = value
+
+    def get(self, key, default=None):
+        return self._shard(key).get(key, default)
+
+    def hit(self, key):
+        return self.get(key)
+
+    def prune(self, *keys):
+        for key in keys:
+            self._shard(key).prune(key)
+
+    def clear(self):
+        for shard in self._shards:
+            shard.clear()
+
+    def purge(self):
+        for shard in self._shards:
+            shard.purge()
+
+    def flush(self):
+        for shard in self._shards:
+            shard.flush()
+
+    def close(self):
+        for shard in self._shards:
+            shard.close()
+
+
+class ShardedTrackCache(ShardedCache):
+    """Lock-striped :class:`TrackCache`."""
+
+    def __init__(self, shards=8, **kwargs):
+        super().__init__(shards, TrackCache, **kwargs)
+
+
+# Filled concurrently by the search threads, the playback prefetch and the
+# backend actor
+track_cache = ShardedTrackCache(max_size=1024*16, policy='tinylfu',
+                                persist=True, directory='track')
+image_cache = LruCache(max_size=1024*16, persist=True, directory='image')
+
+registry.register_cache('track', track_cache)
+registry.register_cache('image', image_cache)
+
+
+def configure_cache(cache, tidal_config, name):
+    """
+    Apply the `<name>_cache_policy` and `<name>_cache_mb` (byte budget in
+    MiB, 0 for none) settings of the extension config to a cache.
+    """
+    budget = tidal_config.get(f'{name}_cache_mb')
+    cache.configure(policy=tidal_config.get(f'{name}_cache_policy'),
+                    max_bytes=budget * 1024 * 1024 if budget else None)
 
 
 def cache_track(func):
@@ -0,0 +1,250 @@
+from __future__ import unicode_literals
+
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in labels)
+
+
+class Counter(object):
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = \
+                self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            labels = _labels(zip(self.label_names, label_values))
+            yield f'{self.name}{labels} {value}'
+
+
+class Histogram(object):
+    def __init__(self, name, documentation, label_names=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts, total = self._values.get(
+                label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[label_values] = (counts, total + value)
+
+    def count(self, *label_values):
+        counts, _ = self._values.get(label_values, ((), 0.0))
+        return sum(counts)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            values = sorted((k, (list(c), t)) for k, (c, t) in
+                            self._values.items())
+        for label_values, (counts, total) in values:
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield '%s_bucket%s %d' % (
+                    self.name, _labels(labels + [('le', bound)]), cumulative)
+            yield f'{self.name}_sum{_labels(labels)} {total}'
+            yield f'{self.name}_count{_labels(labels)} {cumulative}'
+
+
+class Gauge(object):
+    """Gauge whose samples are read from a callback at scrape time."""
+
+    def __init__(self, name, documentation, collect):
+        self.name = name
+        self.documentation = documentation
+        self._collect = collect
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} gauge'
+        for labels, value in self._collect():
+            yield f'{self.name}{_labels(labels)} {value}'
+
+
+class Registry(object):
+    def __init__(self):
+        self._metrics = []
+        self._caches = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name, cache):
+        """Expose the hit/miss/eviction counters and size of a cache."""
+        self._caches[name] = cache
+
+    def caches(self):
+        return sorted(self._caches.items())
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+api_requests = registry.register(Counter(
+    'tidal_api_requests_total', 'TIDAL API calls by session method.',
+    ('method',)))
+api_errors = registry.register(Counter(
+    'tidal_api_errors_total', 'Failed TIDAL API calls by session method.',
+    ('method',)))
+api_coalesced = registry.register(Counter(
+    'tidal_api_coalesced_total',
+    'TIDAL API calls saved by sharing an identical in-flight call.',
+    ('method',)))
+api_latency = registry.register(Histogram(
+    'tidal_api_request_duration_seconds',
+    'Latency of the TIDAL API calls by session method.', ('method',)))
+
+
+def _cache_stat(stat):
+    def collect():
+        for name, cache in registry.caches():
+            if stat == 'size':
+                value = len(cache)
+            elif stat == 'max_size':
+                value = cache.max_size
+            elif stat == 'bytes':
+                value = cache.bytes
+            else:
+                value = cache.stats[stat]
+            yield [('cache', name)], value
+    return collect
+
+
+for _stat, _doc in (('hits', 'Cache hits.'),
+                    ('misses', 'Cache misses.'),
+                    ('evictions',
+                     'Entries evicted to respect the size limit.'),
+                    ('size', 'Entries held in memory.'),
+                    ('max_size', 'Maximum number of entries held in memory.'),
+                    ('bytes', 'Estimated size in bytes of the entries held '
+                              'in memory, for caches with a byte budget.')):
+    registry.register(Gauge(f'tidal_cache_{_stat}', _doc, _cache_stat(_stat)))
+
+
+def _search_stats():
+    from mopidy_tidal.workers import get_search_executor
+    for stat, value in sorted(get_search_executor().metrics().items()):
+        yield [('stat', stat)], value
+
+
+registry.register(Gauge(
+    'tidal_search_executor', 'Search executor queue depth, request '
+    'counters and cumulated times in seconds.', _search_stats))
+
+
+# Counters of the `count_requests` blocks the current call is part of
+_block_counters = contextvars.ContextVar('tidal_block_counters', default=())
+
+
+@contextlib.contextmanager
+def count_requests():
+    """
+    Count the TIDAL API calls made within the block, by session method,
+    including the calls it fans out to the workers. Yields the `Counter`.
+    """
+    counter = Counter('tidal_block_requests', 'TIDAL API calls of a block.',
+                      ('method',))
+    token = _block_counters.set(_block_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _block_counters.reset(token)
+
+
+class InstrumentedProxy(object):
+    """
+    Wraps a TIDAL session (or one of its `user`/`favorites` attributes) and
+    records a call counter and a latency histogram for every method called
+    through it, labelled with the dotted method name.
+    """
+
+    _nested = ('user', 'favorites')
+
+    def __init__(self, target, prefix=''):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_prefix', prefix)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name in self._nested:
+            return InstrumentedProxy(value, f'{self._prefix}{name}.')
+        if name.startswith('_') or not callable(value):
+            return value
+        return self._instrument(f'{self._prefix}{name}', value)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    @staticmethod
+    def _instrument(method, func):
+        def wrapper(*args, **kwargs):
+            started_at = time.monotonic()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                api_errors.inc(method)
+                raise
+            finally:
+                api_requests.inc(method)
+                api_latency.observe(time.monotonic() - started_at, method)
+                for counter in _block_counters.get():
+                    counter.inc(method)
+        wrapper.__name__ = method
+        return wrapper
@@ -0,0 +1,43 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from mopidy_tidal.metrics import registry
+from mopidy_tidal.utils import catch
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def start_metrics_deamon(port, host='127.0.0.1'):
+    server = HTTPServer((host, port), MetricsHandler)
+    daemon = threading.Thread(
+        name="TidalMetrics",
+        target=server.serve_forever
+    )
+    # Set as a daemon so it will be killed once the main thread is dead
+    daemon.daemon = True
+    daemon.start()
+    logger.info('Serving TIDAL metrics on %s:%d', host, port)
+    return server
+
+
+class MetricsHandler(BaseHTTPRequestHandler, object):
+
+    @catch
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug('Metrics request: ' + format, *args)
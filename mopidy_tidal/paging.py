@@ -0,0 +1,93 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from mopidy_tidal.uri import try_parse
+from mopidy_tidal.workers import submit
+
+logger = logging.getLogger(__name__)
+
+# Browse directories that can be paged, and the favourites list they show
+PAGED_DIRECTORIES = {
+    'tidal:my_tracks': 'tracks',
+    'tidal:my_albums': 'albums',
+}
+
+
+def page_uri(uri, number):
+    return f'{uri}:page:{number}'
+
+
+def parse_page_uri(uri):
+    """Split a paged directory URI into its directory URI and page number."""
+    parsed = try_parse(uri)
+    if parsed is not None and len(parsed.ids) == 2 and \
+            parsed.ids[0] == 'page' and parsed.ids[1].isdigit():
+        directory = f'tidal:{parsed.kind}'
+        if directory in PAGED_DIRECTORIES:
+            return directory, int(parsed.ids[1])
+    return None, None
+
+
+def get_favorites_page(session, kind, offset, limit):
+    """
+    Up to `limit` favourite `kind` items of the user, from `offset`. The
+    TIDAL client only lists whole favourites, so the paged request is built
+    with its mapping helper.
+    """
+    return session._map_request(
+        'users/%s/favorites/%s' % (session.user.id, kind),
+        params={'offset': offset, 'limit': limit}, ret=kind)
+
+
+class FavoritesPager(object):
+    """
+    Reads the favourite tracks and albums one page at a time. At most
+    `max_pages` fetched pages are kept, for `ttl` seconds, and the page after
+    the last one requested is fetched in the background so that paging
+    forward is a memory hit.
+    """
+
+    def __init__(self, page_size, ttl=300, max_pages=64):
+        self.page_size = page_size
+        self._ttl = ttl
+        self._max_pages = max_pages
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fetch(self, session, kind, number):
+        # Ask for one more item to find out whether there is a next page
+        items = get_favorites_page(
+            session, kind, number * self.page_size, self.page_size + 1)
+        page = (items[:self.page_size], len(items) > self.page_size)
+        with self._lock:
+            self._pages.pop((kind, number), None)
+            self._pages[(kind, number)] = (page, time.monotonic())
+            while len(self._pages) > self._max_pages:
+                self._pages.popitem(last=False)
+        return page
+
+    def _cached(self, kind, number):
+        with self._lock:
+            entry = self._pages.get((kind, number))
+        if entry is not None and time.monotonic() - entry[1] < self._ttl:
+            return entry[0]
+        return None
+
+    def get_page(self, session, kind, number):
+        """Return the items of a page and whether more pages follow."""
+        page = self._cached(kind, number)
+        if page is None:
+            logger.debug('Fetching page %d of favourite %s', number, kind)
+            page = self._fetch(session, kind, number)
+
+        if page[1] and self._cached(kind, number + 1) is None:
+            submit(self._fetch, session, kind, number + 1)
+        return page
+
+    def invalidate(self):
+        with self._lock:
+            self._pages.clear()
@@ -1,18 +1,156 @@
 from __future__ import unicode_literals
 
 import logging
+import threading
+import time
+from collections import OrderedDict
 
 from mopidy import backend
 
+import pykka
+
+from mopidy_tidal.refresh import foreground
+from mopidy_tidal.uri import parse
+from mopidy_tidal.workers import submit
+
 logger = logging.getLogger(__name__)
 
 
+class MediaUrlCache(object):
+    """Expiring cache of stream URLs, keyed by track ID and quality."""
+
+    def __init__(self, ttl=600, max_size=256):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, track_id, quality):
+        with self._lock:
+            entry = self._urls.get((track_id, quality))
+            if entry is None:
+                return None
+            url, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._urls[(track_id, quality)]
+                return None
+            return url
+
+    def put(self, track_id, quality, url):
+        with self._lock:
+            self._urls.pop((track_id, quality), None)
+            self._urls[(track_id, quality)] = \
+                (url, time.monotonic() + self._ttl)
+            while len(self._urls) > self._max_size:
+                self._urls.popitem(last=False)
+
+
+class MediaUrlPrefetcher(object):
+    """
+    Resolves the stream URLs of the tracks that follow the one currently
+    being played, so that the next `translate_uri` is a memory hit.
+    """
+
+    def __init__(self, provider, count=2, timeout=10):
+        self._provider = provider
+        self._count = count
+        self._timeout = timeout
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, uri):
+        if self._count > 0:
+            submit(self._prefetch_after, uri)
+
+    def _upcoming_uris(self, uri):
+        refs = pykka.ActorRegistry.get_by_class_name('Core')
+        if not refs:
+            return []
+
+        tracklist = refs[0].proxy().tracklist
+        uris = [tl.track.uri for tl in
+                tracklist.get_tl_tracks().get(timeout=self._timeout)]
+        current = tracklist.index().get(timeout=self._timeout) or 0
+        try:
+            position = uris.index(uri, current)
+        except ValueError:
+            if uri not in uris:
+                return []
+            position = uris.index(uri)
+
+        return [u for u in uris[position + 1:]
+                if u.startswith('tidal:track:')][:self._count]
+
+    def _prefetch_after(self, uri):
+        try:
+            upcoming = self._upcoming_uris(uri)
+        except Exception as e:
+            logger.debug('Could not read the tracklist for prefetch: %r', e)
+            return
+
+        for next_uri in upcoming:
+            track_id = int(parse(next_uri).id)
+            with self._lock:
+                if track_id in self._in_flight:
+                    continue
+                self._in_flight.add(track_id)
+            try:
+                self._provider.resolve_media_url(track_id)
+                logger.debug('Prefetched media URL for %s', next_uri)
+            except Exception as e:
+                logger.warning('Could not prefetch %s: %r', next_uri, e)
+            finally:
+                with self._lock:
+                    self._in_flight.discard(track_id)
+
+
+class RecentAlbums(object):
+    """The albums of the tracks played last, most recent first."""
+
+    def __init__(self, max_size=20):
+        self._max_size = max_size
+        self._albums = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, album_uri):
+        with self._lock:
+            self._albums.pop(album_uri, None)
+            self._albums[album_uri] = None
+            while len(self._albums) > self._max_size:
+                self._albums.popitem(last=False)
+
+    def __call__(self):
+        with self._lock:
+            return list(reversed(self._albums))
+
+
 class TidalPlaybackProvider(backend.PlaybackProvider):
 
+    def __init__(self, *args, **kwargs):
+        super(TidalPlaybackProvider, self).__init__(*args, **kwargs)
+        config = getattr(self.backend, '_config', None) or {}
+        tidal_config = config.get('tidal', {})
+        ttl = tidal_config.get('media_url_ttl')
+        self._media_urls = MediaUrlCache(ttl=600 if ttl is None else ttl)
+        self._prefetcher = MediaUrlPrefetcher(
+            self, count=tidal_config.get('prefetch_tracks') or 0)
+        self.recent_albums = RecentAlbums()
+
+    def resolve_media_url(self, track_id):
+        quality = self.backend.quality
+        url = self._media_urls.get(track_id, quality)
+        if url is None:
+            url = self.backend.session.get_media_url(track_id)
+            self._media_urls.put(track_id, quality, url)
+        return url
+
+    @foreground
     def translate_uri(self, uri):
         logger.info("TIDAL uri: %s", uri)
-        parts = uri.split(':')
-        track_id = int(parts[4])
-        newurl = self.backend.session.get_media_url(track_id)
+        parsed = parse(uri)
+        track_id = int(parsed.id)
+        self.recent_albums.add(parsed.album_uri)
+        newurl = self.resolve_media_url(track_id)
+        self._prefetcher.schedule(uri)
         logger.info("transformed into %s", newurl)
         return newurl
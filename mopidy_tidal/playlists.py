@@ -1,43 +1,75 @@
 from __future__ import unicode_literals
 
+import copy
 import logging
 import operator
-from typing import Optional, Union, Tuple, Collection
-
-from tidalapi.models import Playlist as TidalPlaylist
+import time
+from typing import (
+    Dict, List, NamedTuple, Optional, TYPE_CHECKING, Union,
+)
 
 from mopidy import backend
 from mopidy.models import Playlist as MopidyPlaylist, Ref
 
-from mopidy_tidal import display
-from mopidy_tidal import full_models_mappers
+from mopidy_tidal import display, full_models_mappers
+from mopidy_tidal.favorites import favorites_store
 from mopidy_tidal.helpers import to_timestamp
-from mopidy_tidal.lru_cache import LruCache
+from mopidy_tidal.lru_cache import LruCache, configure_cache
+from mopidy_tidal.metrics import registry
+from mopidy_tidal.refresh import foreground
+from mopidy_tidal.uri import parse, playlist_uri
+from mopidy_tidal.workers import run_concurrently
 
+if TYPE_CHECKING:
+    from tidaloauth4mopidy.models import Playlist as TidalPlaylist
 
 logger = logging.getLogger(__name__)
 
 
+def _last_modified(tidal_playlist) -> int:
+    """Last update of a TIDAL playlist, in milliseconds (0 if unknown)."""
+    return to_timestamp(getattr(tidal_playlist, 'last_updated', None)) * 1000
+
+
+def is_outdated(tidal_playlist, playlist: MopidyPlaylist) -> bool:
+    """
+    Tell whether a cached playlist is older than its upstream version. When
+    TIDAL does not report a last update time, the number of tracks is used.
+    """
+    last_modified = _last_modified(tidal_playlist)
+    if last_modified:
+        return last_modified > (playlist.last_modified or 0)
+
+    num_tracks = getattr(tidal_playlist, 'num_tracks', None)
+    return num_tracks is not None and num_tracks != len(playlist.tracks)
+
+
+# What `fetch_updates` found upstream: the listed favourite playlists, all
+# the playlists by URI and the downloaded ones that are new or have changed
+PlaylistUpdates = NamedTuple('PlaylistUpdates', [
+    ('favourites', list),
+    ('upstream', Dict[str, 'TidalPlaylist']),
+    ('playlists', List[MopidyPlaylist]),
+])
+
+
 class PlaylistCache(LruCache):
     def __getitem__(
-            self, key: Union[str, TidalPlaylist], *args, **kwargs
+            self, key: Union[str, 'TidalPlaylist'], *args, **kwargs
     ) -> MopidyPlaylist:
-        uri = key.id if isinstance(key, TidalPlaylist) else key
-        uri = (
-            f'tidal:playlist:{uri}'
-            if not uri.startswith('tidal:playlist:')
-            else uri
-        )
+        uri = key if isinstance(key, str) else key.id
+        if not uri.startswith('tidal:playlist:'):
+            uri = playlist_uri(uri)
 
         playlist = super().__getitem__(uri, *args, **kwargs)
         if (
-            playlist and isinstance(key, TidalPlaylist) and
-            to_timestamp(key.last_updated) >
-            to_timestamp(playlist.last_modified)
+            playlist and not isinstance(key, str) and
+            is_outdated(key, playlist)
         ):
             # The playlist has been updated since last time:
             # we should refresh the associated cache entry
-            logger.info('The playlist "%s" has been updated: refresh forced', key.name)
+            logger.info('The playlist "%s" has been updated: refresh forced',
+                        key.name)
             raise KeyError(uri)
 
         return playlist
@@ -47,57 +79,140 @@ class TidalPlaylistsProvider(backend.PlaylistsProvider):
 
     def __init__(self, *args, **kwargs):
         super(TidalPlaylistsProvider, self).__init__(*args, **kwargs)
-        self._playlists = PlaylistCache()
-
-    def _calculate_added_and_removed_playlist_ids(self) \
-            -> Tuple[Collection[str], Collection[str]]:
-        session = self.backend._session
-        updated_playlists = [
-            *session.user.favorites.playlists(),
-            *session.user.playlists(),
-        ]
+        self._playlists = PlaylistCache(persist=True, directory='playlist')
+        registry.register_cache('playlist', self._playlists)
+        config = getattr(self.backend, '_config', None) or {}
+        configure_cache(self._playlists, config.get('tidal', {}), 'playlist')
+        self._check_interval = config.get('tidal', {}).get(
+            'playlist_check_interval') or 0
+        self._last_checked = {}
+        self._last_sync = 0
+        self._warm_refs = None
+
+    def _is_fresh(self, key) -> bool:
+        checked_at = self._last_checked.get(key)
+        return checked_at is not None and \
+            time.monotonic() - checked_at < self._check_interval
+
+    def _list_playlists(self):
+        """
+        List the user and favourite playlists in one pass: returns the
+        favourite playlists, as listed, and all of them by URI.
+        """
+        session = self.backend.session
+        listed = session.user.favorites.playlists()
+        # The listings may be shared with concurrent callers: tag copies
+        favourites = [copy.copy(pl) for pl in listed]
+        for pl in favourites:
+            pl.name = display.fav_item(pl.name)
 
-        updated_ids = set(pl.id for pl in updated_playlists)
+        # Favourites come last to keep the tagged name if there are duplicates
+        return listed, {
+            playlist_uri(pl.id): pl
+            for pl in [*session.user.playlists(), *favourites]
+        }
+
+    def _fetch_playlist(self, tidal_playlist) -> MopidyPlaylist:
+        pl_tracks = self.backend.session.get_playlist_tracks(tidal_playlist.id)
+        tracks = full_models_mappers.create_mopidy_tracks(pl_tracks)
+        return MopidyPlaylist(uri=playlist_uri(tidal_playlist.id),
+                              name=display.tidal_item(tidal_playlist.name),
+                              tracks=tracks,
+                              last_modified=_last_modified(tidal_playlist) or
+                              int(time.time() * 1000))
+
+    def _sync(self, force=False) -> bool:
+        """
+        Bring the cache in line with the upstream playlists, unless it was
+        checked within the check interval. Returns whether anything changed.
+        """
+        if not force and self._playlists and self._is_fresh(None):
+            return False
+        return self._store(self.fetch_updates())
+
+    def fetch_updates(self) -> PlaylistUpdates:
+        """
+        List the upstream playlists and download, concurrently, the ones that
+        are new or have changed since they were cached. Nothing is stored, so
+        that the requests can be made off the backend actor.
+        """
+        favourites, upstream = self._list_playlists()
+        outdated = []
+        for uri, tidal_playlist in upstream.items():
+            cached = self._playlists.get(uri)
+            if cached is None or is_outdated(tidal_playlist, cached):
+                outdated.append(tidal_playlist)
+        if outdated:
+            logger.info('Downloading %d new or updated TIDAL playlists',
+                        len(outdated))
+        return PlaylistUpdates(
+            favourites, upstream,
+            list(run_concurrently(self._fetch_playlist, outdated)))
+
+    def _store(self, updates: PlaylistUpdates) -> bool:
+        """
+        Store what `fetch_updates` found: downloaded playlists are cached,
+        renamed ones updated and the ones that are gone pruned. Returns
+        whether anything changed.
+        """
+        favorites_store.update('playlists', updates.favourites)
+        now = time.monotonic()
+        self._last_checked[None] = now
+
+        downloaded = {playlist.uri for playlist in updates.playlists}
+        renamed = False
+        for uri, tidal_playlist in updates.upstream.items():
+            cached = None if uri in downloaded else self._playlists.get(uri)
+            name = display.tidal_item(tidal_playlist.name)
+            if cached is not None and cached.name != name:
+                self._playlists[uri] = cached.replace(name=name)
+                renamed = True
+            self._last_checked[uri] = now
+
+        removed = [uri for uri in self._playlists.keys()
+                   if uri not in updates.upstream]
+        self._playlists.prune(*removed)
+
+        for playlist in updates.playlists:
+            self._playlists[playlist.uri] = playlist
+
+        return bool(updates.playlists or removed or renamed)
+
+    def warm_start(self, playlists):
+        """Answer `as_list` from the `(uri, name)` pairs of a snapshot."""
+        self._warm_refs = [Ref.playlist(uri=uri, name=name)
+                           for uri, name in playlists]
+
+    def apply_updates(self, updates: PlaylistUpdates):
+        """
+        Store the result of `fetch_updates`, in place of the playlists of the
+        warm-start snapshot. Runs on the backend actor.
+        """
+        changed = self._store(updates)
+        warm = self._warm_refs is not None
+        self._warm_refs = None
+        if changed or warm:
+            backend.BackendListener.send('playlists_loaded')
+
+    def revalidate(self):
+        """Replace the playlists of the warm-start snapshot by upstream's."""
+        self.apply_updates(self.fetch_updates())
+
+    def playlists_snapshot(self):
+        """The `(uri, name)` pairs of the playlists, saved in a snapshot."""
+        if self._warm_refs is not None:
+            return [(ref.uri, ref.name) for ref in self._warm_refs]
         if not self._playlists:
-            return updated_ids, set()
-
-        current_ids = set(uri.split(':')[-1] for uri in self._playlists.keys())
-        added_ids = updated_ids.difference(current_ids)
-        removed_ids = current_ids.difference(updated_ids)
-        self._playlists.prune(*[
-            uri for uri in self._playlists.keys()
-            if uri.split(':')[-1] in removed_ids
-        ])
-
-        return added_ids, removed_ids
-
-    def _has_changes(self, playlist: MopidyPlaylist):
-        upstream_playlist = self.backend._session.get_playlist(playlist.uri.split(':')[-1])
-        if not upstream_playlist:
-            return True
-
-        upstream_last_updated_at = to_timestamp(getattr(upstream_playlist, 'last_updated', None))
-        local_last_updated_at = to_timestamp(playlist.last_modified)
-
-        if not upstream_last_updated_at:
-            logger.warning(
-                'You are using a version of python-tidal that does not '
-                'support last_updated on playlist objects'
-            )
-            return True
-
-        if upstream_last_updated_at > local_last_updated_at:
-            logger.info(
-                'The playlist "%s" has been updated: refresh forced', playlist.name
-            )
-            return True
-
-        return False
+            return None
+        return [(pl.uri, pl.name) for pl in self._playlists.values()]
 
+    @foreground
     def as_list(self):
-        added_ids, _ = self._calculate_added_and_removed_playlist_ids()
-        if added_ids:
-            self.refresh()
+        if self._warm_refs is not None:
+            return sorted(self._warm_refs, key=operator.attrgetter('name'))
+
+        if self._sync():
+            backend.BackendListener.send('playlists_loaded')
 
         logger.debug("Listing TIDAL playlists..")
         refs = [
@@ -106,16 +221,26 @@ class TidalPlaylistsProvider(backend.PlaylistsProvider):
         return sorted(refs, key=operator.attrgetter('name'))
 
     def _get_or_refresh_playlist(self, uri) -> Optional[MopidyPlaylist]:
-        if not self._playlists:
+        if not self._playlists and self._warm_refs is None:
             self.refresh()
 
         playlist = self._playlists.get(uri)
-        if playlist is None:
+        if playlist is None or self._is_fresh(uri):
+            return playlist
+
+        upstream = self.backend.session.get_playlist(parse(uri).id)
+        self._last_checked[uri] = time.monotonic()
+        if not upstream:
+            self._playlists.prune(uri)
             return None
-        if self._has_changes(playlist):
-            self.refresh()
+        if is_outdated(upstream, playlist):
+            logger.info('The playlist "%s" has been updated: refresh forced',
+                        playlist.name)
+            self._playlists[uri] = self._fetch_playlist(upstream).replace(
+                name=playlist.name)
         return self._playlists.get(uri)
 
+    @foreground
     def get_items(self, uri):
         playlist = self._get_or_refresh_playlist(uri)
         if not playlist:
@@ -129,38 +254,15 @@ class TidalPlaylistsProvider(backend.PlaylistsProvider):
     def delete(self, uri):
         raise NotImplementedError
 
+    @foreground
     def lookup(self, uri):
         return self._get_or_refresh_playlist(uri)
 
+    @foreground
     def refresh(self):
         logger.debug("Refreshing TIDAL playlists..")
-        playlists = {}
-        session = self.backend.session
-
-        plists = session.user.favorites.playlists()
-        for pl in plists:
-            pl.name = display.fav_item(pl.name)
-        # Append favourites to end to keep the tagged name if there are
-        # duplicates
-        plists = session.user.playlists() + plists
-        mapped_playlists = {}
-
-        for pl in plists:
-            uri = "tidal:playlist:" + pl.id
-            # Cache hit case
-            if pl in self._playlists:
-                continue
-
-            # Cache miss case
-            pl_tracks = session.get_playlist_tracks(pl.id)
-            tracks = full_models_mappers.create_mopidy_tracks(pl_tracks)
-            pl_name = pl.name
-            playlists[uri] = Playlist(uri=uri,
-                                      name=display.tidal_item(pl_name),
-                                      tracks=tracks,
-                                      last_modified=pl.last_updated)
-
-        self._playlists.update(mapped_playlists)
+        favorites_store.invalidate()
+        self._sync(force=True)
         backend.BackendListener.send('playlists_loaded')
         logger.info("TIDAL playlists refreshed")
 
@@ -4,7 +4,15 @@ import logging
 
 from mopidy.models import Ref
 
-from mopidy_tidal.full_models_mappers import create_mopidy_track, create_mopidy_album, create_mopidy_artist
+from mopidy_tidal.full_models_mappers import (
+    create_mopidy_album, create_mopidy_albums, create_mopidy_artist,
+    create_mopidy_track, create_mopidy_tracks,
+)
+from mopidy_tidal.paging import page_uri
+from mopidy_tidal.uri import (
+    album_uri, artist_uri, genre_uri, mood_uri, playlist_uri, track_uri,
+)
+from mopidy_tidal.workers import run_in_background
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +32,7 @@ def create_artists(tidal_artists):
 
 def create_artist(tidal_artist):
     create_mopidy_artist(tidal_artist)
-    return Ref.artist(uri="tidal:artist:{0}".format(tidal_artist.id),
+    return Ref.artist(uri=artist_uri(tidal_artist.id),
                       name=tidal_artist.name)
 
 
@@ -33,7 +41,7 @@ def create_playlists(tidal_playlists):
 
 
 def create_playlist(tidal_playlist):
-    return Ref.playlist(uri="tidal:playlist:{0}".format(tidal_playlist.id),
+    return Ref.playlist(uri=playlist_uri(tidal_playlist.id),
                         name=tidal_playlist.name)
 
 
@@ -42,7 +50,7 @@ def create_moods(tidal_moods):
 
 
 def create_mood(tidal_mood):
-    return Ref.playlist(uri="tidal:mood:{0}".format(tidal_mood.id),
+    return Ref.playlist(uri=mood_uri(tidal_mood.id),
                         name=tidal_mood.name)
 
 
@@ -51,28 +59,55 @@ def create_genres(tidal_genres):
 
 
 def create_genre(tidal_genre):
-    return Ref.playlist(uri="tidal:genre:{0}".format(tidal_genre.id),
+    return Ref.playlist(uri=genre_uri(tidal_genre.id),
                         name=tidal_genre.name)
 
 
-def create_albums(tidal_albums):
-    return [create_album(a) for a in tidal_albums]
+def create_albums(tidal_albums, defer_caching=False):
+    """
+    Refs of albums. With `defer_caching`, the full models are built (for
+    caching) in the background instead of before returning.
+    """
+    if not defer_caching:
+        return [create_album(a) for a in tidal_albums]
+    tidal_albums = list(tidal_albums)
+    run_in_background(create_mopidy_albums, tidal_albums)  # For caching
+    return [_album_ref(a) for a in tidal_albums]
+
+
+def _album_ref(tidal_album):
+    return Ref.album(uri=album_uri(tidal_album.artist.id, tidal_album.id),
+                     name=tidal_album.name)
 
 
 def create_album(tidal_album):
     create_mopidy_album(tidal_album)
-    return Ref.album(uri="tidal:album:{0}:{1}".format(tidal_album.artist.id,
-                                                      tidal_album.id),
-                     name=tidal_album.name)
+    return _album_ref(tidal_album)
+
+
+def create_tracks(tidal_tracks, defer_caching=False):
+    """
+    Refs of tracks. With `defer_caching`, the full models are built (for
+    caching) in the background instead of before returning.
+    """
+    if not defer_caching:
+        return [create_track(t) for t in tidal_tracks]
+    tidal_tracks = list(tidal_tracks)
+    run_in_background(create_mopidy_tracks, tidal_tracks)  # For caching
+    return [_track_ref(t) for t in tidal_tracks]
+
+
+def _track_ref(tidal_track):
+    return Ref.track(uri=track_uri(tidal_track.artist.id,
+                                   tidal_track.album.id, tidal_track.id),
+                     name=tidal_track.name)
 
 
-def create_tracks(tidal_tracks):
-    return [create_track(t) for t in tidal_tracks]
+def create_page_link(uri, number):
+    return Ref.directory(uri=page_uri(uri, number),
+                         name="More... (page {0})".format(number + 1))
 
 
 def create_track(tidal_track):
-    uri = "tidal:track:{0}:{1}:{2}".format(tidal_track.artist.id,
-                                           tidal_track.album.id,
-                                           tidal_track.id)
     create_mopidy_track(tidal_track)  # For caching
-    return Ref.track(uri=uri, name=tidal_track.name)
+    return _track_ref(tidal_track)
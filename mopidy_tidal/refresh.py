@@ -0,0 +1,207 @@
+from __future__ import unicode_literals
+
+import contextlib
+import logging
+import random
+import threading
+import time
+from functools import wraps
+
+from mopidy_tidal.metrics import Counter, count_requests, registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = 300
+DEFAULT_JITTER = 0.1
+DEFAULT_IDLE = 5
+BUDGET_WINDOW = 3600
+# Shortest wait of the scheduler while it yields to foreground requests
+MIN_WAIT = 1
+
+refresh_runs = registry.register(Counter(
+    'tidal_refresh_runs_total',
+    'Background refreshes run, by task.', ('task',)))
+refresh_requests = registry.register(Counter(
+    'tidal_refresh_requests_total',
+    'TIDAL API calls made by the background refreshes, by task.', ('task',)))
+
+
+class ForegroundActivity(object):
+    """
+    Tracks the requests Mopidy is waiting for, so that background work can
+    stay out of their way.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._active = 0
+        self._last = None
+        self._local = threading.local()
+
+    def enter(self):
+        with self._lock:
+            self._active += 1
+            self._last = self._clock()
+
+    def exit(self):
+        with self._lock:
+            self._active -= 1
+            self._last = self._clock()
+
+    def busy(self, idle=0):
+        """Whether a request is running, or one ended less than `idle` ago."""
+        with self._lock:
+            if self._active:
+                return True
+            return self._last is not None and self._clock() - self._last < idle
+
+    @property
+    def in_background(self):
+        return getattr(self._local, 'background', False)
+
+    @contextlib.contextmanager
+    def background(self):
+        """Calls made by this thread in the block are background work."""
+        self._local.background = True
+        try:
+            yield
+        finally:
+            self._local.background = False
+
+
+activity = ForegroundActivity()
+
+
+def foreground(func):
+    """Mark a provider method as a request Mopidy is waiting for."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if activity.in_background:
+            return func(*args, **kwargs)
+        activity.enter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            activity.exit()
+    return wrapper
+
+
+class RefreshTask(object):
+    __slots__ = ('name', 'func', 'interval', 'due')
+
+    def __init__(self, name, func, interval, due):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.due = due
+
+
+def run_task(task, activity=activity):
+    """
+    Run a refresh task as background work, and return the number of TIDAL
+    API calls it made (fan-outs included).
+    """
+    with activity.background(), count_requests() as requests:
+        try:
+            task.func()
+        except Exception as e:
+            logger.warning('Background refresh of %s failed: %r',
+                           task.name, e)
+    return requests.total()
+
+
+class RefreshScheduler(object):
+    """
+    Runs cache-warming tasks from a background thread, each one every
+    `interval` seconds give or take `jitter` (a fraction of the interval),
+    so that the caches are filled before Mopidy asks for them.
+
+    A task only starts once no foreground request ran for `idle` seconds,
+    and the tasks stop for the rest of the hour once they made `budget`
+    TIDAL API calls within it. Tasks run in the scheduler thread, with
+    :func:`run_task`.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET, jitter=DEFAULT_JITTER,
+                 idle=DEFAULT_IDLE, activity=activity, clock=time.monotonic):
+        self.budget = DEFAULT_BUDGET if budget is None else budget
+        self.jitter = DEFAULT_JITTER if jitter is None else jitter
+        self.idle = DEFAULT_IDLE if idle is None else idle
+        self._activity = activity
+        self._clock = clock
+        self._random = random.Random()
+        self._tasks = []
+        self._spent = 0
+        self._window_start = clock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def tasks(self):
+        return list(self._tasks)
+
+    def _jittered(self, interval):
+        return interval * self._random.uniform(
+            1 - self.jitter, 1 + self.jitter)
+
+    def add(self, name, func, interval):
+        """Run `func` every `interval` seconds; 0 or None disables it."""
+        if not interval:
+            return
+        # Spread the first runs shortly after the start
+        due = self._clock() + self._random.uniform(0, self.jitter * interval)
+        self._tasks.append(RefreshTask(name, func, interval, due))
+
+    def run_pending(self):
+        """Run the tasks that are due; returns the seconds until the next."""
+        now = self._clock()
+        if now - self._window_start >= BUDGET_WINDOW:
+            self._window_start = now
+            self._spent = 0
+
+        for task in sorted(self._tasks, key=lambda t: t.due):
+            if task.due > now or self._stop.is_set():
+                break
+            if self._activity.busy(self.idle):
+                # Yield to foreground traffic
+                return max(self.idle, MIN_WAIT)
+            if self._spent >= self.budget:
+                logger.debug('Refresh budget spent, postponing %s', task.name)
+                task.due = self._window_start + BUDGET_WINDOW
+                continue
+
+            logger.debug('Refreshing %s', task.name)
+            try:
+                spent = run_task(task, self._activity)
+            except Exception as e:
+                logger.warning('Could not run the refresh of %s: %r',
+                               task.name, e)
+                spent = 0
+            self._spent += spent
+            refresh_runs.inc(task.name)
+            refresh_requests.inc(task.name, amount=spent)
+            task.due = self._clock() + self._jittered(task.interval)
+
+        if not self._tasks:
+            return None
+        return max(0.0, min(t.due for t in self._tasks) - self._clock())
+
+    def _run(self):
+        delay = self.run_pending()
+        while not self._stop.wait(delay):
+            delay = self.run_pending()
+
+    def start(self):
+        if self._thread is not None or not self._tasks:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            name='TidalRefresh', target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -1,110 +1,191 @@
 from __future__ import unicode_literals
 
 import logging
-
-from threading import Thread
-
-from mopidy_tidal.lru_cache import SearchCache
+import time
 
 from mopidy_tidal.full_models_mappers import create_mopidy_albums, \
     create_mopidy_artists, create_mopidy_tracks
-
-from mopidy_tidal.utils import remove_watermark, catch
+from mopidy_tidal.lru_cache import SearchCache
+from mopidy_tidal.metrics import registry
+from mopidy_tidal.utils import catch, remove_watermark
+from mopidy_tidal.workers import get_search_executor
 
 logger = logging.getLogger(__name__)
 
 
+class SearchResults(tuple):
+    """Artists, albums and tracks found by a search."""
+
+    def __new__(cls, results, complete=True):
+        self = super(SearchResults, cls).__new__(cls, results)
+        self.complete = complete
+        return self
+
+
+# Query fields answered by TIDAL, by order of precedence
+SEARCH_FIELDS = ('artist', 'albumartist', 'album', 'track_name', 'any')
+
+
+def _terms(query):
+    """The first value of every supported field of a query."""
+    terms = {}
+    for field in SEARCH_FIELDS:
+        values = query.get(field)
+        if values is None:
+            continue
+        if isinstance(values, str) or not hasattr(values, '__iter__'):
+            values = [values]
+        value = remove_watermark(next(iter(values), None))
+        if value:
+            terms[field] = value
+    return terms
+
+
 @SearchCache
 def tidal_search(session, query, exact):
     logger.info('Searching Tidal for: %s %r', "Exact" if exact else "", query)
-    for (field, values) in query.items():
-        if not hasattr(values, '__iter__'):
-            values = [values]
-
-        search_val = remove_watermark(values[0])
-        if field in ['track_name', 'album', 'artist', 'albumartist', 'any']:
-            if exact:
-                exact_search = TidalExactSearchThread(session, search_val,
-                                                      field)
-                exact_search.start()
-                exact_search.join()
-                results = exact_search.results
-            else:
-                artist_search = TidalSearchThread(session, search_val,
-                                                  "artist")
-                artist_search.start()
-                album_search = TidalSearchThread(session, search_val,
-                                                 "album")
-                album_search.start()
-                track_search = TidalSearchThread(session, search_val,
-                                                 "track")
-                track_search.start()
-                artist_search.join()
-                album_search.join()
-                track_search.join()
-                results = artist_search.results, \
-                    album_search.results, \
-                    track_search.results
-
-            return results
-
-        return [], [], []
-
-
-class TidalSearchThread(Thread):
-    def __init__(self, session, keyword, kind):
-        super(TidalSearchThread, self).__init__()
-        self.results = []
-        self.session = session
-        self.keyword = keyword
-        self.kind = kind
-
-    @catch
-    def run(self):
-        if self.kind == "artist":
-            artists = self.session.search("artist", self.keyword).artists
-            self.results = create_mopidy_artists(artists)
-        elif self.kind == "album":
-            albums = self.session.search("album", self.keyword).albums
-            self.results = create_mopidy_albums(albums)
-        elif self.kind == "track":
-            tracks = self.session.search("track", self.keyword).tracks
-            self.results = create_mopidy_tracks(tracks)
-
-
-class TidalExactSearchThread(TidalSearchThread):
-    def __init__(self, session, keyword, kind):
-        super(TidalExactSearchThread, self).__init__(session, keyword, kind)
-        self.artists = []
-        self.albums = []
-        self.tracks = []
-        self.results = [], [], []
-
-    @catch
-    def run(self):
-        if self.kind == "album":
-            self.search_album()
-        elif self.kind == "artist":
-            self.search_artist()
-
-        self.results = self.artists, self.albums, self.tracks
-
-    def search_album(self):
-        res = self.session.search("album", self.keyword).albums
-        album = next((a for a in res
-                      if a.name.lower() == self.keyword.lower()), None)
-        logger.info("Album not found" if album is None else "Album found OK")
-        if album:
-            self.albums = create_mopidy_albums([album])
-            tracks = self.session.get_album_tracks(album.id)
-            self.tracks = create_mopidy_tracks(tracks)
-            logger.info("Found %d tracks for album", len(self.tracks))
-
-    def search_artist(self):
-        res = self.session.search("artist", self.keyword).artists
-        logger.info("Found %d artists", len(res))
-        for artist in res:
-            if artist.name.lower() == self.keyword.lower():
-                logger.info("Artist match OK")
-                self.artists = create_mopidy_artists([artist])
-                break
+    terms = _terms(query)
+    if not terms:
+        return SearchResults(([], [], []))
+    if exact:
+        return _exact_search(session, terms)
+
+    # Free-text search: all the constraints make up a single keyword
+    keyword = ' '.join(dict.fromkeys(terms.values()))
+    results, complete = get_search_executor().run(
+        [(search, (session, keyword, kind))
+         for kind in ("artist", "album", "track")])
+    return SearchResults([r or [] for r in results], complete)
+
+
+registry.register_cache('search', tidal_search)
+
+
+@catch
+def search(session, keyword, kind):
+    if kind == "artist":
+        artists = session.search("artist", keyword).artists
+        return create_mopidy_artists(artists)
+    elif kind == "album":
+        albums = session.search("album", keyword).albums
+        return create_mopidy_albums(albums)
+    elif kind == "track":
+        tracks = session.search("track", keyword).tracks
+        return create_mopidy_tracks(tracks)
+    return []
+
+
+def _named(items, name):
+    name = name.lower()
+    return [i for i in items if (i.name or '').lower() == name]
+
+
+def _artist_names(item):
+    artists = [getattr(item, 'artist', None)] + \
+        list(getattr(item, 'artists', None) or [])
+    return {a.name.lower() for a in artists if a is not None and a.name}
+
+
+def _by_artists(items, artist_names):
+    if not artist_names:
+        return items
+    return [i for i in items if _artist_names(i) & artist_names]
+
+
+def _search_kind(session, kind, keyword):
+    return getattr(session.search(kind, keyword), kind + 's')
+
+
+def _search_albums(session, keyword, artist_names):
+    """Albums named `keyword` (by one of `artist_names`, if any)."""
+    return _by_artists(
+        _named(session.search('album', keyword).albums, keyword),
+        artist_names)
+
+
+def _plan(session, terms):
+    """The concurrent requests answering an exact query, by step name."""
+    artist_names = {terms[f].lower() for f in ('artist', 'albumartist')
+                    if f in terms}
+    plan = {}
+    for name in artist_names:
+        plan[f'artist:{name}'] = (_search_kind, (session, 'artist', name))
+    if 'album' in terms:
+        plan['album'] = (_search_albums,
+                         (session, terms['album'], artist_names))
+    if 'track_name' in terms:
+        plan['track'] = (_search_kind, (session, 'track', terms['track_name']))
+    if 'any' in terms:
+        for kind in ('artist', 'album', 'track'):
+            plan[f'any:{kind}'] = (_search_kind, (session, kind, terms['any']))
+    return plan
+
+
+def _unique(items):
+    return list({i.id: i for i in items}.values())
+
+
+def _exact_search(session, terms):
+    """
+    Run the per-field searches of an exact query concurrently and intersect
+    their results locally: artists, albums and tracks must match every
+    constraint of the query. The tracks of the matching albums are fetched
+    in a second concurrent round, within the deadline of the query.
+    """
+    executor = get_search_executor()
+    started_at = time.monotonic()
+    plan = _plan(session, terms)
+    results, complete = executor.run(list(plan.values()))
+    results = dict(zip(plan, results))
+
+    matched_albums = results.get('album') or []
+    album_tracks = []
+    if matched_albums:
+        remaining = executor.timeout - (time.monotonic() - started_at)
+        album_tracks, tracks_complete = executor.run(
+            [(session.get_album_tracks, (album.id,))
+             for album in matched_albums],
+            timeout=max(remaining, 0))
+        complete = complete and tracks_complete
+
+    artist_names = {terms[f].lower() for f in ('artist', 'albumartist')
+                    if f in terms}
+    album_name = terms.get('album')
+    track_name = terms.get('track_name')
+
+    artists = []
+    for name in artist_names:
+        artists += _named(results[f'artist:{name}'] or [], name)
+
+    albums = []
+    tracks = []
+    for album, found in zip(matched_albums, album_tracks):
+        albums.append(album)
+        found = found or []
+        tracks += _named(found, track_name) if track_name else found
+
+    if track_name:
+        found = _by_artists(_named(results['track'] or [], track_name),
+                            artist_names)
+        if album_name:
+            found = [t for t in found if t.album is not None and
+                     (t.album.name or '').lower() == album_name.lower()]
+        tracks += found
+
+    if 'any' in terms:
+        keyword = terms['any']
+        artists += _named(results['any:artist'] or [], keyword)
+        albums += _named(results['any:album'] or [], keyword)
+        tracks += _named(results['any:track'] or [], keyword)
+
+    if album_name or track_name:
+        # Artists only come along with the albums and tracks they match
+        matched = {n for i in albums + tracks for n in _artist_names(i)}
+        artists = [a for a in artists if a.name.lower() in matched] \
+            if matched else []
+
+    logger.info('Exact search found %d artists, %d albums and %d tracks',
+                len(artists), len(albums), len(tracks))
+    return SearchResults((create_mopidy_artists(_unique(artists)),
+                          create_mopidy_albums(_unique(albums)),
+                          create_mopidy_tracks(_unique(tracks))), complete)
@@ -0,0 +1,245 @@
+from __future__ import unicode_literals
+
+import bisect
+import logging
+import re
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from mopidy.models import Album, Artist, Track
+
+from mopidy_tidal.lru_cache import track_cache
+from mopidy_tidal.utils import remove_watermark
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('artist', 'albumartist', 'album', 'track_name')
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.casefold()) if text else []
+
+
+def normalize(text):
+    return ' '.join(tokenize(text))
+
+
+def _names(models):
+    return ' '.join(m.name for m in models if m and m.name)
+
+
+class SearchIndex(object):
+    """
+    Token based inverted index over the artists, albums and tracks that the
+    extension has already mapped, used to answer searches without a round
+    trip to TIDAL.
+
+    Postings are kept per query field, and the sorted token list allows
+    prefix matching for type-ahead searches. Track documents only store the
+    URI: the tracks themselves are read back from `track_cache`.
+    """
+
+    def __init__(self, max_documents=100000):
+        self._max_documents = max_documents
+        self._lock = threading.RLock()
+        self._docs = OrderedDict()
+        # Insertion order of the documents, to sort the matches
+        self._order = {}
+        self._added = 0
+        self._postings = {}
+        # Sorted tokens, and the number of fields they have postings in
+        self._tokens = []
+        self._token_fields = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, uri):
+        return uri in self._docs
+
+    @staticmethod
+    def _fields(model):
+        if isinstance(model, Artist):
+            return 'artist', {'artist': model.name, 'albumartist': model.name}
+        if isinstance(model, Album):
+            artists = _names(model.artists)
+            return 'album', {'album': model.name, 'artist': artists,
+                             'albumartist': artists}
+        if isinstance(model, Track):
+            album = model.album
+            return 'track', {
+                'track_name': model.name,
+                'artist': _names(model.artists),
+                'album': album.name if album else None,
+                'albumartist': _names(album.artists) if album else None,
+            }
+        return None, {}
+
+    def add(self, model):
+        kind, fields = self._fields(model)
+        if kind is None or not model.uri:
+            return
+
+        fields = {f: normalize(v) for f, v in fields.items() if v}
+        with self._lock:
+            self._added += 1
+            if model.uri in self._docs:
+                self._docs.move_to_end(model.uri)
+                if self._docs[model.uri][2] == fields:
+                    self._order[model.uri] = self._added
+                    return
+                self.remove(model.uri)
+
+            stored = None if kind == 'track' else model
+            self._docs[model.uri] = (kind, stored, fields)
+            self._order[model.uri] = self._added
+            for field, value in fields.items():
+                for token in set(value.split()):
+                    postings = self._postings.get((field, token))
+                    if postings is None:
+                        postings = self._postings[(field, token)] = set()
+                        self._add_token(token)
+                    postings.add(model.uri)
+
+            while len(self._docs) > self._max_documents:
+                self.remove(next(iter(self._docs)))
+
+    def remove(self, uri):
+        with self._lock:
+            doc = self._docs.pop(uri, None)
+            if doc is None:
+                return
+            del self._order[uri]
+            for field, value in doc[2].items():
+                for token in set(value.split()):
+                    postings = self._postings.get((field, token))
+                    if postings is not None:
+                        postings.discard(uri)
+                        if not postings:
+                            del self._postings[(field, token)]
+                            self._remove_token(token)
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            self._order.clear()
+            self._postings.clear()
+            self._tokens.clear()
+            self._token_fields.clear()
+
+    def _add_token(self, token):
+        count = self._token_fields.get(token, 0)
+        self._token_fields[token] = count + 1
+        if not count:
+            bisect.insort(self._tokens, token)
+
+    def _remove_token(self, token):
+        count = self._token_fields.pop(token) - 1
+        if count:
+            self._token_fields[token] = count
+        else:
+            del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def _token_matches(self, field, token, prefix):
+        if not prefix:
+            return self._postings.get((field, token), set())
+
+        uris = set()
+        start = bisect.bisect_left(self._tokens, token)
+        for candidate in self._tokens[start:]:
+            if not candidate.startswith(token):
+                break
+            uris |= self._postings.get((field, candidate), set())
+        return uris
+
+    def _field_matches(self, field, value, exact):
+        fields = FIELDS if field == 'any' else (field,)
+        tokens = tokenize(value)
+        if not tokens:
+            return set()
+
+        uris = set()
+        for f in fields:
+            matches = None
+            for token in tokens:
+                found = self._token_matches(f, token, prefix=not exact)
+                matches = found if matches is None else matches & found
+                if not matches:
+                    break
+            if exact and matches:
+                matches = {u for u in matches
+                           if self._docs[u][2].get(f) == ' '.join(tokens)}
+            uris |= matches or set()
+        return uris
+
+    def match(self, query, exact=False):
+        """
+        Return the URIs of the documents matching every field of `query`,
+        or `None` if the query uses fields that are not indexed.
+        """
+        matches = None
+        with self._lock:
+            for field, values in query.items():
+                if field == 'track_no':
+                    continue
+                if field not in FIELDS + ('any',):
+                    return None
+                if isinstance(values, str) or not hasattr(values, '__iter__'):
+                    values = [values]
+                for value in values:
+                    found = self._field_matches(
+                        field, remove_watermark(value), exact)
+                    matches = found if matches is None else matches & found
+            return sorted(matches or (), key=self._order.__getitem__)
+
+    def search(self, query, exact=False):
+        """
+        Search the index. Returns `(artists, albums, tracks)`, or `None` on a
+        miss so that the caller can fall back to the API.
+        """
+        uris = self.match(query, exact=exact)
+        if not uris:
+            return None
+
+        results = {'artist': [], 'album': [], 'track': []}
+        with self._lock:
+            for uri in uris:
+                kind, model, _ = self._docs[uri]
+                if kind == 'track':
+                    model = track_cache.hit(uri)
+                    if model is None:
+                        # The track has been evicted from the cache
+                        self.remove(uri)
+                        continue
+                results[kind].append(model)
+
+        if not any(results.values()):
+            return None
+        return results['artist'], results['album'], results['track']
+
+    def distinct(self, kind, query):
+        """Names of the indexed `kind` documents exactly matching `query`."""
+        uris = self.match(query, exact=True) or []
+        with self._lock:
+            names = OrderedDict()
+            for uri in uris:
+                doc_kind, model, _ = self._docs[uri]
+                if doc_kind == kind and model is not None:
+                    names[model.name] = None
+        return list(names)
+
+
+search_index = SearchIndex()
+
+
+def indexed(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        item = func(*args, **kwargs)
+        if item is not None:
+            search_index.add(item)
+        return item
+    return wrapper
@@ -0,0 +1,496 @@
+from __future__ import unicode_literals
+
+import atexit
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import re
+import struct
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Every record is laid out as <header><key><value>, where the CRC covers the
+# flags, the key and the value. The header holds the CRC, the flags, the key
+# length and the value length.
+_RECORD_HEADER = struct.Struct('<IBHI')
+_FLAG_TOMBSTONE = 0x01
+
+# The index is a sorted array of fixed-size entries (key hash, segment,
+# offset, record length), prefixed by a header (magic, version, number of
+# entries, segment, offset) recording which part of the segments it covers.
+# Keys whose hashes collide have adjacent entries: their records are told
+# apart by the key they store.
+_INDEX_MAGIC = b'TIDX'
+_INDEX_VERSION = 1
+_INDEX_HEADER = struct.Struct('<4sHQIQ')
+_INDEX_ENTRY = struct.Struct('<QIQI')
+
+_INDEX_FILE = 'index'
+_SEGMENT_FILE = re.compile(r'^(\d{8})\.seg$')
+
+
+def _key_hash(key: str) -> int:
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _record_crc(flags: int, key: bytes, value: bytes) -> int:
+    return zlib.crc32(value, zlib.crc32(key, zlib.crc32(bytes((flags,)))))
+
+
+class SegmentStore(object):
+    """
+    Persistent key/value store made of append-only segment files.
+
+    Values are pickled and appended to the active segment in batches, while a
+    sorted, memory-mapped index maps the hash of each key to the location of
+    its latest record (to the records of all the keys sharing the hash, if
+    several do). Writes newer than the on-disk index live in an in-memory
+    overlay that is replayed from the segments on startup, so a crash never
+    loses flushed records. Truncated or corrupt records are dropped, and
+    dead records are reclaimed by :meth:`compact`.
+    """
+
+    def __init__(self, directory, segment_size=32 * 1024 * 1024,
+                 batch_size=64,
+                 index_merge_size=4096, compact_ratio=0.5,
+                 compact_min_size=4 * 1024 * 1024):
+        self._dir = directory
+        self._segment_size = segment_size
+        self._batch_size = batch_size
+        self._index_merge_size = index_merge_size
+        self._compact_ratio = compact_ratio
+        self._compact_min_size = compact_min_size
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._overlay = {}
+        self._maps = {}
+        self._index_file = None
+        self._index_map = None
+        self._index_count = 0
+        self._live_bytes = 0
+        self._closed = False
+
+        os.makedirs(self._dir, exist_ok=True)
+        self._segments = self._list_segments()
+        if not self._segments:
+            self._segments = [0]
+        self._open()
+        atexit.register(self.close)
+
+    # Public interface
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self._pending:
+                flags, data = self._pending[key]
+                if flags & _FLAG_TOMBSTONE:
+                    raise KeyError(key)
+                return pickle.loads(data)
+
+            data = self._read(key)
+            if data is None:
+                raise KeyError(key)
+
+        try:
+            return pickle.loads(data)
+        except Exception as e:
+            logger.warning('Could not deserialize cache entry %s: '
+                           'dropping it: %s', key, e)
+            self.delete(key)
+            raise KeyError(key)
+
+    def put(self, key: str, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._pending[key] = (0, data)
+            if len(self._pending) >= self._batch_size:
+                self.flush()
+
+    def put_many(self, items):
+        with self._lock:
+            for key, value in items:
+                self._pending[key] = (0, pickle.dumps(
+                    value, protocol=pickle.HIGHEST_PROTOCOL))
+            self.flush()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._pending[key] = (_FLAG_TOMBSTONE, b'')
+            if len(self._pending) >= self._batch_size:
+                self.flush()
+
+    def __contains__(self, key):
+        try:
+            self.get(key)
+        except KeyError:
+            return False
+        return True
+
+    def flush(self):
+        """Append the buffered records to the active segment."""
+        with self._lock:
+            if self._flush():
+                self._maybe_compact()
+
+    def _flush(self):
+        """Append the buffered records, without checking for compaction."""
+        with self._lock:
+            if not self._pending or self._closed:
+                return False
+
+            segment = self._segments[-1]
+            path = self._segment_path(segment)
+            offset = os.path.getsize(path) if os.path.exists(path) else 0
+            if offset >= self._segment_size:
+                segment += 1
+                self._segments.append(segment)
+                path = self._segment_path(segment)
+                offset = 0
+
+            chunks = []
+            locations = []
+            for key, (flags, data) in self._pending.items():
+                record = self._encode(key, flags, data)
+                location = None if flags & _FLAG_TOMBSTONE else \
+                    (segment, offset, len(record))
+                locations.append((key, location))
+                chunks.append(record)
+                offset += len(record)
+
+            with open(path, 'ab') as f:
+                f.write(b''.join(chunks))
+            self._pending.clear()
+            # The records of colliding keys are read back to tell them apart
+            for key, location in locations:
+                self._relocate(key, location)
+
+            if len(self._overlay) >= self._index_merge_size:
+                self._write_index()
+            return True
+
+    def compact(self):
+        """Rewrite the live records into fresh segments, drop the old ones."""
+        with self._lock:
+            self._flush()
+            entries = self._merged_entries()
+            old_segments = list(self._segments)
+            segment = old_segments[-1] + 1
+            new_segments = [segment]
+            offset = 0
+            out = open(self._segment_path(segment), 'wb')
+            compacted = []
+            try:
+                for key_hash, (seg, off, length) in sorted(
+                        ((key_hash, location)
+                         for key_hash, locations in entries.items()
+                         for location in locations),
+                        key=lambda e: e[1][:2]):
+                    record = self._read_record(seg, off, length)
+                    if record is None:
+                        continue
+                    if offset and offset + length > self._segment_size:
+                        out.close()
+                        segment += 1
+                        new_segments.append(segment)
+                        offset = 0
+                        out = open(self._segment_path(segment), 'wb')
+                    out.write(record)
+                    compacted.append((key_hash, segment, offset, length))
+                    offset += length
+            finally:
+                out.close()
+
+            self._close_maps()
+            self._close_index()
+            self._segments = new_segments
+            self._overlay = {}
+            for key_hash, *location in compacted:
+                self._overlay[key_hash] = \
+                    self._overlay.get(key_hash, ()) + (tuple(location),)
+            self._live_bytes = sum(n for *_, n in compacted)
+            self._write_index()
+            for seg in old_segments:
+                self._remove_segment(seg)
+            logger.info('Compacted cache segments in %s: %d live entries',
+                        self._dir, len(compacted))
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                self.flush()
+                if self._overlay:
+                    self._write_index()
+            except OSError as e:
+                logger.warning('Could not write the cache segments in %s: %s',
+                               self._dir, e)
+            self._close_maps()
+            self._close_index()
+            self._closed = True
+
+    # Index management
+
+    def _open(self):
+        segment, offset = self._load_index()
+        for seg in self._segments:
+            if seg < segment:
+                continue
+            self._replay(seg, offset if seg == segment else 0)
+
+    def _load_index(self):
+        path = os.path.join(self._dir, _INDEX_FILE)
+        if not os.path.isfile(path) or not os.path.getsize(path):
+            return self._segments[0], 0
+
+        f = open(path, 'rb')
+        index_map = None
+        try:
+            index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, count, segment, offset = \
+                _INDEX_HEADER.unpack_from(index_map, 0)
+            expected = _INDEX_HEADER.size + count * _INDEX_ENTRY.size
+            if magic != _INDEX_MAGIC or version != _INDEX_VERSION or \
+                    len(index_map) != expected:
+                raise ValueError('invalid index header')
+        except Exception as e:
+            logger.warning('Cache index in %s is corrupt, rebuilding it '
+                           'from the segments: %s', self._dir, e)
+            if index_map is not None:
+                index_map.close()
+            f.close()
+            return self._segments[0], 0
+
+        self._index_file = f
+        self._index_map = index_map
+        self._index_count = count
+        self._live_bytes = sum(
+            length for *_, length in
+            _INDEX_ENTRY.iter_unpack(index_map[_INDEX_HEADER.size:]))
+        return segment, offset
+
+    def _write_index(self):
+        entries = self._merged_entries()
+        segment = self._segments[-1]
+        path = self._segment_path(segment)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+        index_path = os.path.join(self._dir, _INDEX_FILE)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            count = sum(len(locations) for locations in entries.values())
+            f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION,
+                                       count, segment, offset))
+            f.write(b''.join(
+                _INDEX_ENTRY.pack(key_hash, *location)
+                for key_hash in sorted(entries)
+                for location in entries[key_hash]))
+        self._close_index()
+        os.replace(tmp_path, index_path)
+        self._overlay = {}
+        self._load_index()
+
+    def _merged_entries(self):
+        """The locations of the live records, by key hash."""
+        entries = {}
+        if self._index_map is not None:
+            for key_hash, *location in _INDEX_ENTRY.iter_unpack(
+                    self._index_map[_INDEX_HEADER.size:]):
+                entries.setdefault(key_hash, []).append(tuple(location))
+        for key_hash, locations in self._overlay.items():
+            if locations:
+                entries[key_hash] = list(locations)
+            else:
+                entries.pop(key_hash, None)
+        return entries
+
+    def _index_entry(self, position):
+        return _INDEX_ENTRY.unpack_from(
+            self._index_map, _INDEX_HEADER.size + position * _INDEX_ENTRY.size)
+
+    def _locations(self, key_hash):
+        """The locations of the live records of the keys with this hash."""
+        if key_hash in self._overlay:
+            return self._overlay[key_hash]
+        if self._index_map is None:
+            return ()
+
+        lo, hi = 0, self._index_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._index_entry(mid)[0] < key_hash:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        locations = []
+        while lo < self._index_count:
+            entry = self._index_entry(lo)
+            if entry[0] != key_hash:
+                break
+            locations.append(entry[1:])
+            lo += 1
+        return tuple(locations)
+
+    def _relocate(self, key, location):
+        """
+        Point the index at the latest record of `key` (None if it was
+        deleted), keeping the records of the other keys with the same hash.
+        """
+        key_hash = _key_hash(key)
+        kept = []
+        for previous in self._locations(key_hash):
+            if self._record_key(*previous) in (key, None):
+                self._live_bytes -= previous[2]
+            else:
+                kept.append(previous)
+        if location is not None:
+            kept.append(location)
+            self._live_bytes += location[2]
+        self._overlay[key_hash] = tuple(kept)
+
+    def _close_index(self):
+        if self._index_map is not None:
+            self._index_map.close()
+            self._index_file.close()
+        self._index_map = self._index_file = None
+        self._index_count = 0
+
+    # Segment management
+
+    def _list_segments(self):
+        return sorted(
+            int(m.group(1))
+            for m in map(_SEGMENT_FILE.match, os.listdir(self._dir)) if m)
+
+    def _segment_path(self, segment):
+        return os.path.join(self._dir, '%08d.seg' % segment)
+
+    def _segment_map(self, segment, end):
+        segment_map = self._maps.get(segment)
+        if segment_map is None or len(segment_map) < end:
+            if segment_map is not None:
+                segment_map.close()
+            with open(self._segment_path(segment), 'rb') as f:
+                segment_map = mmap.mmap(f.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+            self._maps[segment] = segment_map
+        return segment_map
+
+    def _close_maps(self):
+        for segment_map in self._maps.values():
+            segment_map.close()
+        self._maps = {}
+
+    def _remove_segment(self, segment):
+        try:
+            os.unlink(self._segment_path(segment))
+        except FileNotFoundError:
+            pass
+
+    def _replay(self, segment, offset):
+        """Load the records appended after the index was last written."""
+        path = self._segment_path(segment)
+        if not os.path.isfile(path):
+            return
+
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+
+        pos = 0
+        while pos < len(data):
+            decoded = self._decode(data, pos)
+            if decoded is None:
+                logger.warning('Truncating corrupt cache segment %s at '
+                               'offset %d', path, offset + pos)
+                self._close_maps()
+                with open(path, 'r+b') as f:
+                    f.truncate(offset + pos)
+                break
+
+            key, flags, _, length = decoded
+            self._relocate(key, None if flags & _FLAG_TOMBSTONE
+                           else (segment, offset + pos, length))
+            pos += length
+
+    def _maybe_compact(self):
+        total = sum(
+            os.path.getsize(self._segment_path(s)) for s in self._segments
+            if os.path.exists(self._segment_path(s)))
+        dead = total - self._live_bytes
+        if total >= self._compact_min_size and \
+                dead > total * self._compact_ratio:
+            self.compact()
+
+    # Record encoding
+
+    @staticmethod
+    def _encode(key, flags, data):
+        key_bytes = key.encode('utf-8')
+        header = _RECORD_HEADER.pack(_record_crc(flags, key_bytes, data),
+                                     flags, len(key_bytes), len(data))
+        return header + key_bytes + data
+
+    @staticmethod
+    def _decode(buf, pos):
+        if pos + _RECORD_HEADER.size > len(buf):
+            return None
+        crc, flags, key_len, value_len = _RECORD_HEADER.unpack_from(buf, pos)
+        key_start = pos + _RECORD_HEADER.size
+        value_start = key_start + key_len
+        end = value_start + value_len
+        if end > len(buf):
+            return None
+        key = bytes(buf[key_start:value_start])
+        value = bytes(buf[value_start:end])
+        if _record_crc(flags, key, value) != crc:
+            return None
+        return key.decode('utf-8'), flags, value, end - pos
+
+    def _read_record(self, segment, offset, length):
+        try:
+            segment_map = self._segment_map(segment, offset + length)
+        except (OSError, ValueError):
+            return None
+        if offset + length > len(segment_map):
+            return None
+        return segment_map[offset:offset + length]
+
+    def _record_key(self, segment, offset, length):
+        """The key of a record, or None if it cannot be read."""
+        try:
+            segment_map = self._segment_map(segment, offset + length)
+        except (OSError, ValueError):
+            return None
+        start = offset + _RECORD_HEADER.size
+        if start > len(segment_map):
+            return None
+        key_len = _RECORD_HEADER.unpack_from(segment_map, offset)[2]
+        try:
+            return bytes(segment_map[start:start + key_len]).decode('utf-8')
+        except UnicodeDecodeError:
+            return None
+
+    def _read(self, key):
+        corrupt = False
+        for location in self._locations(_key_hash(key)):
+            record = self._read_record(*location)
+            decoded = self._decode(record, 0) if record is not None else None
+            if decoded is None:
+                corrupt = True
+                continue
+            stored_key, flags, value, _ = decoded
+            if stored_key == key:
+                return None if flags & _FLAG_TOMBSTONE else value
+
+        if corrupt:
+            logger.warning('Corrupt cache record for %s in %s: dropping it',
+                           key, self._dir)
+            self._pending[key] = (_FLAG_TOMBSTONE, b'')
+        return None
@@ -0,0 +1,95 @@
+from __future__ import unicode_literals
+
+import logging
+import os
+import shutil
+import time
+
+from mopidy_tidal.favorites import KINDS
+from mopidy_tidal.segment_store import SegmentStore
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 2
+
+
+class Snapshot(object):
+    """
+    Versioned snapshot of the library state written when the backend stops
+    and read back on the next start: the listing of the playlists and the
+    favourites. Tracks are not part of it, as the track cache is persisted
+    on its own.
+
+    The snapshot lives in a `SegmentStore`. A snapshot written by another
+    version is discarded.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._store = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = SegmentStore(self._directory)
+        return self._store
+
+    def _get(self, key):
+        try:
+            return self.store.get(key)
+        except KeyError:
+            return None
+
+    def load(self) -> bool:
+        """Open the snapshot and tell whether it can be used."""
+        try:
+            meta = self._get('meta')
+        except Exception as e:
+            logger.warning('Could not read the TIDAL snapshot: %s', e)
+            meta = None
+
+        if not meta or meta.get('version') != SNAPSHOT_VERSION:
+            if meta:
+                logger.info('Discarding TIDAL snapshot of version %s',
+                            meta.get('version'))
+            self.reset()
+            return False
+
+        logger.info('Warm start from the TIDAL snapshot of %s',
+                    time.ctime(meta['created_at']))
+        return True
+
+    def reset(self):
+        self.close()
+        shutil.rmtree(self._directory, ignore_errors=True)
+        os.makedirs(self._directory, exist_ok=True)
+
+    def playlists(self):
+        """The `(uri, name)` pairs of the playlists, or None."""
+        return self._get('playlists')
+
+    def favorites(self):
+        favorites = {}
+        for kind in KINDS:
+            items = self._get(f'favorites:{kind}')
+            if items is not None:
+                favorites[kind] = items
+        return favorites
+
+    def save(self, playlists=None, favorites=None):
+        """Write the snapshot."""
+        store = self.store
+        items = []
+        if playlists is not None:
+            items.append(('playlists', list(playlists)))
+        for kind, values in (favorites or {}).items():
+            items.append((f'favorites:{kind}', list(values)))
+        items.append(('meta', {'version': SNAPSHOT_VERSION,
+                               'created_at': time.time()}))
+        store.put_many(items)
+        logger.info('Saved a TIDAL snapshot')
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
@@ -1,23 +1,139 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import logging
+import threading
+import time
+
+from mopidy_tidal.lru_cache import LruCache
+from mopidy_tidal.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Most track IDs accepted by a single request to the Spotify tracks endpoint
+MAX_IDS_PER_REQUEST = 50
+PLAYLIST_PAGE_SIZE = 100
+# Seconds before a song that TIDAL had no match for is searched again
+MISS_TTL = 7 * 24 * 3600
+
 
 class SpotifyProxy:
+    """
+    Resolves Spotify tracks into TIDAL tracks. A single Spotify client is
+    shared by all the calls, track details are requested in batches of
+    `MAX_IDS_PER_REQUEST` and the Spotify URI -> TIDAL URI mapping is
+    persisted, so a track is only ever resolved once. Songs without a match
+    are remembered as the time of the search (instead of a URI), and are
+    searched again after `MISS_TTL` seconds.
+    """
+
     def __init__(self, client_id, client_secret):
+        self._client = None
+        self._lock = threading.Lock()
+        self.mapping = LruCache(max_size=1024 * 16, persist=True,
+                                directory='spotify')
+        registry.register_cache('spotify', self.mapping)
         self.set_credentials(client_id, client_secret)
-        
+
     def set_credentials(self, client_id, client_secret):
+        # spotipy is only needed when the Spotify proxy is enabled
+        from spotipy.oauth2 import SpotifyClientCredentials
         self.credentials = SpotifyClientCredentials(
-            client_id=client_id, 
+            client_id=client_id,
             client_secret=client_secret
         )
+        self._client = None
 
-    def get_song_info(self, lz_uri):
-        spotify = spotipy.Spotify(client_credentials_manager = self.credentials)
-        results = spotify.tracks([lz_uri])
-        if len(results['tracks']) > 0:
-            track = results['tracks'][-1]
-            title = track["name"]
-            artists = [a["name"] for a in track["artists"]]
-            return {"title": title, "artists": artists}
-        else:
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import spotipy
+                self._client = spotipy.Spotify(
+                    client_credentials_manager=self.credentials)
+            return self._client
+
+    @staticmethod
+    def _song_info(track):
+        if not track:
             return None
+        return {"title": track["name"],
+                "artists": [a["name"] for a in track["artists"]]}
+
+    def get_song_info(self, lz_uri):
+        return self.get_songs_info([lz_uri]).get(lz_uri)
+
+    def get_songs_info(self, uris):
+        """Title and artists of Spotify tracks, by URI (None if unknown)."""
+        uris = list(dict.fromkeys(uris))
+        info = {}
+        for i in range(0, len(uris), MAX_IDS_PER_REQUEST):
+            batch = uris[i:i + MAX_IDS_PER_REQUEST]
+            results = self.client.tracks(batch)
+            for uri, track in zip(batch, results['tracks']):
+                info[uri] = self._song_info(track)
+        return info
+
+    def get_playlist_songs(self, uri):
+        """`(track URI, song info)` pairs of the tracks of a playlist."""
+        songs = []
+        offset = 0
+        while True:
+            page = self.client.playlist_items(
+                uri, limit=PLAYLIST_PAGE_SIZE, offset=offset,
+                additional_types=('track',))
+            for item in page['items']:
+                track = item.get('track')
+                if track and track.get('uri'):
+                    songs.append((track['uri'], self._song_info(track)))
+            if not page.get('next'):
+                return songs
+            offset += PLAYLIST_PAGE_SIZE
+
+    def resolve(self, songs, match):
+        """
+        Map Spotify track URIs to TIDAL track URIs ('' when TIDAL has no
+        match). `songs` maps URIs to their song info, or to None when it has
+        to be fetched, and `match(info)` finds the TIDAL URI of a song; it
+        returns None on errors, which are not remembered.
+        """
+        from mopidy_tidal.workers import run_concurrently
+
+        mapping = {}
+        unresolved = []
+        now = time.time()
+        for uri, info in songs.items():
+            tidal_uri = self.mapping.get(uri)
+            if isinstance(tidal_uri, float):
+                # Known miss, unless it expired
+                tidal_uri = '' if now - tidal_uri < MISS_TTL else None
+            if tidal_uri is None:
+                unresolved.append(uri)
+            else:
+                mapping[uri] = tidal_uri
+
+        if not unresolved:
+            return mapping
+
+        missing = [uri for uri in unresolved if songs[uri] is None]
+        if missing:
+            songs = dict(songs)
+            songs.update(self.get_songs_info(missing))
+
+        def resolve_one(uri):
+            if not songs[uri]:
+                return ''
+            try:
+                return match(songs[uri])
+            except Exception as e:
+                logger.error('Resolution of %s failed: %r', uri, e)
+                return None
+
+        logger.info('Resolving %d Spotify tracks on TIDAL', len(unresolved))
+        matches = run_concurrently(resolve_one, unresolved)
+        for uri, tidal_uri in zip(unresolved, matches):
+            if tidal_uri is not None:
+                self.mapping[uri] = tidal_uri or now
+                mapping[uri] = tidal_uri
+        self.mapping.flush()
+        return mapping
+
+    def close(self):
+        self.mapping.close()
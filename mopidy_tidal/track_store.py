@@ -0,0 +1,117 @@
+from __future__ import unicode_literals
+
+import logging
+
+from mopidy.models import Track
+
+logger = logging.getLogger(__name__)
+
+# Track fields that are stored as plain slots on every row. Anything else
+# that is set on a track is kept in the (usually empty) `extra` mapping.
+_ROW_FIELDS = ('name', 'track_no', 'disc_no', 'length', 'genre')
+_EXTRA_FIELDS = tuple(
+    f for f in Track._fields
+    if f not in _ROW_FIELDS + ('uri', 'artists', 'album'))
+
+
+class InternTable(object):
+    """
+    Reference-counted table of shared model objects.
+
+    Equal objects are stored once and referred to by a small integer ID, so
+    thousands of tracks from the same album share a single `Album` instance.
+    """
+
+    __slots__ = ('_values', '_ids', '_refs', '_free')
+
+    def __init__(self):
+        self._values = []
+        self._ids = {}
+        self._refs = []
+        self._free = []
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, item_id):
+        return self._values[item_id]
+
+    def acquire(self, value) -> int:
+        item_id = self._ids.get(value)
+        if item_id is None:
+            if self._free:
+                item_id = self._free.pop()
+                self._values[item_id] = value
+                self._refs[item_id] = 0
+            else:
+                item_id = len(self._values)
+                self._values.append(value)
+                self._refs.append(0)
+            self._ids[value] = item_id
+
+        self._refs[item_id] += 1
+        return item_id
+
+    def release(self, item_id: int):
+        self._refs[item_id] -= 1
+        if self._refs[item_id] <= 0:
+            del self._ids[self._values[item_id]]
+            self._values[item_id] = None
+            self._free.append(item_id)
+
+
+class TrackRow(object):
+    """Compact in-memory representation of a `mopidy.models.Track`."""
+
+    __slots__ = _ROW_FIELDS + ('artists', 'album', 'extra')
+
+    def __init__(self, name, track_no, disc_no, length, genre, artists, album,
+                 extra):
+        self.name = name
+        self.track_no = track_no
+        self.disc_no = disc_no
+        self.length = length
+        self.genre = genre
+        self.artists = artists
+        self.album = album
+        self.extra = extra
+
+
+class TrackStore(object):
+    """
+    Packs tracks into `TrackRow` objects backed by interned artist and album
+    tables, and materializes them back into `Track` objects on demand.
+    """
+
+    def __init__(self):
+        self.artists = InternTable()
+        self.albums = InternTable()
+
+    def pack(self, track: Track) -> TrackRow:
+        artists = tuple(self.artists.acquire(a) for a in track.artists)
+        album = self.albums.acquire(track.album) \
+            if track.album is not None else None
+        extra = {
+            f: getattr(track, f) for f in _EXTRA_FIELDS
+            if getattr(track, f) not in (None, frozenset())
+        } or None
+        return TrackRow(track.name, track.track_no, track.disc_no,
+                        track.length, track.genre, artists, album, extra)
+
+    def unpack(self, uri: str, row: TrackRow) -> Track:
+        return Track(uri=uri,
+                     name=row.name,
+                     track_no=row.track_no,
+                     disc_no=row.disc_no,
+                     length=row.length,
+                     genre=row.genre,
+                     artists=[self.artists[a] for a in row.artists],
+                     album=self.albums[row.album]
+                     if row.album is not None else None,
+                     **(row.extra or {}))
+
+    def release(self, row: TrackRow):
+        for artist in row.artists:
+            self.artists.release(artist)
+        if row.album is not None:
+            self.albums.release(row.album)
@@ -0,0 +1,250 @@
+from __future__ import unicode_literals
+
+import contextlib
+import email.utils
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+import tidaloauth4mopidy
+from tidaloauth4mopidy import Session
+
+from mopidy_tidal.conditional import (
+    NotModified, is_conditional, validator_key,
+)
+from mopidy_tidal.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_TIMEOUT = 30
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+http_retries = registry.register(Counter(
+    'tidal_http_retries_total',
+    'HTTP requests to TIDAL retried, by reason.', ('reason',)))
+
+
+def retry_after(response, now=None):
+    """Seconds to wait according to a `Retry-After` header, or None."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = now if now is not None else time.time()
+    return max(0.0, date.timestamp() - now)
+
+
+class Transport(object):
+    """
+    Keep-alive HTTP transport shared by every thread of the backend.
+
+    `requests.Session` is not thread-safe, so every thread gets its own,
+    and they share a connection pool (an `HTTPAdapter`, which is) of
+    `pool_size` connections per host. Connection errors, timeouts and
+    429/5xx responses of idempotent requests are retried up to `retries`
+    times with a jittered exponential backoff, waiting at least as long as
+    the server asks for in `Retry-After`.
+    """
+
+    def __init__(self, pool_size=None, retries=None, backoff=None,
+                 timeout=None, max_backoff=DEFAULT_MAX_BACKOFF,
+                 sleep=time.sleep):
+        self.pool_size = pool_size or DEFAULT_POOL_SIZE
+        self.retries = DEFAULT_RETRIES if retries is None else retries
+        self.backoff = DEFAULT_BACKOFF if backoff is None else backoff
+        self.timeout = timeout or DEFAULT_TIMEOUT
+        self.max_backoff = max_backoff
+        self._sleep = sleep
+        self._random = random.Random()
+        self._adapter = HTTPAdapter(pool_connections=4,
+                                    pool_maxsize=self.pool_size,
+                                    pool_block=True)
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    @property
+    def http(self):
+        """The `requests.Session` of the calling thread."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def delay(self, attempt, response=None):
+        # Full jitter: spread the retries of parallel requests
+        delay = self._random.uniform(
+            0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if response is not None:
+            delay = max(delay, retry_after(response) or 0.0)
+        return delay
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        retries = self.retries if method.upper() in IDEMPOTENT_METHODS else 0
+        attempt = 0
+        while True:
+            try:
+                response = self.http.request(method, url, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                if attempt >= retries:
+                    raise
+                reason = type(e).__name__
+                delay = self.delay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUSES or \
+                        attempt >= retries:
+                    return response
+                reason = str(response.status_code)
+                delay = self.delay(attempt, response)
+            attempt += 1
+            http_retries.inc(reason)
+            logger.debug('Retrying %s %s in %.2fs (%s, attempt %d)',
+                         method, url, delay, reason, attempt)
+            self._sleep(delay)
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._adapter.close()
+
+
+class _Router(object):
+    """
+    Stands for the `requests` module in `tidaloauth4mopidy`, whose
+    `Session._request` sends every API call with `requests.request` (a new
+    connection each time). While a :class:`PooledSession` makes a call, the
+    calls of its thread go through its `Transport` instead; anything else
+    is left to `requests`.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    @contextlib.contextmanager
+    def route(self, transport):
+        """Send the calls of this thread through `transport`; yields the
+        responses received meanwhile."""
+        previous = getattr(self._local, 'route', None)
+        self._local.route = (transport, [])
+        try:
+            yield self._local.route[1]
+        finally:
+            self._local.route = previous
+
+    def request(self, method, url, **kwargs):
+        route = getattr(self._local, 'route', None)
+        if route is None:
+            return requests.request(method, url, **kwargs)
+        response = route[0].request(method, url, **kwargs)
+        route[1].append(response)
+        return response
+
+
+_router = _Router()
+
+
+class PooledSession(Session):
+    """
+    `tidaloauth4mopidy.Session` issuing its API calls through a `Transport`.
+
+    With a :class:`mopidy_tidal.conditional.ValidatorCache`, playlists,
+    albums and favourites are fetched with conditional requests, and a 304
+    Not Modified response returns the value mapped from the previous body.
+    """
+
+    def __init__(self, config, transport=None, validators=None):
+        super(PooledSession, self).__init__(config)
+        tidaloauth4mopidy.requests = _router
+        self.transport = transport or Transport()
+        self.validators = validators
+        self._local = threading.local()
+
+    def request(self, method, path, params=None, data=None, headers=None):
+        # `ret` of the `_map_request` call this request is made for, if any
+        mapping = getattr(self._local, 'mapping', None)
+        self._local.mapping = None
+        if self.validators is None or method != 'GET' or \
+                not is_conditional(path):
+            return super(PooledSession, self).request(
+                method, path, params, data, headers)
+
+        key = validator_key(path, params, mapping)
+        entry = self.validators.get(key)
+        request_headers = dict(headers or {})
+        if entry is not None:
+            request_headers.update(entry.headers())
+        response = self._request(method, path, params, data, request_headers)
+        if response.status_code == 304 and entry is not None:
+            if mapping is not None:
+                raise NotModified(key, entry)
+            return self.validators.not_modified(path, key, entry)
+
+        try:
+            value = response.json()
+        except ValueError:
+            return response
+        if mapping is None:
+            self.validators.store(key, response, value)
+        else:
+            self._local.response = (key, response)
+        return value
+
+    def _map_request(self, url, params=None, ret=None):
+        if self.validators is None:
+            return super(PooledSession, self)._map_request(url, params, ret)
+
+        self._local.mapping = ret
+        self._local.response = None
+        try:
+            value = super(PooledSession, self)._map_request(url, params, ret)
+        except NotModified as e:
+            # Neither transferred nor mapped again
+            return self.validators.not_modified(url, e.key, e.entry)
+        finally:
+            self._local.mapping = None
+        if self._local.response is not None:
+            key, response = self._local.response
+            self._local.response = None
+            self.validators.store(key, response, value)
+        return value
+
+    def _request(self, method, path, params=None, data=None, headers=None):
+        with _router.route(self.transport) as responses:
+            try:
+                return super(PooledSession, self)._request(
+                    method, path, params, data, headers)
+            except NotImplementedError:
+                # The library raises it on 401 and 404 responses
+                response = responses[-1] if responses else None
+                if response is None or response.status_code < 400:
+                    raise
+                raise HTTPError('%s Client Error for url: %s' % (
+                    response.status_code, response.url), response=response)
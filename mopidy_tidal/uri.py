@@ -0,0 +1,136 @@
+from __future__ import unicode_literals
+
+import sys
+from functools import lru_cache
+
+SCHEME = 'tidal'
+
+# Number of IDs in the URIs of TIDAL items, after their kind: albums are
+# `tidal:album:<artist id>:<album id>`, tracks
+# `tidal:track:<artist id>:<album id>:<track id>`
+ITEM_ARITY = {
+    'artist': 1,
+    'album': 2,
+    'track': 3,
+    'playlist': 1,
+    'mood': 1,
+    'genre': 1,
+}
+
+PARSE_CACHE_SIZE = 1024 * 16
+
+
+class TidalUri(object):
+    """
+    Parsed `tidal:` URI: its `kind` (`track`, `album`, `my_tracks`...) and
+    the `ids` that follow it. Instances are immutable and shared, build them
+    with :func:`parse`.
+    """
+
+    __slots__ = ('uri', 'kind', 'ids')
+
+    def __init__(self, uri, kind, ids):
+        self.uri = uri
+        self.kind = kind
+        self.ids = ids
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError(f'{name} is read-only')
+        object.__setattr__(self, name, value)
+
+    def __str__(self):
+        return self.uri
+
+    def __repr__(self):
+        return f'TidalUri({self.uri!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, TidalUri):
+            return NotImplemented
+        return self.uri == other.uri
+
+    def __hash__(self):
+        return hash(self.uri)
+
+    @property
+    def is_item(self):
+        return self.kind in ITEM_ARITY
+
+    @property
+    def id(self):
+        """ID of the item itself, e.g. the track ID of a track URI."""
+        return self.ids[-1] if self.is_item else None
+
+    @property
+    def artist_id(self):
+        if self.kind in ('artist', 'album', 'track'):
+            return self.ids[0]
+        return None
+
+    @property
+    def album_id(self):
+        if self.kind in ('album', 'track'):
+            return self.ids[1]
+        return None
+
+    @property
+    def album_uri(self):
+        """URI of the album of a track or an album."""
+        if self.kind in ('album', 'track'):
+            return album_uri(self.ids[0], self.ids[1])
+        return None
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse(uri):
+    """
+    Parse a `tidal:` URI, or raise a ValueError if it is not a valid one.
+    The URIs parsed last are cached: parsing one of them again returns the
+    same object.
+    """
+    parts = uri.split(':')
+    if len(parts) < 2 or parts[0] != SCHEME or not parts[1]:
+        raise ValueError(f'Invalid TIDAL URI: {uri!r}')
+
+    kind = parts[1]
+    ids = tuple(parts[2:])
+    arity = ITEM_ARITY.get(kind)
+    if arity is not None and (len(ids) != arity or not all(ids)):
+        raise ValueError(f'Invalid TIDAL {kind} URI: {uri!r}')
+    return TidalUri(sys.intern(uri), sys.intern(kind), ids)
+
+
+def try_parse(uri):
+    """Like :func:`parse`, but returns None for invalid URIs."""
+    try:
+        return parse(uri)
+    except (ValueError, AttributeError):
+        return None
+
+
+# Builders of the URIs of TIDAL items. The URIs are interned, so that the
+# caches and models referring to an item share a single string.
+
+def artist_uri(artist_id):
+    return sys.intern(f'tidal:artist:{artist_id}')
+
+
+def album_uri(artist_id, album_id):
+    return sys.intern(f'tidal:album:{artist_id}:{album_id}')
+
+
+def track_uri(artist_id, album_id, track_id):
+    return sys.intern(f'tidal:track:{artist_id}:{album_id}:{track_id}')
+
+
+def playlist_uri(playlist_id):
+    return sys.intern(f'tidal:playlist:{playlist_id}')
+
+
+def mood_uri(mood_id):
+    return sys.intern(f'tidal:mood:{mood_id}')
+
+
+def genre_uri(genre_id):
+    return sys.intern(f'tidal:genre:{genre_id}')
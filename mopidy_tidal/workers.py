@@ -0,0 +1,225 @@
+from __future__ import unicode_literals
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mopidy_tidal.aio import AsyncCore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_SEARCH_WORKERS = 6
+DEFAULT_SEARCH_TIMEOUT = 10
+
+_lock = threading.Lock()
+_local = threading.local()
+_core = None
+_max_workers = DEFAULT_MAX_WORKERS
+_search_executor = None
+_search_workers = DEFAULT_SEARCH_WORKERS
+_search_timeout = DEFAULT_SEARCH_TIMEOUT
+_background = None
+
+
+def configure(max_workers=None):
+    """Set the global limit of concurrent TIDAL requests."""
+    global _core, _max_workers, _search_executor
+    with _lock:
+        _max_workers = max_workers or DEFAULT_MAX_WORKERS
+        if _search_executor is not None:
+            # Its queue lives on the event loop of the core
+            _search_executor.shutdown()
+            _search_executor = None
+        if _core is not None:
+            _core.close()
+            _core = None
+
+
+def get_core():
+    global _core
+    with _lock:
+        if _core is None:
+            _core = AsyncCore(limit=_max_workers, initializer=_mark_worker)
+        return _core
+
+
+def _mark_worker():
+    _local.is_worker = True
+
+
+def submit(func, *args):
+    """Schedule a call on the shared core; returns a future."""
+    return get_core().submit(func, *args)
+
+
+def run_concurrently(func, items):
+    """
+    Call `func` on every item on the shared core and return the results in
+    the order of `items`. Calls made from a worker thread run inline, so
+    nested fan-outs cannot exhaust the workers and deadlock.
+    """
+    items = list(items)
+    if len(items) < 2 or getattr(_local, 'is_worker', False):
+        return [func(item) for item in items]
+
+    return get_core().map(func, items)
+
+
+class SearchExecutor(object):
+    """
+    Long-lived, bounded scheduler for search requests, running on the
+    shared core with at most `max_workers` requests at once.
+
+    A round of requests never waits longer than its deadline: unfinished
+    requests are cancelled and reported as missing results. Searches are
+    served one at a time by the backend actor, so a new query never arrives
+    while an older one is queued, and only the deadline bounds a query.
+    """
+
+    def __init__(self, max_workers=6, timeout=10, core=None):
+        self._core = core
+        self._max_workers = max_workers
+        # Both are set on the event loop by the first query
+        self._loop = None
+        self._semaphore = None
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        # Tasks waiting for a slot; only touched from the event loop
+        self._queued = set()
+        self._stats = dict.fromkeys(
+            ('rounds', 'submitted', 'started', 'completed', 'failed',
+             'timed_out'), 0)
+        self._stats.update(wait_time=0.0, run_time=0.0, query_time=0.0)
+
+    @property
+    def core(self):
+        return self._core or get_core()
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    def _count(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self._stats[key] += value
+
+    async def _call(self, submitted_at, func, *args):
+        async with self._semaphore:
+            started_at = time.monotonic()
+            self._queued.discard(asyncio.current_task())
+            self._count(started=1, wait_time=started_at - submitted_at)
+            try:
+                return await self.core.call(func, *args)
+            finally:
+                self._count(run_time=time.monotonic() - started_at)
+
+    async def _run(self, calls, timeout):
+        if self._semaphore is None:
+            self._loop = asyncio.get_running_loop()
+            self._semaphore = asyncio.Semaphore(self._max_workers)
+
+        loop = asyncio.get_running_loop()
+        submitted_at = time.monotonic()
+        tasks = [loop.create_task(self._call(submitted_at, func, *args))
+                 for func, args in calls]
+        self._queued.update(tasks)
+        self._count(rounds=1, submitted=len(tasks))
+        if not tasks:
+            return [], True
+
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+            self._queued.discard(task)
+        if pending:
+            logger.warning('%d search requests exceeded the %ss deadline',
+                           len(pending), timeout)
+
+        results = []
+        completed = failed = 0
+        for task in tasks:
+            if task in pending or task.cancelled():
+                results.append(None)
+            elif task.exception() is not None:
+                logger.error('Search request failed: %r', task.exception())
+                results.append(None)
+                failed += 1
+            else:
+                results.append(task.result())
+                completed += 1
+        self._count(completed=completed, failed=failed,
+                    timed_out=len(pending),
+                    query_time=time.monotonic() - submitted_at)
+        return results, completed == len(tasks)
+
+    def run(self, calls, timeout=None):
+        """
+        Run `(func, args)` pairs concurrently and wait for them until the
+        deadline. Returns the list of results, with `None` for the requests
+        that failed, timed out or got cancelled, and whether all of them
+        completed.
+        """
+        return self.core.run(self._run(
+            calls, self._timeout if timeout is None else timeout))
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = len(self._queued)
+        return stats
+
+    def shutdown(self):
+        for task in list(self._queued):
+            self._loop.call_soon_threadsafe(task.cancel)
+
+
+def configure_search(max_workers=None, timeout=None):
+    """Replace the shared search executor with one of the given size."""
+    global _search_executor, _search_workers, _search_timeout
+    with _lock:
+        _search_workers = max_workers or DEFAULT_SEARCH_WORKERS
+        _search_timeout = timeout or DEFAULT_SEARCH_TIMEOUT
+        if _search_executor is not None:
+            _search_executor.shutdown()
+            _search_executor = None
+
+
+def get_search_executor():
+    global _search_executor
+    with _lock:
+        if _search_executor is None:
+            _search_executor = SearchExecutor(
+                max_workers=_search_workers, timeout=_search_timeout)
+        return _search_executor
+
+
+def run_in_background(func, *args):
+    """
+    Queue a side effect (such as cache warming) on a single background
+    thread, so it never competes with requests for the shared pool. The
+    thread is not a worker: its fan-outs still run on the shared core.
+    """
+    global _background
+    with _lock:
+        if _background is None:
+            _background = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='TidalBackground')
+    future = _background.submit(contextvars.copy_context().run, func, *args)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def wait_background():
+    """Block until the tasks queued with `run_in_background` are done."""
+    if _background is not None:
+        _background.submit(lambda: None).result()
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error('Background task failed: %r', future.exception())
@@ -0,0 +1,15 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from mopidy_tidal import context
+from mopidy_tidal.favorites import favorites_store
+
+
+@pytest.fixture(autouse=True)
+def config(tmp_path):
+    """Point persisted caches at a temporary directory for every test."""
+    cfg = {'core': {'cache_dir': str(tmp_path)}, 'tidal': {}}
+    context.set_config(cfg)
+    favorites_store.invalidate()
+    return cfg
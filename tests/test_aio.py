@@ -0,0 +1,62 @@
+from __future__ import unicode_literals
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from mopidy_tidal.aio import AsyncCore
+
+
+@pytest.fixture
+def core():
+    core = AsyncCore(limit=3)
+    yield core
+    core.close()
+
+
+def test_map_keeps_order(core):
+    assert core.map(lambda x: x * 2, range(50)) == [x * 2 for x in range(50)]
+
+
+def test_concurrency_is_limited(core):
+    running = [0, 0]
+    lock = threading.Lock()
+
+    def request(_):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    core.map(request, range(30))
+
+    assert running[1] == 3
+
+
+def test_submit_returns_a_future(core):
+    assert core.submit(str.upper, 'a').result(timeout=5) == 'A'
+
+
+def test_errors_are_raised_to_the_caller(core):
+    with pytest.raises(ValueError):
+        core.map(int, ['1', 'x'])
+
+
+def test_coroutines_can_await_requests(core):
+    async def fan_out():
+        results = await core.gather(str.upper, ['a', 'b'])
+        return results + [await core.call(str.lower, 'C')]
+
+    assert core.run(fan_out()) == ['A', 'B', 'c']
+
+
+def test_the_loop_cannot_be_blocked(core):
+    async def nested():
+        return core.map(str.upper, ['a', 'b'])
+
+    with pytest.raises(RuntimeError):
+        asyncio.run_coroutine_threadsafe(nested(), core.loop).result(5)
@@ -0,0 +1,38 @@
+from __future__ import unicode_literals
+
+import json
+
+from benchmarks.fake_session import FakeApiError, FakeSession, LibrarySize
+from benchmarks.suite import Benchmark, compare_reports
+
+TINY = LibrarySize(artists=3, albums_per_artist=2, tracks_per_album=3,
+                   playlists=4, playlist_size=5, favorite_tracks=10)
+
+
+def test_fake_session_counts_and_fails_calls():
+    session = FakeSession(TINY, error_rate=1.0)
+
+    try:
+        session.get_track(session.tracks[0].id)
+    except FakeApiError:
+        pass
+
+    assert session.calls == {'get_track': 1}
+
+
+def test_benchmark_report_is_json_serializable():
+    report = Benchmark(TINY, iterations=2).run()
+
+    assert json.loads(json.dumps(report))['version'] == 1
+    lookup = report['scenarios']['lookup.tracks']
+    assert lookup['count'] == 2
+    assert lookup['api_calls']['cold.get_album_tracks'] > 0
+    assert 'warm.get_album_tracks' not in lookup['api_calls']
+    assert list(compare_reports(report, report))[0][3] == 1.0
+
+
+def test_import_time_is_measured():
+    report = Benchmark(TINY, iterations=1,
+                       import_modules=('mopidy_tidal',)).run()
+
+    assert report['scenarios']['import.mopidy_tidal']['p50_ms'] > 0
@@ -0,0 +1,81 @@
+from __future__ import unicode_literals
+
+import threading
+from unittest import mock
+
+from tidaloauth4mopidy.models import Album, Artist, Category, Track
+
+from mopidy_tidal.browse_cache import BrowseCache
+from mopidy_tidal.library import TidalLibraryProvider
+
+
+def _provider(**tidal_config):
+    session = mock.Mock()
+    session.get_moods.return_value = [Category(id='m1', name='Mood')]
+    artist = Artist(id=1, name='Artist')
+    album = Album(id=2, name='Album', artist=artist)
+    session.get_artist_albums.return_value = [album]
+    session.get_artist_top_tracks.return_value = [
+        Track(id=3, name='Track', duration=1, track_num=1, disc_num=1,
+              quality='LOSSLESS', artist=artist, album=album)]
+    return TidalLibraryProvider(backend=mock.Mock(
+        session=session, _config={'tidal': tidal_config}))
+
+
+def test_moods_and_artist_pages_are_served_from_memory():
+    provider = _provider()
+
+    for _ in range(2):
+        assert [r.name for r in provider.browse('tidal:moods')] == ['Mood']
+        assert len(provider.browse('tidal:artist:1')) == 2
+
+    session = provider.backend.session
+    assert session.get_moods.call_count == 1
+    assert session.get_artist_albums.call_count == 1
+    assert session.get_artist_top_tracks.call_count == 1
+
+
+def test_directories_without_ttl_are_not_cached():
+    provider = _provider(browse_artist_ttl=0)
+
+    provider.browse('tidal:artist:1')
+    provider.browse('tidal:artist:1')
+
+    assert provider.backend.session.get_artist_albums.call_count == 2
+
+
+def test_artist_page_lists_are_fetched_concurrently():
+    provider = _provider(browse_artist_ttl=0)
+    session = provider.backend.session
+    barrier = threading.Barrier(2, timeout=5)
+    albums = session.get_artist_albums.return_value
+    tracks = session.get_artist_top_tracks.return_value
+
+    def fetched(result):
+        def fetch(artist_id):
+            barrier.wait()
+            return result
+        return fetch
+
+    session.get_artist_albums.side_effect = fetched(albums)
+    session.get_artist_top_tracks.side_effect = fetched(tracks)
+
+    refs = provider.browse('tidal:artist:1')
+
+    assert [r.type for r in refs] == ['album', 'track']
+
+
+@mock.patch('mopidy_tidal.browse_cache.time')
+def test_entries_expire_after_their_ttl(time):
+    cache = BrowseCache({'genres': 10})
+    browse = mock.Mock(return_value=['ref'])
+    time.monotonic.return_value = 0
+
+    cache.get_or_browse('tidal:genres', browse)
+    time.monotonic.return_value = 5
+    cache.get_or_browse('tidal:genres', browse)
+    assert browse.call_count == 1
+
+    time.monotonic.return_value = 11
+    cache.get_or_browse('tidal:genres', browse)
+    assert browse.call_count == 2
@@ -0,0 +1,69 @@
+from __future__ import unicode_literals
+
+import threading
+from unittest import mock
+
+import pytest
+
+from mopidy_tidal.coalescing import CoalescingProxy
+
+
+def _concurrently(func, count=5):
+    results = [None] * count
+
+    def run(i):
+        results[i] = func()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_identical_calls_share_one_request():
+    release = threading.Event()
+    session = mock.Mock()
+    session.get_album_tracks.side_effect = \
+        lambda album_id: release.wait(5) and [album_id]
+    proxy = CoalescingProxy(session)
+
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    results = _concurrently(lambda: proxy.get_album_tracks(1))
+
+    assert results == [[1]] * 5
+    assert session.get_album_tracks.call_count == 1
+    assert proxy.saved_calls == 4
+
+
+def test_favorites_listings_are_coalesced():
+    release = threading.Event()
+    session = mock.Mock()
+    session.user.favorites.tracks.side_effect = lambda: release.wait(5)
+    proxy = CoalescingProxy(session)
+
+    threading.Timer(0.2, release.set).start()
+    _concurrently(lambda: proxy.user.favorites.tracks(), count=3)
+
+    assert session.user.favorites.tracks.call_count == 1
+
+
+def test_errors_are_shared_and_not_cached():
+    session = mock.Mock()
+    session.get_album.side_effect = [ValueError, 'album']
+    proxy = CoalescingProxy(session)
+
+    with pytest.raises(ValueError):
+        proxy.get_album(1)
+    assert proxy.get_album(1) == 'album'
+
+
+def test_writes_are_not_coalesced():
+    session = mock.Mock()
+    proxy = CoalescingProxy(session)
+
+    _concurrently(lambda: proxy.user.favorites.add_track(1), count=3)
+
+    assert session.user.favorites.add_track.call_count == 3
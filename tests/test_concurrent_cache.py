@@ -0,0 +1,109 @@
+from __future__ import unicode_literals
+
+import threading
+
+from benchmarks.stress import stress_cache
+
+import pytest
+
+from mopidy_tidal.lru_cache import LruCache, ShardedCache
+
+
+def _hammer(cache, threads=8, ops=3000):
+    barrier = threading.Barrier(threads)
+    errors = []
+
+    def worker(index):
+        barrier.wait()
+        try:
+            for i in range(ops):
+                key = f'key{(i * (index + 1)) % 300}'
+                if cache.get(key) is None:
+                    cache[key] = 'x' * (i % 50)
+                if i % 97 == 0:
+                    cache.prune(key)
+        except Exception as e:
+            errors.append(e)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return errors
+
+
+@pytest.mark.parametrize('policy', ['lru', 'lfu', 'tinylfu'])
+def test_concurrent_writers_keep_the_cache_consistent(policy):
+    cache = LruCache(max_size=100, policy=policy, max_bytes=8000)
+
+    assert _hammer(cache) == []
+    assert len(cache) <= 100
+    assert cache.bytes <= 8000
+    assert cache.bytes == sum(cache._sizes.values())
+    assert set(cache._sizes) == set(cache.keys())
+    cache._drain_reads()
+    evicted = [cache._policy.victim() for _ in range(len(cache))]
+    assert sorted(evicted) == sorted(cache.keys())
+
+
+def test_sharded_cache_spreads_keys_and_budget():
+    cache = ShardedCache(shards=4, max_size=100, max_bytes=4000)
+    for i in range(50):
+        cache[f'key{i}'] = i
+
+    assert cache.max_size == 100
+    assert cache.max_bytes == 4000
+    assert all(len(shard) for shard in cache.shards)
+    assert len(cache) == len(cache.keys()) <= 50
+    assert cache.get('key49') == 49 and 'key49' in cache
+    assert cache.stats['hits'] == 1
+
+    cache.prune('key49')
+    assert cache.get('key49') is None
+    assert _hammer(cache) == []
+
+
+def test_persisted_shards_read_back_from_their_storage():
+    cache = ShardedCache(shards=4, persist=True, directory='track')
+    for i in range(20):
+        cache[f'tidal:track:1:2:{i}'] = i
+    cache.close()
+
+    cache = ShardedCache(shards=4, persist=True, directory='track')
+    assert [cache[f'tidal:track:1:2:{i}'] for i in range(20)] == \
+        list(range(20))
+
+
+@pytest.mark.parametrize('cache', [
+    LruCache(max_size=256, policy='tinylfu'), ShardedCache(max_size=256)])
+def test_stress_loses_no_updates(cache):
+    result = stress_cache(cache, 4, duration=0.3)
+
+    assert result['ops'] > 0
+    assert cache.stats['hits'] == result['hits']
+    assert cache.stats['misses'] == result['ops'] - result['hits']
+    assert len(cache) == len(cache.keys()) <= 256
+    assert all(cache.get(key) == key for key in cache.keys())
+
+
+def test_stress_loads_overlap_outside_of_the_locks():
+    misses = {}
+    for threads in (1, 4):
+        result = stress_cache(ShardedCache(max_size=256), threads,
+                              duration=0.3, load_latency=0.01)
+        misses[threads] = result['ops'] - result['hits']
+
+    assert misses[4] > 2 * misses[1]
+
+
+def test_views_are_copies_taken_under_the_lock():
+    cache = LruCache(max_size=100)
+    for i in range(10):
+        cache[f'key{i}'] = i
+
+    for key, value in cache.items():
+        cache.prune(key)
+        cache[f'new{value}'] = value
+
+    assert sorted(cache.values()) == list(range(10))
@@ -0,0 +1,104 @@
+from __future__ import unicode_literals
+
+import json
+from unittest import mock
+
+import pytest
+
+import requests
+
+from tidaloauth4mopidy import Config
+
+from mopidy_tidal import context
+from mopidy_tidal.conditional import ValidatorCache, http_not_modified
+from mopidy_tidal.transport import PooledSession
+
+ARTISTS = {'items': [{'item': {'id': 1, 'name': 'Artist', 'type': 'MAIN'}}]}
+
+
+def _response(status, body=None, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode() if body is not None else b''
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.fixture
+def session(tmp_path):
+    context.set_config({'core': {'cache_dir': str(tmp_path)}})
+    session = PooledSession(Config('token', str(tmp_path / 'oauth.json')),
+                            transport=mock.Mock(),
+                            validators=ValidatorCache(persist=False))
+    session._auth_info = {'token_type': 'Bearer', 'access_token': 'x',
+                          'user': {'userId': 7, 'countryCode': 'NO'}}
+    return session
+
+
+def _sent_headers(session):
+    return session.transport.request.call_args.kwargs['headers']
+
+
+def test_not_modified_responses_reuse_the_mapped_value(session):
+    session.transport.request.side_effect = [
+        _response(200, ARTISTS, {'ETag': '"v1"'}), _response(304)]
+    before = http_not_modified.value('users/favorites')
+
+    artists = session.user.favorites.artists()
+    assert 'If-None-Match' not in _sent_headers(session)
+
+    with mock.patch('tidaloauth4mopidy._parse_artist') as parse:
+        again = session.user.favorites.artists()
+    parse.assert_not_called()
+
+    assert _sent_headers(session)['If-None-Match'] == '"v1"'
+    assert [a.name for a in again] == [a.name for a in artists] == ['Artist']
+    assert again is not artists
+    assert http_not_modified.value('users/favorites') == before + 1
+
+
+def test_modified_responses_replace_the_validators(session):
+    modified = {'items': [{'item': {'id': 2, 'name': 'New', 'type': 'MAIN'}}]}
+    session.transport.request.side_effect = [
+        _response(200, ARTISTS, {'Last-Modified': 'Mon, 01 Jan 2024'}),
+        _response(200, modified, {'ETag': '"v2"'}),
+        _response(304)]
+
+    session.user.favorites.artists()
+    assert [a.name for a in session.user.favorites.artists()] == ['New']
+    assert [a.name for a in session.user.favorites.artists()] == ['New']
+    assert _sent_headers(session)['If-None-Match'] == '"v2"'
+    assert 'If-Modified-Since' not in _sent_headers(session)
+
+
+def test_raw_requests_and_other_resources(session):
+    tracks = {'items': []}
+    session.transport.request.side_effect = [
+        _response(200, tracks, {'ETag': '"t"'}), _response(304),
+        _response(200, {'id': 1}, {'ETag': '"s"'}),
+        _response(200, {'id': 1}, {'ETag': '"s"'})]
+
+    assert session.request('GET', 'users/7/favorites/tracks') == tracks
+    assert session.request('GET', 'users/7/favorites/tracks') == tracks
+
+    # Search results are not validated
+    session.request('GET', 'search')
+    session.request('GET', 'search')
+    assert 'If-None-Match' not in _sent_headers(session)
+
+
+def test_revalidations_are_persisted(session):
+    session.validators = ValidatorCache()
+    session.transport.request.side_effect = [
+        _response(200, ARTISTS, {'ETag': '"v1"'}), _response(304)]
+    session.user.favorites.artists()
+
+    with mock.patch('mopidy_tidal.conditional.time.time',
+                    return_value=2e9):
+        session.user.favorites.artists()
+    session.validators.close()
+
+    validators = ValidatorCache()
+    entry = validators[next(iter(session.validators.keys()))]
+    assert entry.validated_at == 2e9
+    validators.close()
@@ -0,0 +1,90 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from mopidy_tidal.eviction import (
+    LfuPolicy, LruPolicy, TinyLfuPolicy, create_policy, estimate_size,
+)
+from mopidy_tidal.lru_cache import LruCache, configure_cache
+
+
+def test_lru_policy_evicts_least_recently_used():
+    policy = LruPolicy()
+    for key in 'abc':
+        policy.insert(key)
+    policy.access('a')
+
+    assert policy.victim() == 'b'
+    assert policy.victim() == 'c'
+
+
+def test_lfu_policy_evicts_least_frequently_used():
+    policy = LfuPolicy()
+    for key in 'abc':
+        policy.insert(key)
+    policy.access('a')
+    policy.access('c')
+    policy.access('c')
+    policy.remove('b')
+
+    assert policy.victim() == 'a'
+    assert policy.victim() == 'c'
+
+
+def test_create_policy_rejects_unknown_names():
+    assert isinstance(create_policy('tinylfu'), TinyLfuPolicy)
+    with pytest.raises(ValueError):
+        create_policy('fifo')
+
+
+@pytest.mark.parametrize('policy, survivors', [('lru', 0), ('tinylfu', 100)])
+def test_scan_does_not_flush_hot_entries(policy, survivors):
+    cache = LruCache(max_size=200, policy=policy)
+    hot = [f'tidal:track:{i}' for i in range(100)]
+    for _ in range(3):
+        for key in hot:
+            if cache.get(key) is None:
+                cache[key] = key
+
+    # A one-off scan, e.g. a playlist refresh, twice as big as the cache
+    for i in range(400):
+        cache[f'tidal:track:scan:{i}'] = i
+
+    assert sum(key in cache for key in hot) == survivors
+    assert len(cache) == 200
+
+
+def test_cache_is_bounded_by_byte_budget():
+    cache = LruCache(max_size=1000, max_bytes=10000)
+    for i in range(100):
+        cache[f'key{i}'] = 'x' * 1000
+
+    assert 1 < len(cache) < 10
+    assert cache.bytes <= 10000
+    assert 'key99' in cache
+
+    cache.prune('key99')
+    cache.clear()
+    assert cache.bytes == 0
+
+
+def test_configure_cache_from_extension_config():
+    cache = LruCache(max_size=1000)
+    for i in range(100):
+        cache[f'key{i}'] = 'x' * 20000
+
+    configure_cache(cache, {'test_cache_policy': 'lfu',
+                            'test_cache_mb': 1}, 'test')
+
+    assert cache.policy == 'lfu'
+    assert cache.max_bytes == 1024 * 1024
+    assert 0 < cache.bytes <= 1024 * 1024
+    assert len(cache) < 100
+
+
+def test_estimate_size_counts_shared_objects_once():
+    shared = 'y' * 1000
+    assert estimate_size([shared, shared]) < estimate_size(shared) + 100
+    shared = ['y' * 1000]
+    assert estimate_size([shared, shared]) < estimate_size(shared) + 100
+    assert estimate_size({'a': 'x' * 1000}) > 1000
@@ -0,0 +1,58 @@
+from __future__ import unicode_literals
+
+from unittest import mock
+
+from tidaloauth4mopidy.models import Artist
+
+from mopidy_tidal.favorites import FavoritesStore, favorites_store
+from mopidy_tidal.library import TidalLibraryProvider
+
+
+def _session(*names):
+    session = mock.Mock()
+    session.user.favorites.artists.return_value = [
+        Artist(id=i, name=name) for i, name in enumerate(names)]
+    return session
+
+
+def test_favorites_are_kept_until_they_expire():
+    store = FavoritesStore(ttl=60)
+    session = _session('A', 'B', 'A')
+
+    assert store.distinct(session, 'artists') == ['A [TIDAL]', 'B [TIDAL]']
+    assert len(store.get(session, 'artists')) == 3
+    assert session.user.favorites.artists.call_count == 1
+
+    store.ttl = 0
+    store.get(session, 'artists')
+    assert session.user.favorites.artists.call_count == 2
+
+
+def test_listeners_are_told_about_changes_and_invalidations():
+    store = FavoritesStore(ttl=0)
+    changes = []
+    store.add_listener(changes.append)
+
+    store.get(_session('A'), 'artists')
+    store.get(_session('A'), 'artists')
+    assert changes == []
+
+    store.get(_session('A', 'B'), 'artists')
+    store.invalidate('albums')
+    assert changes == ['artists', 'albums']
+
+
+def test_repeated_list_commands_do_not_hit_the_network():
+    session = _session('A')
+    provider = TidalLibraryProvider(backend=mock.Mock(
+        session=session, _config={'tidal': {}}))
+
+    for _ in range(3):
+        assert provider.get_distinct('artist') == ['A [TIDAL]']
+        assert [r.name for r in provider.browse('tidal:my_artists')] == ['A']
+
+    assert session.user.favorites.artists.call_count == 1
+
+    favorites_store.invalidate()
+    provider.get_distinct('albumartist')
+    assert session.user.favorites.artists.call_count == 2
@@ -0,0 +1,43 @@
+from __future__ import unicode_literals
+
+import subprocess
+import sys
+
+from benchmarks.suite import package_import_time
+
+import pytest
+
+# Dependencies that must only be imported once they are actually used
+DEFERRED = ('tidaloauth4mopidy', 'requests', 'spotipy')
+
+# Seconds the extension's own modules may take to import when Mopidy loads
+# the backend (about 0.05 s on a developer machine)
+IMPORT_BUDGET = 0.25
+
+
+def _loaded_modules(statement):
+    code = f'import sys; {statement}; print(" ".join(sys.modules))'
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True).stdout
+    return set(output.split())
+
+
+def test_backend_import_defers_heavy_dependencies():
+    loaded = _loaded_modules('import mopidy_tidal.backend')
+
+    assert not loaded.intersection(DEFERRED)
+
+
+@pytest.mark.parametrize('module', [
+    'full_models_mappers', 'playlists', 'search', 'library', 'backend'])
+def test_modules_import_on_their_own(module):
+    assert f'mopidy_tidal.{module}' in _loaded_modules(
+        f'import mopidy_tidal.{module}')
+
+
+def test_backend_import_time_stays_within_budget():
+    # The best of a few runs, to leave out the noise of the machine
+    elapsed = min(package_import_time('mopidy_tidal.backend', 'mopidy_tidal')
+                  for _ in range(3))
+
+    assert elapsed < IMPORT_BUDGET
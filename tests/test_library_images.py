@@ -0,0 +1,46 @@
+from __future__ import unicode_literals
+
+from unittest import mock
+
+from mopidy_tidal import context
+from mopidy_tidal.library import TidalLibraryProvider
+from mopidy_tidal.lru_cache import image_cache
+
+
+def _provider(tmp_path):
+    context.set_config({'core': {'cache_dir': str(tmp_path)}})
+    image_cache.clear()
+    backend = mock.Mock(image_search=True)
+    backend.session.get_album.side_effect = \
+        lambda album_id: mock.Mock(image=f'https://img/album/{album_id}')
+    backend.session.get_artist.side_effect = \
+        lambda artist_id: mock.Mock(image=None)
+    return TidalLibraryProvider(backend=backend)
+
+
+def test_get_images_groups_tracks_by_album(tmp_path):
+    provider = _provider(tmp_path)
+    uris = ['tidal:track:1:2:3', 'tidal:track:1:2:4', 'tidal:album:1:2',
+            'tidal:artist:1']
+
+    images = provider.get_images(uris)
+
+    assert [i.uri for i in images['tidal:track:1:2:4']] == \
+        ['https://img/album/2']
+    assert images['tidal:album:1:2'] == images['tidal:track:1:2:3']
+    assert images['tidal:artist:1'] == ()
+    provider.backend.session.get_album.assert_called_once_with('2')
+    provider.backend.session.get_artist.assert_called_once_with('1')
+
+
+def test_get_images_are_persisted(tmp_path):
+    provider = _provider(tmp_path)
+    provider.get_images(['tidal:album:1:2', 'tidal:artist:1'])
+    image_cache.clear()
+
+    images = provider.get_images(['tidal:track:1:2:3', 'tidal:artist:1'])
+
+    assert images['tidal:track:1:2:3'][0].uri == 'https://img/album/2'
+    assert images['tidal:artist:1'] == ()
+    assert provider.backend.session.get_album.call_count == 1
+    assert provider.backend.session.get_artist.call_count == 1
@@ -0,0 +1,71 @@
+from __future__ import unicode_literals
+
+from collections import Counter
+
+from tidaloauth4mopidy.models import Album, Artist, Track
+
+from mopidy_tidal.library import TidalLibraryProvider
+from mopidy_tidal.lru_cache import track_cache
+
+
+class FakeSession(object):
+    def __init__(self):
+        self.calls = Counter()
+        self.artist = Artist(id=1, name='Artist')
+        self.album = Album(id=10, name='Album', artist=self.artist)
+
+    def _track(self, track_id):
+        return Track(id=track_id, name=f'Track {track_id}', duration=60,
+                     track_num=track_id, disc_num=1, quality='LOSSLESS',
+                     artist=self.artist, album=self.album)
+
+    def get_track(self, track_id):
+        self.calls['get_track'] += 1
+        return self._track(int(track_id))
+
+    def get_album_tracks(self, album_id):
+        self.calls['get_album_tracks'] += 1
+        return [self._track(i) for i in range(1, 4)]
+
+    def get_artist_top_tracks(self, artist_id):
+        self.calls['get_artist_top_tracks'] += 1
+        return [self._track(i) for i in range(5, 7)]
+
+
+class FakeBackend(object):
+    def __init__(self):
+        self.session = FakeSession()
+
+
+def _provider():
+    track_cache.clear()
+    return TidalLibraryProvider(backend=FakeBackend())
+
+
+def test_lookup_coalesces_tracks_of_the_same_album():
+    provider = _provider()
+    uris = ['tidal:track:1:10:3', 'tidal:track:1:10:1', 'tidal:track:1:10:3']
+
+    tracks = provider.lookup(uris)
+
+    assert [t.uri for t in tracks] == uris
+    assert provider.backend.session.calls == {'get_album_tracks': 1}
+
+
+def test_lookup_keeps_request_order_across_types():
+    provider = _provider()
+    uris = ['tidal:artist:1', 'tidal:track:1:10:2', 'tidal:album:1:10']
+
+    tracks = provider.lookup(uris)
+
+    assert [t.track_no for t in tracks] == [5, 6, 2, 1, 2, 3]
+    assert provider.backend.session.calls == {
+        'get_artist_top_tracks': 1, 'get_album_tracks': 1}
+
+
+def test_lookup_uses_track_cache():
+    provider = _provider()
+    provider.lookup('tidal:track:1:10:2')
+    provider.lookup(['tidal:track:1:10:2'])
+
+    assert provider.backend.session.calls == {'get_track': 1}
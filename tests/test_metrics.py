@@ -0,0 +1,68 @@
+from __future__ import unicode_literals
+
+import urllib.request
+from unittest import mock
+
+import pytest
+
+from mopidy_tidal.lru_cache import LruCache
+from mopidy_tidal.metrics import (
+    Counter, Histogram, InstrumentedProxy, Registry, api_errors,
+    api_requests, registry,
+)
+from mopidy_tidal.metrics_http_server import start_metrics_deamon
+
+
+def test_counter_and_histogram_render_prometheus_text():
+    local = Registry()
+    counter = local.register(Counter('calls_total', 'Calls.', ('method',)))
+    histogram = local.register(Histogram('latency_seconds', 'Latency.',
+                                         ('method',), buckets=(0.1, 1)))
+    counter.inc('get_track')
+    histogram.observe(0.5, 'get_track')
+
+    text = local.render()
+
+    assert 'calls_total{method="get_track"} 1' in text
+    assert 'latency_seconds_bucket{method="get_track",le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{method="get_track",le="1"} 1' in text
+    assert 'latency_seconds_bucket{method="get_track",le="+Inf"} 1' in text
+    assert 'latency_seconds_count{method="get_track"} 1' in text
+
+
+def test_instrumented_proxy_counts_nested_calls_and_errors():
+    session = mock.Mock()
+    session.get_album.side_effect = ValueError
+    proxy = InstrumentedProxy(session)
+    before = api_requests.value('user.favorites.tracks')
+
+    proxy.user.favorites.tracks()
+    with pytest.raises(ValueError):
+        proxy.get_album(1)
+
+    assert api_requests.value('user.favorites.tracks') == before + 1
+    assert api_errors.value('get_album') >= 1
+
+
+def test_cache_gauges_are_exposed_over_http():
+    cache = LruCache(max_size=1)
+    registry.register_cache('test', cache)
+    cache['a'] = 1
+    cache['b'] = 2
+    cache.get('a')
+    cache.get('b')
+
+    server = start_metrics_deamon(0)
+    try:
+        host, port = server.server_address
+        assert host == '127.0.0.1'
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as r:
+            text = r.read().decode('utf-8')
+    finally:
+        server.shutdown()
+
+    assert 'tidal_cache_hits{cache="test"} 1' in text
+    assert 'tidal_cache_misses{cache="test"} 1' in text
+    assert 'tidal_cache_evictions{cache="test"} 1' in text
+    assert 'tidal_cache_size{cache="test"} 1' in text
+    assert 'tidal_search_executor{stat="queue_depth"} 0' in text
@@ -0,0 +1,100 @@
+from __future__ import unicode_literals
+
+from unittest import mock
+
+from tidaloauth4mopidy import Config, Session
+from tidaloauth4mopidy.models import Album, Artist, Track
+
+from mopidy_tidal.library import TidalLibraryProvider
+from mopidy_tidal.paging import (
+    FavoritesPager, get_favorites_page, parse_page_uri,
+)
+
+ARTIST = Artist(id=1, name='Artist')
+ALBUM = Album(id=2, name='Album', artist=ARTIST)
+TRACKS = [Track(id=i, name=f'Track {i}', duration=1, track_num=i,
+                disc_num=1, quality='LOSSLESS', artist=ARTIST, album=ALBUM)
+          for i in range(5)]
+
+
+def _map_request(url, params=None, ret=None):
+    return TRACKS[params['offset']:params['offset'] + params['limit']]
+
+
+def _provider(page_size):
+    backend = mock.Mock(_config={'tidal': {'browse_page_size': page_size}})
+    backend.session.user.id = 7
+    backend.session._map_request.side_effect = _map_request
+    backend.session.user.favorites.tracks.return_value = TRACKS
+    return TidalLibraryProvider(backend=backend)
+
+
+def test_parse_page_uri():
+    assert parse_page_uri('tidal:my_tracks:page:3') == ('tidal:my_tracks', 3)
+    assert parse_page_uri('tidal:album:1:2') == (None, None)
+
+
+def test_pages_are_read_with_the_tidal_client(tmp_path):
+    session = Session(Config('token', str(tmp_path / 'oauth.json')))
+    session._auth_info = {'token_type': 'Bearer', 'access_token': 'x',
+                          'user': {'userId': 7, 'countryCode': 'NO'}}
+    body = {'items': [{'item': {'id': 1, 'name': 'Artist', 'type': 'MAIN'}}]}
+
+    with mock.patch.object(Session, 'request', return_value=body) as request:
+        artists = get_favorites_page(session, 'artists', 4, 2)
+
+    request.assert_called_once_with('GET', 'users/7/favorites/artists',
+                                    {'offset': 4, 'limit': 2})
+    assert [a.name for a in artists] == ['Artist']
+
+
+def test_browse_returns_first_page_and_link_to_next():
+    provider = _provider(page_size=2)
+
+    refs = provider.browse('tidal:my_tracks')
+
+    assert [r.name for r in refs[:2]] == ['Track 0', 'Track 1']
+    assert refs[2].uri == 'tidal:my_tracks:page:1'
+    provider.backend.session._map_request.assert_any_call(
+        'users/7/favorites/tracks', params={'offset': 0, 'limit': 3},
+        ret='tracks')
+
+
+def test_browse_last_page_has_no_link():
+    provider = _provider(page_size=2)
+
+    refs = provider.browse('tidal:my_tracks:page:2')
+
+    assert [r.name for r in refs] == ['Track 4']
+
+
+def test_browse_without_paging_lists_everything():
+    provider = _provider(page_size=0)
+
+    refs = provider.browse('tidal:my_tracks')
+
+    assert len(refs) == 5
+    provider.backend.session._map_request.assert_not_called()
+
+
+def test_pager_keeps_a_bounded_number_of_pages():
+    pager = FavoritesPager(page_size=1, max_pages=2)
+    session = mock.Mock()
+    session._map_request.side_effect = _map_request
+
+    for number in range(4):
+        pager._fetch(session, 'tracks', number)
+
+    assert list(pager._pages) == [('tracks', 2), ('tracks', 3)]
+
+
+def test_only_pages_defer_caching_the_full_models():
+    provider = _provider(page_size=0)
+    with mock.patch('mopidy_tidal.ref_models_mappers.run_in_background') \
+            as background:
+        provider.browse('tidal:my_tracks')
+        background.assert_not_called()
+
+        provider.backend._config['tidal']['browse_page_size'] = 2
+        provider.browse('tidal:my_tracks:page:1')
+        background.assert_called_once()
@@ -0,0 +1,58 @@
+from __future__ import unicode_literals
+
+from unittest import mock
+
+from mopidy_tidal.playback import MediaUrlCache, TidalPlaybackProvider
+
+
+def _provider(**tidal_config):
+    backend = mock.Mock(quality='LOSSLESS',
+                        _config={'tidal': tidal_config})
+    backend.session.get_media_url.side_effect = \
+        lambda track_id: f'https://stream/{track_id}'
+    return TidalPlaybackProvider(audio=None, backend=backend)
+
+
+def test_translate_uri_caches_media_urls():
+    provider = _provider(prefetch_tracks=0)
+
+    assert provider.translate_uri('tidal:track:1:2:3') == 'https://stream/3'
+    assert provider.translate_uri('tidal:track:1:2:3') == 'https://stream/3'
+    provider.backend.session.get_media_url.assert_called_once_with(3)
+
+
+def test_media_url_ttl_of_zero_disables_the_cache():
+    provider = _provider(prefetch_tracks=0, media_url_ttl=0)
+
+    provider.translate_uri('tidal:track:1:2:3')
+    provider.translate_uri('tidal:track:1:2:3')
+    assert provider.backend.session.get_media_url.call_count == 2
+
+
+def test_media_url_cache_expires_entries():
+    with mock.patch('mopidy_tidal.playback.time.monotonic') as now:
+        now.return_value = 100
+        cache = MediaUrlCache(ttl=10)
+        cache.put(3, 'LOSSLESS', 'https://stream/3')
+
+        assert cache.get(3, 'LOSSLESS') == 'https://stream/3'
+        assert cache.get(3, 'HIGH') is None
+        now.return_value = 111
+        assert cache.get(3, 'LOSSLESS') is None
+
+
+def test_prefetch_resolves_upcoming_tracks():
+    provider = _provider(prefetch_tracks=1)
+    with mock.patch.object(provider._prefetcher, '_upcoming_uris',
+                           return_value=['tidal:track:1:2:4']):
+        provider._prefetcher._prefetch_after('tidal:track:1:2:3')
+
+    assert provider._media_urls.get(4, 'LOSSLESS') is not None
+
+
+def test_translate_uri_records_recent_albums():
+    provider = _provider(prefetch_tracks=0)
+    for uri in ('tidal:track:1:2:3', 'tidal:track:1:5:6', 'tidal:track:1:2:4'):
+        provider.translate_uri(uri)
+
+    assert provider.recent_albums() == ['tidal:album:1:2', 'tidal:album:1:5']
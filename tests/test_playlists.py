@@ -0,0 +1,92 @@
+from __future__ import unicode_literals
+
+from collections import Counter
+from unittest import mock
+
+from tidaloauth4mopidy.models import Album, Artist, Playlist, Track
+
+from mopidy_tidal import context
+from mopidy_tidal.playlists import TidalPlaylistsProvider
+
+
+class FakeSession(object):
+    def __init__(self, count):
+        self.calls = Counter()
+        self.playlists = [
+            Playlist(id=f'pl{i}', name=f'Playlist {i}', num_tracks=1)
+            for i in range(count)]
+        self.user = mock.Mock()
+        self.user.playlists.side_effect = lambda: list(self.playlists)
+        self.user.favorites.playlists.return_value = []
+
+    def get_playlist(self, playlist_id):
+        self.calls['get_playlist'] += 1
+        return next(p for p in self.playlists if p.id == playlist_id)
+
+    def get_playlist_tracks(self, playlist_id):
+        self.calls['get_playlist_tracks'] += 1
+        artist = Artist(id=1, name='Artist')
+        album = Album(id=2, name='Album', artist=artist)
+        pl = self.get_playlist(playlist_id)
+        return [Track(id=i, name='Track', duration=1, track_num=1,
+                      disc_num=1, quality='LOSSLESS', artist=artist,
+                      album=album) for i in range(pl.num_tracks)]
+
+
+def _provider(tmp_path, count=3, interval=60):
+    context.set_config({'core': {'cache_dir': str(tmp_path)}})
+    config = {'tidal': {'playlist_check_interval': interval}}
+    backend = mock.Mock(session=FakeSession(count), _config=config)
+    return TidalPlaylistsProvider(backend=backend)
+
+
+@mock.patch('mopidy_tidal.playlists.backend.BackendListener')
+def test_refresh_only_downloads_changed_playlists(_, tmp_path):
+    provider = _provider(tmp_path)
+    provider.refresh()
+    assert provider.backend.session.calls['get_playlist_tracks'] == 3
+
+    provider.backend.session.playlists[1].num_tracks = 2
+    provider.refresh()
+
+    assert provider.backend.session.calls['get_playlist_tracks'] == 4
+    assert len(provider.lookup('tidal:playlist:pl1').tracks) == 2
+
+
+@mock.patch('mopidy_tidal.playlists.backend.BackendListener')
+def test_refresh_prunes_removed_playlists(_, tmp_path):
+    provider = _provider(tmp_path)
+    provider.refresh()
+    del provider.backend.session.playlists[0]
+    provider.refresh()
+
+    assert [r.uri for r in provider.as_list()] == \
+        ['tidal:playlist:pl1', 'tidal:playlist:pl2']
+
+
+@mock.patch('mopidy_tidal.playlists.backend.BackendListener')
+def test_freshness_checks_are_throttled(_, tmp_path):
+    provider = _provider(tmp_path)
+    provider.refresh()
+    calls = provider.backend.session.calls['get_playlist']
+
+    for _ in range(3):
+        provider.get_items('tidal:playlist:pl0')
+
+    assert provider.backend.session.calls['get_playlist'] == calls
+
+
+@mock.patch('mopidy_tidal.playlists.backend.BackendListener')
+def test_freshness_checks_fetch_the_playlist_once(_, tmp_path):
+    provider = _provider(tmp_path, interval=0)
+    provider.refresh()
+    session = provider.backend.session
+    calls = session.calls['get_playlist']
+
+    provider.get_items('tidal:playlist:pl0')
+    assert session.calls['get_playlist'] == calls + 1
+
+    del session.playlists[0]
+    session.get_playlist = mock.Mock(return_value=None)
+    assert provider.lookup('tidal:playlist:pl0') is None
+    session.get_playlist.assert_called_once_with('pl0')
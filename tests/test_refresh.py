@@ -0,0 +1,193 @@
+from __future__ import unicode_literals
+
+import threading
+from unittest import mock
+
+from mopidy_tidal.backend import TidalBackend
+from mopidy_tidal.metrics import InstrumentedProxy
+from mopidy_tidal.playlists import PlaylistUpdates, TidalPlaylistsProvider
+from mopidy_tidal.refresh import (
+    BUDGET_WINDOW, ForegroundActivity, MIN_WAIT, RefreshScheduler,
+    foreground, run_task,
+)
+from mopidy_tidal.workers import run_concurrently
+
+
+class Clock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(clock, activity=None, **kwargs):
+    activity = activity or ForegroundActivity(clock=clock)
+    return RefreshScheduler(activity=activity, clock=clock, **kwargs)
+
+
+def test_runs_due_tasks_and_reschedules_them_with_jitter():
+    clock = Clock()
+    scheduler = _scheduler(clock, jitter=0.1, idle=0)
+    func = mock.Mock()
+    scheduler.add('favorites', func, 100)
+    scheduler.add('disabled', mock.Mock(), 0)
+
+    assert [t.name for t in scheduler.tasks] == ['favorites']
+    task = scheduler.tasks[0]
+    assert 1000 <= task.due <= 1010
+
+    clock.now = 1010
+    delay = scheduler.run_pending()
+    func.assert_called_once_with()
+    assert 1100 <= task.due <= 1120
+    assert delay == task.due - clock.now
+
+    scheduler.run_pending()
+    func.assert_called_once_with()
+
+
+def test_yields_to_foreground_requests():
+    clock = Clock()
+    activity = ForegroundActivity(clock=clock)
+    scheduler = _scheduler(clock, activity=activity, idle=5)
+    func = mock.Mock()
+    scheduler.add('browse', func, 100)
+    clock.now = 1100
+
+    activity.enter()
+    assert scheduler.run_pending() == 5
+    activity.exit()
+    clock.now = 1102
+    assert scheduler.run_pending() == 5
+    func.assert_not_called()
+
+    clock.now = 1106
+    scheduler.run_pending()
+    func.assert_called_once_with()
+
+
+def test_waits_between_checks_even_without_idle_time():
+    clock = Clock()
+    activity = ForegroundActivity(clock=clock)
+    scheduler = _scheduler(clock, activity=activity, idle=0)
+    scheduler.add('browse', mock.Mock(), 100)
+    clock.now = 1100
+
+    activity.enter()
+    assert scheduler.run_pending() == MIN_WAIT
+
+
+def test_postpones_tasks_once_the_budget_is_spent():
+    clock = Clock()
+    scheduler = _scheduler(clock, budget=2, idle=0)
+    session = InstrumentedProxy(mock.Mock())
+    # Fan-outs to the workers are part of the task
+    func = mock.Mock(side_effect=lambda: run_concurrently(
+        lambda _: session.get_track(), range(2)))
+    scheduler.add('albums', func, 100)
+
+    clock.now = 1200
+    scheduler.run_pending()
+    clock.now = 1400
+    scheduler.run_pending()
+    assert func.call_count == 1
+    assert scheduler.tasks[0].due == 1000 + BUDGET_WINDOW
+
+    clock.now = 1000 + BUDGET_WINDOW
+    scheduler.run_pending()
+    assert func.call_count == 2
+
+
+def test_only_counts_the_requests_of_the_tasks():
+    clock = Clock()
+    scheduler = _scheduler(clock, budget=2, idle=0)
+    session = InstrumentedProxy(mock.Mock())
+
+    def task():
+        # Requests running alongside the task are not part of it
+        thread = threading.Thread(
+            target=lambda: [session.get_track() for _ in range(5)])
+        thread.start()
+        thread.join()
+        session.get_track()
+
+    func = mock.Mock(side_effect=task)
+    scheduler.add('albums', func, 100)
+
+    clock.now = 1200
+    scheduler.run_pending()
+    clock.now = 1400
+    scheduler.run_pending()
+    assert func.call_count == 2
+
+
+def test_failing_tasks_are_rescheduled():
+    clock = Clock()
+    scheduler = _scheduler(clock, idle=0)
+    scheduler.add('playlists', mock.Mock(side_effect=IOError), 100)
+
+    clock.now = 1200
+    scheduler.run_pending()
+    assert scheduler.tasks[0].due > 1200
+
+
+def test_foreground_marks_requests_but_not_background_work():
+    activity = ForegroundActivity(clock=Clock())
+    seen = []
+
+    @foreground
+    def request():
+        seen.append(activity.busy())
+
+    with mock.patch('mopidy_tidal.refresh.activity', activity):
+        request()
+        with activity.background():
+            request()
+
+    assert seen == [True, False]
+    assert not activity.busy()
+
+
+@mock.patch('mopidy_tidal.playlists.backend.BackendListener')
+def test_backend_only_stores_the_playlists_on_its_actor(listener, tmp_path):
+    config = {'core': {'cache_dir': str(tmp_path)}, 'tidal': {
+        'token': 'token', 'oauth': str(tmp_path / 'oauth.json'),
+        'image_search': False, 'quality': 'LOSSLESS',
+        'spotify_proxy': False, 'warm_start': False,
+        'refresh_playlists_interval': 100}}
+    fetching = threading.Event()
+    release = threading.Event()
+    threads = {}
+
+    def fetch_updates(provider):
+        threads['fetch'] = threading.current_thread().name
+        fetching.set()
+        release.wait(5)
+        return PlaylistUpdates([], {}, [])
+
+    def apply_updates(provider, updates):
+        threads['apply'] = threading.current_thread().name
+
+    with mock.patch.object(RefreshScheduler, 'start', autospec=True) as start:
+        actor_ref = TidalBackend.start(config=config, audio=mock.Mock())
+        # Once started
+        actor_ref.proxy().uri_schemes.get(timeout=5)
+    [task] = start.call_args[0][0].tasks
+    refresher = threading.Thread(target=run_task, args=(task,))
+    with mock.patch.multiple(TidalPlaylistsProvider,
+                             fetch_updates=fetch_updates,
+                             apply_updates=apply_updates):
+        try:
+            refresher.start()
+            assert fetching.wait(5)
+            # The actor answers Mopidy while the refresh waits for TIDAL
+            assert actor_ref.proxy().uri_schemes.get(timeout=1) == ['tidal']
+            release.set()
+            refresher.join(5)
+        finally:
+            release.set()
+            actor_ref.stop()
+
+    assert not threads['fetch'].startswith('TidalBackend')
+    assert threads['apply'].startswith('TidalBackend')
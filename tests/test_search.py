@@ -0,0 +1,124 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+from unittest import mock
+
+from benchmarks.fake_session import FakeSession, LibrarySize
+
+import pytest
+
+from mopidy_tidal import workers
+from mopidy_tidal.library import TidalLibraryProvider
+from mopidy_tidal.search import tidal_search
+
+SIZE = LibrarySize(artists=3, albums_per_artist=2, tracks_per_album=3)
+
+
+@pytest.fixture(autouse=True)
+def clear_search_cache():
+    tidal_search.clear()
+
+
+def test_exact_search_intersects_all_the_fields():
+    session = FakeSession(SIZE)
+
+    artists, albums, tracks = tidal_search(
+        session, query={'artist': ['Artist 0'],
+                        'album': ['Artist 0 Album 1 [TIDAL]']}, exact=True)
+
+    assert [a.name for a in artists] == ['Artist 0']
+    assert [a.name for a in albums] == ['Artist 0 Album 1']
+    assert len(tracks) == 3
+    assert session.calls == {'search': 2, 'get_album_tracks': 1}
+
+
+def test_exact_search_filters_albums_by_artist():
+    session = FakeSession(SIZE)
+
+    artists, albums, tracks = tidal_search(
+        session, query={'albumartist': ['Artist 1'],
+                        'album': ['Artist 0 Album 1']}, exact=True)
+
+    assert (artists, albums, tracks) == ([], [], [])
+    assert 'get_album_tracks' not in session.calls
+
+
+def test_exact_search_matches_track_names_within_albums():
+    session = FakeSession(SIZE)
+
+    _, albums, tracks = tidal_search(
+        session, query={'album': ['Artist 0 Album 0'],
+                        'track_name': ['Artist 0 Album 0 Track 2']},
+        exact=True)
+
+    assert len(albums) == 1
+    assert [t.name for t in tracks] == ['Artist 0 Album 0 Track 2']
+
+
+def test_exact_search_runs_in_one_concurrent_round():
+    session = FakeSession(SIZE, latency=0.2)
+
+    started_at = time.monotonic()
+    tidal_search(session, query={'artist': ['Artist 0'],
+                                 'album': ['Artist 0 Album 1'],
+                                 'track_name': ['Artist 0 Album 1 Track 0']},
+                 exact=True)
+
+    # The album search and its tracks take two round trips; the artist and
+    # track searches run alongside them
+    assert time.monotonic() - started_at < 0.6
+    assert session.calls == {'search': 3, 'get_album_tracks': 1}
+
+
+def test_tracks_of_matching_albums_are_fetched_concurrently():
+    session = FakeSession(SIZE, latency=0.2)
+    for album in session.albums[:4]:
+        album.name = 'Greatest Hits'
+
+    started_at = time.monotonic()
+    _, albums, tracks = tidal_search(
+        session, query={'album': ['Greatest Hits']}, exact=True)
+
+    assert len(albums) == 4
+    assert len(tracks) == 4 * SIZE.tracks_per_album
+    assert time.monotonic() - started_at < 0.6
+    assert session.calls == {'search': 1, 'get_album_tracks': 4}
+
+
+def test_free_text_search_uses_every_field():
+    session = FakeSession(SIZE)
+
+    artists, albums, tracks = tidal_search(
+        session, query={'artist': ['Artist 2'], 'album': ['Album 1']},
+        exact=False)
+
+    assert [a.name for a in albums] == ['Artist 2 Album 1']
+    assert session.calls == {'search': 3}
+
+
+def test_library_search_answers_within_the_deadline():
+    session = FakeSession(SIZE)
+    search = session.search
+    release = threading.Event()
+
+    def hanging_search(kind, keyword):
+        if kind == 'album':
+            release.wait(5)
+        return search(kind, keyword)
+
+    session.search = hanging_search
+    provider = TidalLibraryProvider(backend=mock.Mock(
+        session=session, _config={'tidal': {'local_search': False}}))
+    workers.configure_search(timeout=0.2)
+    try:
+        started_at = time.monotonic()
+        result = provider.search(query={'any': ['Artist 1']})
+        elapsed = time.monotonic() - started_at
+    finally:
+        release.set()
+        workers.configure_search()
+
+    assert elapsed < 1
+    assert [a.name for a in result.artists] == ['Artist 1']
+    assert result.albums == ()
@@ -0,0 +1,90 @@
+from __future__ import unicode_literals
+
+from mopidy.models import Album, Artist, Track
+
+from mopidy_tidal.lru_cache import track_cache
+from mopidy_tidal.search_index import SearchIndex
+
+ARTIST = Artist(uri='tidal:artist:1', name='Daft Punk')
+ALBUM = Album(uri='tidal:album:1:2', name='Random Access Memories',
+              artists=[ARTIST])
+TRACK = Track(uri='tidal:track:1:2:3', name='Get Lucky', artists=[ARTIST],
+              album=ALBUM)
+
+
+def _index():
+    index = SearchIndex()
+    for model in (ARTIST, ALBUM, TRACK):
+        index.add(model)
+    track_cache[TRACK.uri] = TRACK
+    return index
+
+
+def test_search_matches_prefixes():
+    artists, albums, tracks = _index().search({'any': ['daf']})
+
+    assert artists == [ARTIST]
+    assert albums == [ALBUM]
+    assert tracks == [TRACK]
+
+
+def test_exact_search_requires_full_field_match():
+    index = _index()
+
+    assert index.search({'album': ['Random Access']}, exact=True) is None
+    assert index.search({'album': ['random access memories [TIDAL]']},
+                        exact=True) == ([], [ALBUM], [TRACK])
+
+
+def test_search_intersects_fields():
+    index = _index()
+
+    assert index.search({'artist': ['daft'], 'track_name': ['lucky']}) == \
+        ([], [], [TRACK])
+    assert index.search({'artist': ['daft'], 'album': ['discovery']}) is None
+
+
+def test_search_misses_on_unindexed_fields():
+    assert _index().search({'date': ['2013']}) is None
+
+
+def test_distinct_albums_of_artist():
+    assert _index().distinct('album', {'artist': ['Daft Punk']}) == \
+        ['Random Access Memories']
+
+
+def test_index_is_bounded():
+    index = SearchIndex(max_documents=2)
+    for model in (ARTIST, ALBUM, TRACK):
+        index.add(model)
+
+    assert len(index) == 2
+    assert ARTIST.uri not in index
+    assert index.search({'artist': ['daft']}) is not None
+
+
+def test_removed_documents_release_their_tokens():
+    index = _index()
+    index.add(Artist(uri='tidal:artist:2', name='Punk Rockers'))
+    for uri in (ARTIST.uri, ALBUM.uri, TRACK.uri):
+        index.remove(uri)
+
+    assert index._tokens == ['punk', 'rockers']
+    assert index.search({'any': ['daf']}) is None
+
+
+def test_clear_empties_the_index():
+    index = _index()
+    index.clear()
+
+    assert len(index) == 0
+    assert index.search({'any': ['daf']}) is None
+    index.add(ARTIST)
+    assert index.search({'any': ['daf']})[0] == [ARTIST]
+
+
+def test_matches_keep_the_insertion_order():
+    index = _index()
+    index.add(ARTIST)
+
+    assert index.match({'any': ['daft']}) == [ALBUM.uri, TRACK.uri, ARTIST.uri]
@@ -0,0 +1,109 @@
+from __future__ import unicode_literals
+
+import os
+from unittest import mock
+
+import pytest
+
+from mopidy_tidal import context
+from mopidy_tidal.lru_cache import LruCache
+from mopidy_tidal.segment_store import SegmentStore
+
+
+def test_segment_store_roundtrip(tmp_path):
+    store = SegmentStore(str(tmp_path), batch_size=2)
+    store.put('tidal:track:1:2:3', {'name': 'Track'})
+    store.put('tidal:track:1:2:4', ['a', 'b'])
+
+    assert store.get('tidal:track:1:2:3') == {'name': 'Track'}
+    assert store.get('tidal:track:1:2:4') == ['a', 'b']
+    with pytest.raises(KeyError):
+        store.get('tidal:track:1:2:5')
+
+
+def test_segment_store_survives_reopen(tmp_path):
+    store = SegmentStore(str(tmp_path), index_merge_size=2)
+    for i in range(5):
+        store.put(f'tidal:album:1:{i}', i)
+    store.delete('tidal:album:1:3')
+    store.close()
+
+    store = SegmentStore(str(tmp_path))
+    assert [store.get(f'tidal:album:1:{i}') for i in (0, 1, 2, 4)] == \
+        [0, 1, 2, 4]
+    assert 'tidal:album:1:3' not in store
+
+
+def test_segment_store_recovers_from_truncated_segment(tmp_path):
+    store = SegmentStore(str(tmp_path))
+    store.put_many([('tidal:artist:1', 'one'), ('tidal:artist:2', 'two')])
+    store.close()
+
+    segment = next(f for f in os.listdir(tmp_path) if f.endswith('.seg'))
+    with open(tmp_path / segment, 'r+b') as f:
+        f.truncate(os.path.getsize(tmp_path / segment) - 1)
+    os.unlink(tmp_path / 'index')
+
+    store = SegmentStore(str(tmp_path))
+    assert store.get('tidal:artist:1') == 'one'
+    assert 'tidal:artist:2' not in store
+
+
+def test_segment_store_compaction_drops_dead_records(tmp_path):
+    store = SegmentStore(str(tmp_path))
+    for i in range(10):
+        store.put_many([('tidal:artist:1', i)])
+    store.compact()
+
+    assert store.get('tidal:artist:1') == 9
+    segments = [f for f in os.listdir(tmp_path) if f.endswith('.seg')]
+    assert len(segments) == 1
+    assert os.path.getsize(tmp_path / segments[0]) < 100
+
+
+def test_segment_store_compaction_does_not_reenter(tmp_path):
+    store = SegmentStore(str(tmp_path), compact_min_size=0)
+    store.put_many([('tidal:artist:1', 0)])
+    store.put_many([('tidal:artist:1', 1)])
+    store.put('tidal:artist:1', 2)
+
+    compact = SegmentStore.compact
+    with mock.patch.object(SegmentStore, 'compact', autospec=True,
+                           side_effect=compact) as spy:
+        store.compact()
+
+    assert spy.call_count == 1
+    assert store.get('tidal:artist:1') == 2
+
+
+def test_segment_store_keeps_keys_with_colliding_hashes(tmp_path):
+    with mock.patch('mopidy_tidal.segment_store._key_hash', return_value=7):
+        store = SegmentStore(str(tmp_path), index_merge_size=1)
+        store.put_many([('tidal:artist:1', 'one'), ('tidal:artist:2', 'two')])
+        store.put_many([('tidal:artist:1', 'uno')])
+        store.close()
+
+        store = SegmentStore(str(tmp_path))
+        assert store.get('tidal:artist:1') == 'uno'
+        assert store.get('tidal:artist:2') == 'two'
+
+        store.delete('tidal:artist:1')
+        store.compact()
+        assert 'tidal:artist:1' not in store
+        assert store.get('tidal:artist:2') == 'two'
+
+
+def test_lru_cache_reads_back_from_segments(tmp_path):
+    context.set_config({'core': {'cache_dir': str(tmp_path)}})
+    cache = LruCache(max_size=1, persist=True, directory='playlist')
+    cache['tidal:playlist:1'] = 'first'
+    cache['tidal:playlist:2'] = 'second'
+
+    assert list(cache.keys()) == ['tidal:playlist:2']
+    assert cache['tidal:playlist:1'] == 'first'
+    assert cache.hit('tidal:playlist:3') is None
+
+
+def test_lru_cache_rejects_unknown_storage():
+    with pytest.raises(ValueError):
+        LruCache(storage='sqlite')
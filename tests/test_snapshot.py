@@ -0,0 +1,138 @@
+from __future__ import unicode_literals
+
+import os
+import threading
+from unittest import mock
+
+from tidaloauth4mopidy.models import Artist as TidalArtist
+
+from mopidy_tidal import Extension
+from mopidy_tidal.backend import TidalBackend
+from mopidy_tidal.favorites import DEFAULT_TTL, favorites_store
+from mopidy_tidal.library import TidalLibraryProvider
+from mopidy_tidal.playlists import PlaylistUpdates, TidalPlaylistsProvider
+from mopidy_tidal.snapshot import SNAPSHOT_VERSION, Snapshot
+from mopidy_tidal.workers import wait_background
+
+
+def test_snapshot_keeps_the_playlists_and_favourites(tmp_path):
+    snapshot = Snapshot(str(tmp_path))
+    snapshot.load()
+    snapshot.save(playlists=[('tidal:playlist:1', 'Playlist')],
+                  favorites={'artists': [TidalArtist(id=1, name='Artist')]})
+    snapshot.close()
+
+    snapshot = Snapshot(str(tmp_path))
+    assert snapshot.load()
+    assert snapshot.playlists() == [('tidal:playlist:1', 'Playlist')]
+    assert [a.name for a in snapshot.favorites()['artists']] == ['Artist']
+    snapshot.close()
+
+
+def test_snapshot_of_another_version_is_discarded(tmp_path):
+    snapshot = Snapshot(str(tmp_path))
+    snapshot.load()
+    snapshot.save(playlists=[('tidal:playlist:1', 'Playlist')])
+    snapshot.store.put('meta', {'version': SNAPSHOT_VERSION + 1})
+
+    assert not snapshot.load()
+    assert snapshot.playlists() is None
+    snapshot.close()
+
+
+@mock.patch('mopidy_tidal.playlists.backend.BackendListener')
+def test_warm_playlists_are_listed_before_revalidation(listener):
+    session = mock.Mock()
+    provider = TidalPlaylistsProvider(backend=mock.Mock(
+        session=session, _config={'tidal': {}}))
+    provider.warm_start([('tidal:playlist:1', 'B'), ('tidal:playlist:2', 'A')])
+
+    assert [r.name for r in provider.as_list()] == ['A', 'B']
+    session.user.playlists.assert_not_called()
+
+    session.user.playlists.return_value = []
+    session.user.favorites.playlists.return_value = []
+    provider.revalidate()
+
+    assert provider.as_list() == []
+    listener.send.assert_called_with('playlists_loaded')
+
+
+@mock.patch('mopidy_tidal.playlists.backend.BackendListener')
+def test_actor_answers_while_the_snapshot_is_revalidated(listener, tmp_path):
+    config = {'core': {'cache_dir': str(tmp_path)}, 'tidal': {
+        'token': 'token', 'oauth': str(tmp_path / 'oauth.json'),
+        'image_search': False, 'quality': 'LOSSLESS',
+        'spotify_proxy': False, 'warm_start': True}}
+    snapshot = Snapshot(os.path.join(Extension.get_cache_dir(config),
+                                     'snapshot'))
+    snapshot.load()
+    snapshot.save(playlists=[('tidal:playlist:1', 'Warm')])
+    snapshot.close()
+    fetching = threading.Event()
+    release = threading.Event()
+
+    def fetch_updates(provider):
+        fetching.set()
+        release.wait(5)
+        return PlaylistUpdates([], {}, [])
+
+    with mock.patch.object(TidalPlaylistsProvider, 'fetch_updates',
+                           fetch_updates):
+        actor_ref = TidalBackend.start(config=config, audio=mock.Mock())
+        try:
+            playlists = actor_ref.proxy().playlists
+            assert fetching.wait(5)
+            assert [r.name for r in playlists.as_list().get(timeout=1)] == [
+                'Warm']
+
+            release.set()
+            wait_background()
+            assert playlists.as_list().get(timeout=1) == []
+        finally:
+            release.set()
+            actor_ref.stop()
+
+
+def test_warm_favorites_are_used_until_revalidated():
+    session = mock.Mock()
+    session.user.favorites.artists.return_value = [
+        TidalArtist(id=2, name='Fresh')]
+    provider = TidalLibraryProvider(backend=mock.Mock(
+        session=session, _config={'tidal': {}}))
+    favorites_store.warm_start({'artists': [TidalArtist(id=1, name='Warm')]})
+
+    assert [r.name for r in provider.browse('tidal:my_artists')] == ['Warm']
+    session.user.favorites.artists.assert_not_called()
+
+    favorites_store.revalidate(session)
+
+    assert [r.name for r in provider.browse('tidal:my_artists')] == ['Fresh']
+    assert favorites_store.snapshot()['artists'][0].name == 'Fresh'
+
+
+def test_revalidation_steps_fail_independently():
+    session = mock.Mock()
+    session.user.favorites.artists.return_value = [
+        TidalArtist(id=2, name='Fresh')]
+    backend = mock.Mock(session=session)
+    backend.playlists.fetch_updates.side_effect = IOError
+    favorites_store.warm_start({'artists': [TidalArtist(id=1, name='Warm')]})
+
+    TidalBackend._revalidate_snapshot(backend)
+
+    assert favorites_store.snapshot()['artists'][0].name == 'Fresh'
+
+
+def test_warm_favorites_expire_if_never_revalidated():
+    session = mock.Mock()
+    session.user.favorites.artists.return_value = [
+        TidalArtist(id=2, name='Fresh')]
+    with mock.patch('mopidy_tidal.favorites.time.monotonic') as now:
+        now.return_value = 1000
+        favorites_store.warm_start({'artists': [TidalArtist(id=1,
+                                                            name='Warm')]})
+        assert favorites_store.get(session, 'artists')[0].name == 'Warm'
+
+        now.return_value = 1000 + DEFAULT_TTL
+        assert favorites_store.get(session, 'artists')[0].name == 'Fresh'
@@ -0,0 +1,122 @@
+from __future__ import unicode_literals
+
+from unittest import mock
+
+from tidaloauth4mopidy.models import Album, Artist, SearchResult, Track
+
+from mopidy_tidal.library import TidalLibraryProvider
+from mopidy_tidal.spotify_proxy import (
+    MAX_IDS_PER_REQUEST, MISS_TTL, SpotifyProxy,
+)
+
+
+def _spotify_track(i):
+    return {'name': f'Song {i}', 'artists': [{'name': 'Band'}],
+            'uri': f'spotify:track:{i}'}
+
+
+def _client():
+    client = mock.Mock()
+    client.tracks.side_effect = lambda uris: {
+        'tracks': [_spotify_track(u.split(':')[-1]) for u in uris]}
+    return client
+
+
+def _search(field, keyword):
+    artist = Artist(id=1, name='Band')
+    album = Album(id=2, name='Album', artist=artist)
+    name = keyword.split(' ', 1)[1]
+    return SearchResult(tracks=[
+        Track(id=int(name.split()[-1]) + 100, name=name, duration=1,
+              track_num=1, disc_num=1, quality='LOSSLESS', artist=artist,
+              artists=[artist], album=album)])
+
+
+def _provider():
+    session = mock.Mock()
+    session.search.side_effect = _search
+    backend = mock.Mock(session=session, _config={'tidal': {
+        'spotify_proxy': True, 'spotify_client_id': 'id',
+        'spotify_client_secret': 'secret'}})
+    provider = TidalLibraryProvider(backend=backend)
+    provider._spotify._client = _client()
+    return provider
+
+
+def test_track_details_are_requested_in_batches():
+    proxy = SpotifyProxy('id', 'secret')
+    proxy._client = _client()
+    uris = [f'spotify:track:{i}' for i in range(MAX_IDS_PER_REQUEST * 2 + 1)]
+
+    info = proxy.get_songs_info(uris)
+
+    assert proxy.client.tracks.call_count == 3
+    assert info['spotify:track:7'] == {'title': 'Song 7', 'artists': ['Band']}
+    proxy.close()
+
+
+def test_lookup_resolves_spotify_tracks_once():
+    provider = _provider()
+    uris = [f'spotify:track:{i}' for i in range(3)]
+
+    tracks = provider.lookup(uris)
+
+    assert [t.uri for t in tracks] == [
+        f'tidal:track:1:2:{i + 100}' for i in range(3)]
+    assert provider._spotify.client.tracks.call_count == 1
+    assert provider.backend.session.search.call_count == 3
+
+    # The mapping is persisted: a new proxy resolves without any request
+    provider._spotify.close()
+    provider = _provider()
+    assert [t.uri for t in provider.lookup(uris)] == [t.uri for t in tracks]
+    provider._spotify.client.tracks.assert_not_called()
+    provider.backend.session.search.assert_not_called()
+    provider._spotify.close()
+
+
+def test_spotify_playlists_are_expanded():
+    provider = _provider()
+    provider._spotify.client.playlist_items.return_value = {
+        'items': [{'track': _spotify_track(i)} for i in range(2)],
+        'next': None}
+
+    tracks = provider.lookup('spotify:playlist:abc')
+
+    assert len(tracks) == 2
+    provider._spotify.client.tracks.assert_not_called()
+    provider._spotify.close()
+
+
+def test_failed_matches_do_not_abort_the_batch():
+    proxy = SpotifyProxy('id', 'secret')
+    songs = {f'spotify:track:{i}': {'title': f'Song {i}', 'artists': []}
+             for i in range(3)}
+
+    def match(info):
+        if info['title'] == 'Song 1':
+            raise AttributeError('name')
+        return 'tidal:track:' + info['title'][-1]
+
+    mapping = proxy.resolve(songs, match)
+
+    assert mapping == {'spotify:track:0': 'tidal:track:0',
+                       'spotify:track:2': 'tidal:track:2'}
+    assert 'spotify:track:1' not in proxy.mapping
+    proxy.close()
+
+
+def test_misses_are_searched_again_once_expired():
+    proxy = SpotifyProxy('id', 'secret')
+    songs = {'spotify:track:1': {'title': 'Song 1', 'artists': []}}
+    match = mock.Mock(return_value='')
+
+    assert proxy.resolve(songs, match) == {'spotify:track:1': ''}
+    assert proxy.resolve(songs, match) == {'spotify:track:1': ''}
+    assert match.call_count == 1
+
+    with mock.patch('mopidy_tidal.spotify_proxy.time.time',
+                    return_value=proxy.mapping['spotify:track:1'] + MISS_TTL):
+        proxy.resolve(songs, match)
+    assert match.call_count == 2
+    proxy.close()
@@ -0,0 +1,43 @@
+from __future__ import unicode_literals
+
+from mopidy.models import Album, Artist, Track
+
+from mopidy_tidal.lru_cache import TrackCache
+
+
+def _track(track_id, album_id=1):
+    artist = Artist(uri='tidal:artist:1', name='Artist')
+    album = Album(uri=f'tidal:album:1:{album_id}', name='Album',
+                  artists=[artist])
+    return Track(uri=f'tidal:track:1:{album_id}:{track_id}',
+                 name=f'Track {track_id}', track_no=track_id, disc_no=1,
+                 length=1000, genre='LOSSLESS', artists=[artist],
+                 album=album, date='2020')
+
+
+def test_track_cache_materializes_equal_tracks():
+    cache = TrackCache(max_size=10)
+    track = _track(1)
+    cache[track.uri] = track
+
+    assert cache[track.uri] == track
+    assert cache.hit(track.uri) == track
+
+
+def test_track_cache_interns_artists_and_albums():
+    cache = TrackCache(max_size=10)
+    for i in range(5):
+        cache[_track(i).uri] = _track(i)
+    cache[_track(5, album_id=2).uri] = _track(5, album_id=2)
+
+    assert len(cache._tracks.artists) == 1
+    assert len(cache._tracks.albums) == 2
+
+
+def test_track_cache_releases_interned_rows_on_eviction():
+    cache = TrackCache(max_size=1)
+    cache[_track(1).uri] = _track(1)
+    cache[_track(2, album_id=2).uri] = _track(2, album_id=2)
+
+    assert len(cache._tracks.albums) == 1
+    assert cache[_track(2, album_id=2).uri].album.uri == 'tidal:album:1:2'
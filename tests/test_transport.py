@@ -0,0 +1,130 @@
+from __future__ import unicode_literals
+
+import json
+import threading
+from unittest import mock
+
+import pytest
+
+import requests
+from requests.exceptions import ConnectionError, HTTPError
+
+from tidaloauth4mopidy import Config
+
+from mopidy_tidal.transport import PooledSession, Transport, retry_after
+
+
+def _response(status, headers=None):
+    response = mock.Mock(status_code=status)
+    response.headers = headers or {}
+    return response
+
+
+@pytest.fixture
+def transport():
+    sleeps = []
+    transport = Transport(retries=3, backoff=0.1, sleep=sleeps.append)
+    transport._local.session = mock.Mock()
+    transport.sleeps = sleeps
+    return transport
+
+
+def test_retries_server_errors_with_backoff(transport):
+    transport.http.request.side_effect = [
+        _response(503), _response(502), _response(200)]
+
+    assert transport.request('GET', 'https://api').status_code == 200
+    assert transport.http.request.call_count == 3
+    assert len(transport.sleeps) == 2
+    assert all(0 <= s <= 0.1 * 2 ** i for i, s in enumerate(transport.sleeps))
+
+
+def test_honors_retry_after(transport):
+    transport.http.request.side_effect = [
+        _response(429, {'Retry-After': '7'}), _response(200)]
+
+    transport.request('GET', 'https://api')
+
+    assert transport.sleeps == [7.0]
+
+
+def test_gives_up_after_the_configured_retries(transport):
+    transport.http.request.return_value = _response(500)
+
+    assert transport.request('GET', 'https://api').status_code == 500
+    assert transport.http.request.call_count == 4
+
+
+def test_retries_connection_errors(transport):
+    transport.http.request.side_effect = [ConnectionError, _response(200)]
+
+    assert transport.request('GET', 'https://api').status_code == 200
+
+
+def test_does_not_retry_non_idempotent_requests(transport):
+    transport.http.request.return_value = _response(503)
+
+    transport.request('POST', 'https://api')
+
+    assert transport.http.request.call_count == 1
+
+
+def test_threads_have_their_own_session_and_share_the_pool():
+    transport = Transport()
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(transport.http))
+    thread.start()
+    thread.join()
+
+    assert transport.http is transport.http
+    assert sessions[0] is not transport.http
+    assert sessions[0].get_adapter('https://api') is \
+        transport.http.get_adapter('https://api')
+    transport.close()
+
+
+def test_retry_after_http_date():
+    response = _response(429, {'Retry-After': 'Wed, 21 Oct 2015 07:28:10 GMT'})
+
+    assert retry_after(response, now=1445412480) == 10.0
+    assert retry_after(_response(429)) is None
+
+
+def _http_response(status, body=None):
+    response = requests.Response()
+    response.status_code = status
+    response.url = 'https://api.tidal.com/v1/tracks/1'
+    response._content = json.dumps(body).encode() if body is not None else b''
+    return response
+
+
+def _pooled_session(tmp_path):
+    session = PooledSession(Config('token', str(tmp_path / 'oauth.json')),
+                            transport=mock.Mock())
+    session._auth_info = {'token_type': 'Bearer', 'access_token': 'x',
+                          'user': {'userId': 7, 'countryCode': 'NO'}}
+    return session
+
+
+def test_library_requests_go_through_the_transport(tmp_path):
+    session = _pooled_session(tmp_path)
+    session.transport.request.return_value = _http_response(200, {'id': 1})
+
+    with mock.patch('requests.request') as direct:
+        assert session.request('GET', 'tracks/1') == {'id': 1}
+    direct.assert_not_called()
+
+    (method, url), kwargs = session.transport.request.call_args
+    assert (method, url) == ('GET', 'https://api.tidalhifi.com/v1/tracks/1')
+    assert kwargs['headers']['Authorization'] == 'Bearer x'
+
+
+@pytest.mark.parametrize('status', [401, 404])
+def test_client_errors_raise_http_errors(tmp_path, status):
+    session = _pooled_session(tmp_path)
+    session._token_expiry = 2e9
+    session.transport.request.return_value = _http_response(status)
+
+    with pytest.raises(HTTPError) as error:
+        session.request('GET', 'tracks/1')
+    assert error.value.response.status_code == status
@@ -0,0 +1,44 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from mopidy_tidal.uri import album_uri, parse, track_uri, try_parse
+
+
+def test_parse_track_uri():
+    uri = parse('tidal:track:1:2:3')
+
+    assert (uri.kind, uri.ids) == ('track', ('1', '2', '3'))
+    assert (uri.artist_id, uri.album_id, uri.id) == ('1', '2', '3')
+    assert uri.album_uri == 'tidal:album:1:2'
+    assert str(uri) == 'tidal:track:1:2:3'
+
+
+def test_parse_directory_uri():
+    uri = parse('tidal:my_tracks:page:2')
+
+    assert (uri.kind, uri.ids) == ('my_tracks', ('page', '2'))
+    assert not uri.is_item
+    assert uri.id is None
+
+
+def test_parsed_uris_are_shared_and_immutable():
+    uri = parse(track_uri(1, 2, 3))
+
+    assert parse('tidal:track:1:2:3') is uri
+    assert uri == parse(''.join(['tidal:track:1:2:', '3']))
+    with pytest.raises(AttributeError):
+        uri.kind = 'album'
+
+
+def test_built_uris_are_interned():
+    assert album_uri(1, 2) is album_uri('1', 2)
+
+
+@pytest.mark.parametrize('uri', [
+    'spotify:track:1', 'tidal', 'tidal::1', 'tidal:track:1:2',
+    'tidal:album:1::2', 'tidal:artist'])
+def test_invalid_uris_are_rejected(uri):
+    with pytest.raises(ValueError):
+        parse(uri)
+    assert try_parse(uri) is None
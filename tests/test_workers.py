@@ -0,0 +1,65 @@
+from __future__ import unicode_literals
+
+import threading
+
+from mopidy_tidal.workers import (
+    SearchExecutor, run_concurrently, run_in_background,
+)
+
+
+def test_run_concurrently_keeps_order():
+    assert run_concurrently(lambda x: x * 2, range(10)) == \
+        [x * 2 for x in range(10)]
+
+
+def test_background_fan_outs_run_on_the_shared_core():
+    def fan_out():
+        return run_concurrently(
+            lambda _: threading.current_thread().name, range(4))
+
+    names = run_in_background(fan_out).result(5)
+
+    assert all(name.startswith('TidalWorker') for name in names)
+
+
+def test_search_executor_returns_results_and_metrics():
+    executor = SearchExecutor(max_workers=2, timeout=5)
+
+    results, complete = executor.run([(str.upper, ('a',)),
+                                      (str.upper, ('b',))])
+
+    assert results == ['A', 'B']
+    assert complete
+    metrics = executor.metrics()
+    assert metrics['rounds'] == 1
+    assert metrics['completed'] == 2
+    assert metrics['queue_depth'] == 0
+
+
+def test_search_executor_enforces_deadline():
+    executor = SearchExecutor(max_workers=1, timeout=0.05)
+    release = threading.Event()
+
+    results, complete = executor.run([(release.wait, (5,))])
+
+    assert results == [None]
+    assert not complete
+    assert executor.metrics()['timed_out'] == 1
+    release.set()
+
+
+def test_search_executor_reports_failures():
+    executor = SearchExecutor(max_workers=1, timeout=5)
+
+    results, complete = executor.run([(int, ('x',))])
+
+    assert results == [None]
+    assert not complete
+    assert executor.metrics()['failed'] == 1
+
+
+def test_search_executor_can_be_created_outside_the_loop():
+    executor = SearchExecutor(max_workers=1, timeout=5)
+    executor.shutdown()
+
+    assert executor.run([(str.upper, ('a',))]) == (['A'], True)